@@ -0,0 +1,124 @@
+"""
+Markdown 转换后端基准测试
+
+对比各后端（见 src/markdown_backends.py）在报告页面上的转换吞吐，并检查输出是否与
+markdown2 等价（规范化空白、自闭合写法和表格对齐属性后逐字比较）。
+
+输入为 benchmarks/fixtures/*.md 以及已保存的真实报告 output/runs/*/report.md，
+按生产渲染相同的方式分页后逐页转换。
+
+用法:
+    python benchmarks/bench_markdown.py
+    python benchmarks/bench_markdown.py --backends markdown2 mistune --repeat 200
+    python benchmarks/bench_markdown.py --check     # 输出不等价时以非零状态退出
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from loguru import logger  # noqa: E402
+from config import RUNS_DIR  # noqa: E402
+from src.markdown_backends import BACKENDS, MarkdownConverter, get_converter, normalize_html  # noqa: E402
+from src.report_generator import ReportGenerator  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+
+def load_pages(paths: List[Path]) -> List[Tuple[str, str]]:
+    """读取报告并按生产渲染的规则分页，返回 [(标签, 页面Markdown), ...]"""
+    splitter = ReportGenerator(markdown_backend="markdown2")
+    pages = []
+    for path in paths:
+        text = path.read_text(encoding="utf-8")
+        for i, page in enumerate(splitter._split_markdown_pages(text), 1):
+            pages.append((f"{path.parent.name}/{path.name}#{i}", page))
+    return pages
+
+
+def check_equivalence(converter: MarkdownConverter, reference: MarkdownConverter,
+                      pages: List[Tuple[str, str]]) -> List[str]:
+    """返回输出与参考后端不等价的页面及首个差异处"""
+    mismatches = []
+    for label, page in pages:
+        expected = normalize_html(reference.convert(page))
+        actual = normalize_html(converter.convert(page))
+        if actual != expected:
+            pos = next((i for i, (a, b) in enumerate(zip(actual, expected)) if a != b),
+                       min(len(actual), len(expected)))
+            mismatches.append(f"{label} 第 {pos} 个字符起不同: "
+                              f"{actual[max(0, pos - 30):pos + 50]!r} != {expected[max(0, pos - 30):pos + 50]!r}")
+    return mismatches
+
+
+def measure(converter: MarkdownConverter, pages: List[Tuple[str, str]],
+            repeat: int, rounds: int) -> Dict:
+    """多轮转换全部页面，取最快一轮"""
+    texts = [page for _, page in pages]
+    chars = sum(len(text) for text in texts)
+    for text in texts:  # 预热：首次转换包含导入与编译规则的开销
+        converter.convert(text)
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for text in texts:
+                converter.convert(text)
+        best = min(best, time.perf_counter() - started)
+    conversions = repeat * len(texts)
+    return {
+        "seconds": best,
+        "pages_per_second": conversions / best,
+        "chars_per_second": chars * repeat / best,
+        "ms_per_page": best / conversions * 1000,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Markdown转换后端基准测试")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), help="要测试的后端")
+    parser.add_argument("--files", nargs="+", type=Path, help="报告文件，默认使用固定样例与已保存的真实报告")
+    parser.add_argument("--repeat", type=int, default=100, help="每轮转换全部页面的次数")
+    parser.add_argument("--rounds", type=int, default=5, help="测量轮数，取最快一轮")
+    parser.add_argument("--check", action="store_true", help="输出与markdown2不等价时返回非零状态")
+    args = parser.parse_args(argv)
+
+    paths = args.files or sorted(FIXTURES_DIR.glob("*.md")) + sorted(RUNS_DIR.glob("*/report.md"))
+    pages = load_pages(paths)
+    if not pages:
+        logger.error("没有可用的报告文件")
+        return 1
+    logger.info(f"共 {len(paths)} 份报告、{len(pages)} 页，"
+                f"{sum(len(page) for _, page in pages)} 字符；每轮转换 {args.repeat} 次，共 {args.rounds} 轮")
+
+    reference = BACKENDS["markdown2"]()
+    results = {}
+    failed = False
+    for name in args.backends:
+        converter = get_converter(name)
+        if converter.name != name:
+            logger.warning(f"跳过 {name}：后端不可用")
+            continue
+        if name != reference.name:
+            mismatches = check_equivalence(converter, reference, pages)
+            for mismatch in mismatches:
+                logger.warning(f"{name} 输出不等价: {mismatch}")
+            failed = failed or bool(mismatches)
+            logger.info(f"{name}: {len(pages) - len(mismatches)}/{len(pages)} 页输出与 markdown2 等价")
+        results[name] = measure(converter, pages, args.repeat, args.rounds)
+
+    baseline = results.get("markdown2")
+    for name, result in results.items():
+        speedup = f"，相对 markdown2 {baseline['seconds'] / result['seconds']:.2f}x" if baseline else ""
+        logger.info(f"{name:<12} {result['ms_per_page']:.3f} ms/页  "
+                    f"{result['pages_per_second']:.0f} 页/s  "
+                    f"{result['chars_per_second'] / 1000:.0f} k字符/s{speedup}")
+    return 1 if args.check and failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
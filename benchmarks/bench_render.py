@@ -0,0 +1,423 @@
+"""
+渲染阶段基准测试
+
+测量 ReportGenerator 把报告渲染为图片与PDF的各步耗时（字体子集、Markdown转换、HTML页面、截图、Logo、PDF），
+以及峰值内存与输出大小，并随输入规模观察扩展性。
+
+输入分两类：
+- 录制样例：benchmarks/fixtures/*.md 以及已保存的真实报告 output/runs/*/report.md，按生产渲染的规则分页；
+- 合成样例：按 --scales 放大的长表格（table）、密集中文正文（text）与多页报告（pages），
+  内容由固定种子生成，每次运行完全相同。
+
+截图使用本机的无头 Chrome（html2image），页面不引用任何网络资源，可离线运行。
+找不到 Chrome 时以空白图片代替截图并在结果中标记，此时截图耗时不可比，Logo与PDF的耗时也偏低。
+
+结果可保存为基线（--save-baseline），之后以 --check 对比：任一样例的某一步耗时、RSS增长或输出大小
+超过基线的 (1 + --tolerance) 倍时标记为退化并以非零状态退出。耗时与内存只在同一主机（主机名、CPU型号、
+核数、内存总量与Python版本的指纹相同）、同一截图方式、同一计时轮数下对比；其它情况只对比与机器无关的
+输出大小（HTML大小要求Markdown后端相同，PDF大小要求截图方式相同）。内存对比各样例计时期间的RSS增长，
+而不是整个进程的峰值（后者随已运行的样例累积）。
+仓库中的 baselines/render.json 只含输出大小（--sizes-only），以占位截图、固定样例与合成样例生成
+（--files benchmarks/fixtures/sample_report.md），在任何机器上都可用于检查输出大小；
+需要对比耗时时在本机重新 --save-baseline 并保存到其它文件。
+
+用法:
+    python benchmarks/bench_render.py
+    python benchmarks/bench_render.py --scales 1 4 16 --families table pages --rounds 5
+    python benchmarks/bench_render.py --save-baseline
+    python benchmarks/bench_render.py --check --tolerance 0.3
+    python benchmarks/bench_render.py --files benchmarks/fixtures/sample_report.md --save-baseline --sizes-only
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from loguru import logger  # noqa: E402
+from config import ASSETS_DIR, MARKDOWN_BACKEND, REPORT_CONFIG, RUNS_DIR  # noqa: E402
+from src.memory_guard import MB, _RssSampler, current_rss_mb  # noqa: E402
+from src.report_generator import ReportGenerator  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "render.json"
+
+PHASES = ("font", "markdown", "html", "screenshot", "logo", "pdf")
+# 对比基线时，耗时差值低于该值（毫秒）视为噪声
+NOISE_FLOOR_MS = 5.0
+# 对比基线时，RSS增长的差值低于该值（MB）视为噪声
+NOISE_FLOOR_RSS_MB = 5.0
+# 只含输出大小的基线保留的字段
+SIZE_FIELDS = ("pages", "chars", "html_bytes", "png_bytes", "pdf_bytes", "scale")
+
+_WORDS = ("氢能", "电解槽", "燃料电池", "加氢站", "绿氢", "储运", "管道", "示范项目", "产能", "补贴",
+          "碱性", "质子交换膜", "固体氧化物", "液氢", "合成氨", "甲醇", "重卡", "装机", "招标", "成本",
+          "国家能源局", "发改委", "欧盟", "日本", "韩国", "内蒙古", "新疆", "吉林", "签约", "投产")
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return "".join(rng.choice(_WORDS) for _ in range(words)) + f"，同比增长{rng.randint(1, 99)}%。"
+
+
+def synthetic_text(scale: int, rng: random.Random) -> List[str]:
+    """密集中文正文：Part 1-4 各 6×scale 条长条目，Part 5 一段说明"""
+    parts = []
+    for part in range(1, 5):
+        items = [f"- **{_sentence(rng, 3)}**{''.join(_sentence(rng, 12) for _ in range(4))}"
+                 for _ in range(6 * scale)]
+        parts.append(f"### **Part {part}: 合成正文**\n\n" + "\n".join(items))
+    page1 = "# 氢能产业双周简报\n\n" + "\n\n".join(parts)
+    page2 = "### **Part 5: 重点数据**\n\n" + _sentence(rng, 40)
+    return [page1, page2]
+
+
+def synthetic_table(scale: int, rng: random.Random) -> List[str]:
+    """长表格：Part 5 为 25×scale 行、6 列的数据表"""
+    header = "| 项目 | 地区 | 技术路线 | 产能（吨/年） | 投资（亿元） | 状态 |\n|---|---|:---:|---:|---:|---|"
+    rows = [f"| {rng.choice(_WORDS)}{rng.choice(_WORDS)}项目{i} | {rng.choice(_WORDS[20:28])} | "
+            f"{rng.choice(_WORDS[10:13])} | {rng.randint(100, 200000):,} | {rng.uniform(0.5, 300):.1f} | "
+            f"{rng.choice(('在建', '投产', '签约', '规划'))} |" for i in range(25 * scale)]
+    page1 = "# 氢能产业双周简报\n\n### **Part 1: 概览**\n\n" + "\n".join(f"- {_sentence(rng, 10)}" for _ in range(8))
+    page2 = "### **Part 5: 重点数据**\n\n" + header + "\n" + "\n".join(rows)
+    return [page1, page2]
+
+
+def synthetic_pages(scale: int, rng: random.Random) -> List[str]:
+    """多页报告：4×scale 页，每页为常规篇幅的正文加一张小表"""
+    pages = []
+    for i in range(4 * scale):
+        items = "\n".join(f"- **{_sentence(rng, 2)}**{_sentence(rng, 15)}" for _ in range(8))
+        table = "| 指标 | 数值 |\n|---|---:|\n" + "\n".join(
+            f"| {rng.choice(_WORDS)} | {rng.randint(1, 9999)} |" for _ in range(6))
+        pages.append(f"### **第 {i + 1} 页**\n\n{items}\n\n{table}")
+    return pages
+
+
+SYNTHETIC: Dict[str, Callable[[int, random.Random], List[str]]] = {
+    "text": synthetic_text,
+    "table": synthetic_table,
+    "pages": synthetic_pages,
+}
+
+
+def load_fixtures(paths: List[Path], families: List[str], scales: List[int]) -> List[Tuple[str, Optional[int], List[str]]]:
+    """返回 [(标签, 规模, 分页后的Markdown), ...]；录制样例的规模为None"""
+    splitter = ReportGenerator(markdown_backend="markdown2")
+    fixtures = []
+    for path in paths:
+        pages = splitter._split_markdown_pages(path.read_text(encoding="utf-8"))
+        fixtures.append((f"{path.parent.name}/{path.name}", None, pages))
+    for family in families:
+        for scale in scales:
+            # 每个样例使用独立的固定种子，增减其它样例不影响其内容
+            rng = random.Random(f"{family}-{scale}")
+            fixtures.append((f"{family}@{scale}", scale, SYNTHETIC[family](scale, rng)))
+    return fixtures
+
+
+def _placeholder_screenshot(output_dir: Path, image_filename: str):
+    """找不到 Chrome 时代替截图：写出与页面尺寸相同的空白PNG"""
+    from PIL import Image
+    Image.new("RGB", REPORT_CONFIG["image_size"], "white").save(output_dir / image_filename)
+
+
+def _ensure_logo(workdir: Path) -> Path:
+    """优先使用 assets/logo.png；没有时生成一张占位Logo，保证Logo一步被测量"""
+    logo_path = ASSETS_DIR / "logo.png"
+    if logo_path.exists():
+        return logo_path
+    from PIL import Image
+    logo_path = workdir / "logo.png"
+    Image.new("RGBA", (256, 256), (0, 120, 200, 255)).save(logo_path)
+    return logo_path
+
+
+def render_once(generator: ReportGenerator, label: str, pages: List[str], workdir: Path,
+                logo_path: Path, browser: bool) -> Dict:
+    """按生产渲染的步骤渲染一次样例，返回各步耗时（秒）与输出大小"""
+    times = dict.fromkeys(PHASES, 0.0)
+    html_bytes = png_bytes = 0
+    header, footer = "氢能产业双周简报 基准测试", "来源：基准测试样例"
+    output_dir = workdir / "pages" / label.replace("/", "_")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    image_paths = []
+    started = time.perf_counter()
+    font = generator.fonts.prepare([header, footer, *pages])
+    fonts = f"<style>{font.css}</style>" if font else ""
+    times["font"] += time.perf_counter() - started
+    for i, page in enumerate(pages, 1):
+        started = time.perf_counter()
+        body = generator.markdown.convert(page)
+        times["markdown"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        html = generator.page_template.render(body, header, f"第 {i} 页 / 共 {len(pages)} 页 · {footer}", fonts)
+        times["html"] += time.perf_counter() - started
+        html_bytes += len(html.encode("utf-8"))
+
+        image_filename = f"page_{i}.png"
+        started = time.perf_counter()
+        if browser:
+            generator._screenshot(output_dir, html, image_filename, font)
+        else:
+            _placeholder_screenshot(output_dir, image_filename)
+        times["screenshot"] += time.perf_counter() - started
+
+        image_path = output_dir / image_filename
+        started = time.perf_counter()
+        generator._add_logo_to_image(str(image_path), str(logo_path))
+        times["logo"] += time.perf_counter() - started
+        png_bytes += image_path.stat().st_size
+        image_paths.append(str(image_path))
+
+    started = time.perf_counter()
+    pdf_path = generator.generate_pdf(image_paths, output_filename=f"{label.replace('/', '_')}.pdf")
+    times["pdf"] += time.perf_counter() - started
+    return {
+        "times": times,
+        "html_bytes": html_bytes,
+        "png_bytes": png_bytes,
+        "pdf_bytes": Path(pdf_path).stat().st_size if pdf_path else 0,
+    }
+
+
+def measure(generator: ReportGenerator, label: str, pages: List[str], workdir: Path,
+            logo_path: Path, browser: bool, rounds: int) -> Dict:
+    """
+    首轮开启 tracemalloc 统计Python对象峰值（同时作为预热），之后各轮只计时，
+    每一步取各轮中最快的一次
+    """
+    tracemalloc.start()
+    try:
+        first = render_once(generator, label, pages, workdir, logo_path, browser)
+        _, traced_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    rss_start = current_rss_mb() or 0.0
+    sampler = _RssSampler(0.01)
+    sampler.start()
+    best = dict.fromkeys(PHASES, float("inf"))
+    try:
+        for _ in range(rounds):
+            result = render_once(generator, label, pages, workdir, logo_path, browser)
+            for phase, seconds in result["times"].items():
+                best[phase] = min(best[phase], seconds)
+    finally:
+        rss_peak = sampler.stop()
+
+    total = sum(best.values())
+    return {
+        "pages": len(pages),
+        "chars": sum(len(page) for page in pages),
+        "ms": {phase: round(seconds * 1000, 2) for phase, seconds in best.items()},
+        "total_ms": round(total * 1000, 2),
+        "pages_per_second": round(len(pages) / total, 2) if total else None,
+        "rss_peak_mb": round(rss_peak, 1),  # 整个进程的峰值，随已运行的样例累积，仅供参考
+        "rss_growth_mb": round(rss_peak - rss_start, 1),
+        "traced_peak_mb": round(traced_peak / MB, 2),
+        "html_bytes": first["html_bytes"],
+        "png_bytes": first["png_bytes"],
+        "pdf_bytes": first["pdf_bytes"],
+    }
+
+
+def scaling_exponents(fixtures: Dict[str, Dict]) -> Dict[str, Dict[str, float]]:
+    """
+    各合成样例族的扩展指数：对 log(耗时或PDF大小) ~ log(规模) 做最小二乘拟合，
+    1 表示线性增长，明显大于1说明存在超线性开销
+    """
+    families: Dict[str, List[Tuple[int, Dict]]] = {}
+    for label, row in fixtures.items():
+        if row.get("scale"):
+            families.setdefault(label.split("@")[0], []).append((row["scale"], row))
+    result = {}
+    for family, points in families.items():
+        if len({scale for scale, _ in points}) < 2:
+            continue
+        xs = [math.log(scale) for scale, _ in points]
+        result[family] = {
+            "total_ms": round(_slope(xs, [math.log(max(row["total_ms"], 1e-3)) for _, row in points]), 2),
+            "pdf_bytes": round(_slope(xs, [math.log(max(row["pdf_bytes"], 1)) for _, row in points]), 2),
+        }
+    return result
+
+
+def _slope(xs: List[float], ys: List[float]) -> float:
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum((x - mean_x) ** 2 for x in xs)
+
+
+def machine_fingerprint() -> str:
+    """主机指纹：主机名之外还包括CPU型号、核数、内存总量与Python版本，虚拟机换了规格也不会误比耗时"""
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu)
+    except OSError:
+        pass
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        memory = 0
+    raw = "|".join(str(part) for part in (platform.node(), platform.machine(), cpu, os.cpu_count(),
+                                          memory, platform.python_version()))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def sizes_only(results: Dict) -> Dict:
+    """去掉耗时与内存，只保留与机器无关的输出大小（用于提交到仓库的基线）"""
+    return {
+        "created_at": results["created_at"],
+        "mode": results["mode"],
+        "backend": results["backend"],
+        "fixtures": {label: {name: row[name] for name in SIZE_FIELDS}
+                     for label, row in results["fixtures"].items()},
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """返回相对基线退化的指标说明"""
+    same_mode = current["mode"] == baseline.get("mode")
+    same_backend = current.get("backend") == baseline.get("backend")
+    timed = False
+    if "machine" not in baseline:
+        logger.info("基线只含输出大小，不对比耗时与内存")
+    elif not same_mode or current.get("machine") != baseline["machine"]:
+        logger.warning(f"基线来自其它主机或截图方式（当前 {current.get('host')}/{current['mode']}，"
+                       f"基线 {baseline.get('host')}/{baseline.get('mode')}），只对比输出大小")
+    elif current.get("rounds") != baseline.get("rounds"):
+        logger.warning(f"计时轮数与基线不同（当前 {current.get('rounds')}，基线 {baseline.get('rounds')}），"
+                       f"只对比输出大小")
+    else:
+        timed = True
+    regressions = []
+    for label, row in current["fixtures"].items():
+        base = baseline.get("fixtures", {}).get(label)
+        if base is None:
+            continue
+        metrics = []
+        if timed:
+            metrics += [(f"{phase} ms", row["ms"][phase], base["ms"].get(phase), NOISE_FLOOR_MS) for phase in PHASES]
+            metrics.append(("total ms", row["total_ms"], base.get("total_ms"), NOISE_FLOOR_MS))
+            metrics.append(("rss_growth_mb", row["rss_growth_mb"], base.get("rss_growth_mb"), NOISE_FLOOR_RSS_MB))
+        if same_backend:
+            metrics.append(("html_bytes", row["html_bytes"], base.get("html_bytes"), 0))
+        if same_mode:
+            metrics.append(("pdf_bytes", row["pdf_bytes"], base.get("pdf_bytes"), 0))
+        for name, value, previous, floor in metrics:
+            if previous is None:
+                continue
+            if value > previous * (1 + tolerance) and value - previous > floor:
+                regressions.append(f"{label} {name}: {previous} -> {value}"
+                                   f"（+{(value / previous - 1) if previous else float('inf'):.0%}）")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="渲染阶段基准测试")
+    parser.add_argument("--files", nargs="+", type=Path, help="录制的报告文件，默认使用固定样例与已保存的真实报告")
+    parser.add_argument("--no-recorded", action="store_true", help="只测试合成样例")
+    parser.add_argument("--families", nargs="*", default=list(SYNTHETIC), choices=list(SYNTHETIC),
+                        help="合成样例族")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 2, 4], help="合成样例的规模倍数")
+    parser.add_argument("--rounds", type=int, default=3, help="计时轮数，每一步取最快一轮")
+    parser.add_argument("--backend", default=MARKDOWN_BACKEND, help="Markdown转换后端")
+    parser.add_argument("--output", type=Path, help="结果写入该JSON文件")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--sizes-only", action="store_true",
+                        help="保存基线时只保存输出大小，不保存与机器相关的耗时和内存（用于提交到仓库的基线）")
+    parser.add_argument("--check", action="store_true", help="与基线对比，存在退化时返回非零状态")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许相对基线增长的比例")
+    args = parser.parse_args(argv)
+
+    # 生成器在分页与渲染过程中的逐页INFO日志会干扰计时
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    if args.no_recorded:
+        paths = []
+    else:
+        paths = args.files or sorted(FIXTURES_DIR.glob("*.md")) + sorted(RUNS_DIR.glob("*/report.md"))
+    fixtures = load_fixtures(paths, args.families, args.scales)
+    if not fixtures:
+        logger.error("没有可用的样例")
+        return 1
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_render_"))
+    generator = ReportGenerator(browser_pool_size=1, markdown_backend=args.backend)
+    generator.output_dir = workdir
+    try:
+        try:
+            generator._browser_pool.put(generator._acquire_screenshotter())
+            browser = True
+        except FileNotFoundError as e:
+            logger.warning(f"找不到 Chrome，以空白图片代替截图（截图耗时不可比）: {e}")
+            browser = False
+        logo_path = _ensure_logo(workdir)
+
+        results = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "host": platform.node(),
+            "machine": machine_fingerprint(),
+            "mode": "chrome" if browser else "placeholder",
+            "backend": generator.markdown.name,
+            "rounds": args.rounds,
+            "fixtures": {},
+        }
+        for label, scale, pages in fixtures:
+            row = measure(generator, label, pages, workdir, logo_path, browser, args.rounds)
+            row["scale"] = scale
+            results["fixtures"][label] = row
+            print(f"{label:<36} {row['pages']:>3} 页 {row['chars']:>7} 字符  "
+                  + "  ".join(f"{phase} {row['ms'][phase]:>8.1f}" for phase in PHASES)
+                  + f"  共 {row['total_ms']:>8.1f} ms  {row['pages_per_second'] or 0:>7.2f} 页/s  "
+                  f"RSS增长 {row['rss_growth_mb']:.0f}MB  Python峰值 {row['traced_peak_mb']:.1f}MB  "
+                  f"PDF {row['pdf_bytes'] / 1024:.0f}KB")
+        results["scaling"] = scaling_exponents(results["fixtures"])
+        for family, exponents in results["scaling"].items():
+            print(f"扩展指数 {family}: 耗时 {exponents['total_ms']}，PDF大小 {exponents['pdf_bytes']}（1为线性）")
+        # Chrome 在子进程中运行，只能得到整个基准期间子进程的峰值RSS
+        results["child_peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    finally:
+        generator.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    status = 0
+    if args.check:
+        if not args.baseline.exists():
+            logger.error(f"基线不存在: {args.baseline}，先以 --save-baseline 生成")
+            return 1
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        for regression in regressions:
+            logger.error(f"退化: {regression}")
+        if regressions:
+            status = 1
+        else:
+            print(f"与基线相比没有超过 {args.tolerance:.0%} 的退化")
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        baseline = sizes_only(results) if args.sizes_only else results
+        args.baseline.write_text(json.dumps(baseline, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"基线已保存: {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,35 +8,147 @@ PROJECT_ROOT = Path(__file__).parent
 OUTPUT_DIR = PROJECT_ROOT / "output"
 ASSETS_DIR = PROJECT_ROOT / "assets"
 TEMPLATES_DIR = PROJECT_ROOT / "templates"
+RUNS_DIR = OUTPUT_DIR / "runs"  # 每次运行的追踪与指标文件
+STATE_DIR = OUTPUT_DIR / "state"  # 跨运行持久化的本地状态（索引、统计等）
 
-# 创建必要的目录
-OUTPUT_DIR.mkdir(exist_ok=True)
-(OUTPUT_DIR / "pages").mkdir(exist_ok=True)
-(OUTPUT_DIR / "reports").mkdir(exist_ok=True)
-ASSETS_DIR.mkdir(exist_ok=True)
+# 导入本模块不产生任何磁盘副作用；输出目录在首次写入时由各模块通过 ensure_dir 创建
 
 # API配置
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")   # llm配置
 SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")   # 搜索引擎配置
+# 多个SerpApi密钥，用逗号分隔；未设置时使用 SERPAPI_API_KEY
+SERPAPI_API_KEYS = [k.strip() for k in os.getenv("SERPAPI_API_KEYS", "").split(",") if k.strip()] or \
+    ([SERPAPI_API_KEY] if SERPAPI_API_KEY else [])
+SERPAPI_BASE_URL = os.getenv("SERPAPI_BASE_URL", "https://serpapi.com/search.json")
+SERPAPI_ACCOUNT_URL = os.getenv("SERPAPI_ACCOUNT_URL", "https://serpapi.com/account.json")  # 账户接口，为空则不查询
+SERPAPI_ACCOUNT_REFRESH_SECONDS = 3600  # 账户接口（剩余配额、每小时上限）的查询间隔（秒）
+SERPAPI_KEY_COOLDOWN = 300  # 密钥触发429后的冷却时间（秒）
+SERPAPI_KEY_DISABLED_RECHECK_SECONDS = 6 * 3600  # 因401/403停用的密钥在多久后重新检查（秒）
+SERPAPI_KEY_SAVE_EVERY = 20  # 每多少次成功请求保存一次用量状态（冷却、停用与账户校准时立即保存）
+SERPAPI_KEY_STATE_PATH = STATE_DIR / "serpapi_keys.json"  # 各密钥用量状态（只保存密钥的哈希标识）
 # 要使用的搜索引擎列表，用逗号分隔，例如 "google,bing,baidu"
 SERPAPI_ENGINES = os.getenv("SERPAPI_ENGINES", "google,bing,baidu").split(',')
 # 搜索引擎轮询之间的时间间隔（秒），以避免速率限制
 SEARCH_DELAY = 1.5
+SERPAPI_KEY_MIN_INTERVAL = SEARCH_DELAY  # 同一密钥两次请求的最小间隔（秒），多个密钥时按密钥分别计算
 
 DEEPSEEK_BASE_URL = "https://api.deepseek.com"
 DEEPSEEK_MODEL = "deepseek-chat"
+# DeepSeek计费单价（每百万token），用于估算每次运行的费用，价格调整时请同步修改
+DEEPSEEK_PRICING = {
+    "currency": "USD",
+    "input_cache_hit": 0.028,
+    "input_cache_miss": 0.28,
+    "output": 0.42,
+}
+
+# 超时、重试与熔断配置
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 300))  # 单次DeepSeek请求超时（秒）
+LLM_MAX_ATTEMPTS = 4  # DeepSeek调用的最大尝试次数（仅对超时、连接错误、429、5xx重试）
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", 30))  # 单次SerpApi请求超时（秒）
+SEARCH_MAX_ATTEMPTS = 3  # 每个引擎请求的最大尝试次数
+RETRY_BASE_DELAY = 2.0  # 首次重试的最大等待时间（秒），之后按指数增长并随机抖动
+RETRY_MAX_DELAY = 30.0  # 单次重试等待上限（秒）
+CIRCUIT_FAILURE_THRESHOLD = 5  # 连续失败达到该次数后熔断
+CIRCUIT_RESET_TIMEOUT = 120  # 熔断冷却时间（秒），之后放行一次试探请求
+SEARCH_CHECKPOINT_DIR = STATE_DIR / "checkpoints"  # 已完成搜索的检查点，报告撰写失败后重跑时复用
+SEARCH_CHECKPOINT_TTL_HOURS = 12  # 检查点有效期（小时）
+
+# 运行截止时间：各阶段据剩余时间收紧超时或降级（减少引擎/查询、缩小结果规模、只发送PDF）
+RUN_DEADLINE = os.getenv("RUN_DEADLINE")  # 每日截止时刻 "HH:MM"，例如 "08:00"；为空表示不限
+RUN_BUDGET_SECONDS = float(os.getenv("RUN_BUDGET_SECONDS", 0))  # 每次运行的时间预算（秒），0表示不限
+DEADLINE_TIGHT_SECONDS = 600  # 扣除后续阶段预留后剩余时间少于该值即开始降级
+DEADLINE_RESERVE_WRITE = 300  # 为撰写报告预留的时间（秒）
+DEADLINE_RESERVE_DELIVERY = 120  # 为渲染和发送邮件预留的时间（秒）
+DEADLINE_RESULT_BUDGET = 120  # 降级时提供给LLM的搜索结果条数上限
+DEADLINE_PDF_ONLY_SECONDS = 60  # 发送邮件时剩余时间少于该值则只附带PDF
+
+# 内存记账与上限：各阶段超过上限时改走低内存路径（或按配置直接失败），便于在小内存主机上并行多个工作者
+MEMORY_PROFILE_ENABLED = os.getenv("MEMORY_PROFILE_ENABLED", "false").lower() == "true"  # tracemalloc与RSS采样（有额外开销）
+MEMORY_SAMPLE_INTERVAL = 0.05  # 采样峰值RSS的间隔（秒）
+MEMORY_TOP_ALLOCATIONS = 10  # 每个阶段报告的最大分配位置数
+MEMORY_CEILING_MB = float(os.getenv("MEMORY_CEILING_MB", 0))  # 各阶段的RSS上限（MB），0表示不限
+# 按阶段覆盖上限，例如 "render=600,email=400"；阶段为 generate_content / render / email
+MEMORY_STAGE_CEILINGS_MB = {
+    stage.strip(): float(value)
+    for stage, _, value in (item.partition("=") for item in os.getenv("MEMORY_STAGE_CEILINGS_MB", "").split(","))
+    if stage.strip() and value.strip()
+}
+MEMORY_CEILING_ACTION = os.getenv("MEMORY_CEILING_ACTION", "degrade")  # degrade: 改走低内存路径; fail: 直接失败
 
 # 邮件服务配置
 EMAIL_HOST = os.getenv("EMAIL_HOST")  
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", 465))  # 465 (SSL)
 EMAIL_USER = os.getenv("EMAIL_USER")  # 发件人邮箱
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")  # 发件人邮箱的SMTP授权码
+EMAIL_TIMEOUT = 60  # SMTP连接超时（秒）
+EMAIL_SMTP_DEBUG = os.getenv("EMAIL_SMTP_DEBUG", "false").lower() == "true"  # 以DEBUG级别记录SMTP会话（不含邮件正文）
 EMAIL_RECIPIENTS = [email.strip() for email in os.getenv("EMAIL_RECIPIENTS", "").split(",") if email.strip()]  # 收件人列表，用逗号分隔   
 
 
 # 搜索配置
 SEARCH_RESULTS_NUM = 30
-SEARCH_CACHE_ENABLED = False
+SEARCH_CACHE_ENABLED = False  # 进程内搜索缓存（批量模式总是启用）
+SEARCH_CACHE_TTL = 6 * 3600  # 搜索缓存有效期（秒）
+SEARCH_HTTP_POOL_SIZE = 10  # SerpApi HTTP连接池大小
+
+# 竞速模式：各引擎并发查询，达到目标结果数或截止时间即返回，放弃未完成的引擎
+SEARCH_RACING_ENABLED = os.getenv("SEARCH_RACING_ENABLED", "false").lower() == "true"
+SEARCH_RACE_TARGET_RESULTS = 45  # 每个查询达到该独立结果数即提前返回
+SEARCH_RACE_DEADLINE = float(os.getenv("SEARCH_RACE_DEADLINE", 15))  # 每个查询的截止时间（秒）
+SEARCH_HEDGING_ENABLED = True  # 引擎耗时超过其历史p95延迟时发出对冲请求（需要引擎统计）
+SEARCH_HEDGE_CHECK_INTERVAL = 0.25  # 检查是否需要对冲的间隔（秒）
+
+# 自适应引擎选择：按各引擎对中文/英文查询的历史新增结果量跳过或减少请求
+ADAPTIVE_ENGINES_ENABLED = os.getenv("ADAPTIVE_ENGINES_ENABLED", "true").lower() == "true"
+ENGINE_STATS_PATH = STATE_DIR / "engine_stats.db"
+ENGINE_STATS_WINDOW = 50  # 只使用每个引擎/类别最近的N条样本
+ENGINE_MIN_SAMPLES = 5  # 样本数不足时照常请求
+ENGINE_SKIP_THRESHOLD = 0.5  # 平均新增结果数低于该值时跳过该引擎
+ENGINE_REDUCE_RATIO = 0.3  # 新增结果占请求数的比例低于该值时缩减请求数量
+ENGINE_MIN_NUM = 5  # 缩减后的最小请求数量
+ENGINE_EXPLORATION_RATE = 0.1  # 本应跳过或缩减的引擎仍按原样请求的概率
+
+# 正文抓取：搜索完成后并发抓取排名靠前的结果页面，提取正文摘录与数据句，补充到搜索结果中
+ARTICLE_ENRICH_ENABLED = os.getenv("ARTICLE_ENRICH_ENABLED", "false").lower() == "true"
+ARTICLE_TOP_N = 15  # 每批搜索结果抓取的页面数量（本期新结果优先）
+ARTICLE_FETCH_CONCURRENCY = 8  # 同时抓取的页面数上限
+ARTICLE_PER_HOST_LIMIT = 2  # 同一站点同时抓取的页面数上限
+ARTICLE_FETCH_TIMEOUT = 10.0  # 单个页面的超时（秒）
+ARTICLE_FETCH_BUDGET = 60.0  # 一批页面的总耗时上限（秒），超时未完成的页面放弃
+ARTICLE_MAX_BYTES = 2 * 1024 * 1024  # 单个页面读取的字节数上限
+ARTICLE_EXCERPT_CHARS = 600  # 提供给LLM的正文摘录长度
+ARTICLE_MAX_FACTS = 5  # 每个页面提取的数据句数量上限
+ARTICLE_USER_AGENT = os.getenv("ARTICLE_USER_AGENT", "HydrogenBriefBot/1.0 (+https://github.com/iuany7/hydrogen_report_generator)")
+ARTICLE_CACHE_PATH = STATE_DIR / "articles.db"  # 按URL缓存的提取结果（含ETag/Last-Modified，过期后条件请求）
+ARTICLE_CACHE_TTL_HOURS = 72  # 缓存有效期（小时），过期后以条件请求校验
+
+# 增量采集：每日按查询计划搜索并写入本地存储（python main.py --collect），报告运行直接读取最近两周的结果
+SEARCH_SOURCE = os.getenv("SEARCH_SOURCE", "live")  # live: 报告运行时现场搜索; store: 优先读取采集存储
+COLLECT_STORE_PATH = STATE_DIR / "collection.db"  # 按采集日期分区的搜索结果存储
+COLLECT_WINDOW_DAYS = 14  # 采集计划覆盖的天数；报告的时间范围在其内、截止今天且无地域/关注重点时才读取存储
+COLLECT_RETENTION_DAYS = 60  # 超过该天数的分区在采集时清理
+COLLECT_MAX_AGE_HOURS = 36  # 最近一次采集早于该时长时视为过旧，报告回退为现场搜索
+COLLECT_MIN_RESULTS = 60  # 存储中的结果少于该条数时回退为现场搜索
+COLLECT_MAX_RESULTS = 300  # 从存储提供给LLM的结果条数上限（本期新结果优先，其次按采集日期从新到旧）
+COLLECT_CANDIDATE_RESULTS = 1000  # 从存储读取的候选结果上限（按采集日期从新到旧），标记新颖度后再截取
+COLLECT_MAX_QUERIES = 40  # 每次采集执行的查询词数量上限
+COLLECT_RUN_TIME = os.getenv("COLLECT_RUN_TIME", "05:00")  # 常驻服务中每日采集的时刻 HH:MM
+# 尚未有LLM规划过的查询词时使用的默认查询计划
+COLLECT_QUERIES = [
+    "氢能 政策 最新", "氢燃料电池汽车 推广", "加氢站 建设", "绿氢 项目 签约",
+    "电解槽 招标 中标", "氢能 融资", "储氢 输氢 管道", "hydrogen policy news",
+    "green hydrogen project FID", "electrolyzer order", "fuel cell vehicle hydrogen",
+]
+
+# 批量模式配置（python main.py --batch variants.json）
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 3))  # 同时生成的报告数上限
+
+# 跨期新颖度索引配置
+NOVELTY_INDEX_PATH = STATE_DIR / "novelty_index.db"
+NOVELTY_MODE = os.getenv("NOVELTY_MODE", "tag")  # tag: 标记往期已出现的条目; drop: 剔除; off: 仅建立索引
+NOVELTY_LOOKBACK_DAYS = 90  # 只与最近多少天内的往期结果比对
+NOVELTY_RERUN_HOURS = 20  # 本次运行开始前该小时数内才首次交付的条目属于同一期（重跑、批量中的其它变体），不算往期
 
 # 报告配置
 REPORT_CONFIG = {
@@ -47,8 +159,91 @@ REPORT_CONFIG = {
     "font_family": "Microsoft YaHei, LXGW WenKai, sans-serif",
     "font_size": 16,
 }
+RENDER_BROWSER_POOL_SIZE = 1  # 截图器池大小，批量模式下按并发度放大
+MARKDOWN_BACKEND = os.getenv("MARKDOWN_BACKEND", "markdown2")  # markdown2 / mistune / markdown-it
+RENDER_MINIFY_CSS = True  # 压缩页面样式表
+RENDER_EXTERNAL_CSS = os.getenv("RENDER_EXTERNAL_CSS", "false").lower() == "true"  # 样式表写入截图器临时目录，各页以<link>引用
+
+# 字体配置
+FONT_PATH = os.getenv("FONT_PATH")  # 报告使用的中文字体文件（.ttf/.otf/.ttc/.woff2）；为空时依次查找 assets/fonts/ 与系统字体
+FONT_SEARCH_PATTERNS = [  # 未指定 FONT_PATH 且 assets/fonts/ 为空时，按顺序查找的系统中文字体
+    "/usr/share/fonts/**/NotoSansCJK*-Regular.tt[fc]",
+    "/usr/share/fonts/**/NotoSansSC-Regular.[ot]tf",
+    "/usr/share/fonts/**/SourceHanSans*-Regular.[ot]t[fc]",
+    "/usr/share/fonts/**/LXGWWenKai-Regular.ttf",
+    "/usr/share/fonts/**/wqy-microhei.ttc",
+    "/usr/share/fonts/**/wqy-zenhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+]
+FONT_SUBSET_ENABLED = True  # 按报告实际用到的字符子集化字体（需安装 fonttools，未安装时使用完整字体）
+FONT_CACHE_DIR = STATE_DIR / "fonts"  # 字体子集缓存，按字体与字符集的哈希命名
+FONT_CACHE_MAX_FILES = 50  # 缓存的子集文件数上限，超出时删除最久未用的
+
+# 结构化报告：五个部分以JSON输出，逐部分校验和缓存，质量不足的部分单独补充搜索并重写
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "markdown")  # markdown: 自由格式Markdown; sections: 结构化JSON
+SECTION_CACHE_DIR = STATE_DIR / "sections"  # 各部分的缓存，按提示（含日期范围）分目录
+SECTION_CACHE_TTL_HOURS = 24  # 部分缓存有效期（小时）
+SECTION_MIN_ITEMS = 2  # 每部分至少包含的条目数，不足视为质量不足
+SECTION_MAX_QUERIES = 4  # 单独重写某部分时的查询词数量上限
+SECTION_MAX_ATTEMPTS = 2  # 单独重写某部分的最大尝试次数
+
+# 常驻服务配置（python main.py --daemon）
+DAEMON_ANCHOR_DATE = os.getenv("DAEMON_ANCHOR_DATE", "2025-01-06")  # 调度锚定日期（某个周一）
+DAEMON_EVERY_WEEKS = int(os.getenv("DAEMON_EVERY_WEEKS", 2))  # 每隔几周运行一次
+DAEMON_RUN_TIME = os.getenv("DAEMON_RUN_TIME", "07:00")  # 运行时刻 HH:MM
+DAEMON_POLL_INTERVAL = 30  # 调度循环的检查间隔（秒）
+DAEMON_HEALTH_PATH = STATE_DIR / "daemon_health.json"  # 健康状态文件
+DAEMON_TRIGGER_PATH = STATE_DIR / "daemon.trigger"  # 创建该文件即触发一次临时运行
+
+# 本地HTTP服务配置（python main.py --serve）
+HTTP_HOST = os.getenv("HTTP_HOST", "127.0.0.1")
+HTTP_PORT = int(os.getenv("HTTP_PORT", 8765))
+HTTP_MAX_CONCURRENT_JOBS = 2  # 同时进行的生成任务上限
+HTTP_CACHE_TTL_HOURS = 24  # 已完成任务的产物缓存有效期（小时）
+HTTP_FAILED_JOB_RETENTION_MINUTES = 30  # 失败任务保留多久供查询状态（分钟），之后从内存中移除
+HTTP_JOBS_INDEX_PATH = STATE_DIR / "http_jobs.json"  # 已完成任务的缓存索引
+
+# 多进程工作者与任务队列配置（python main.py --worker / --enqueue）
+JOB_QUEUE_PATH = Path(os.getenv("JOB_QUEUE_PATH", STATE_DIR / "job_queue.db"))  # 多台主机共享时指向共享文件系统
+JOB_LEASE_SECONDS = 300  # 任务租约时长（秒），超时未续约的任务会被其它工作者接管
+JOB_HEARTBEAT_INTERVAL = 30  # 续约心跳间隔（秒）
+JOB_MAX_ATTEMPTS = 3  # 每个任务的最大尝试次数
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", os.cpu_count() or 1))  # 默认工作进程数
+WORKER_POLL_INTERVAL = 5  # 队列为空时的轮询间隔（秒）
+
+# 追踪配置
+TRACE_EXPORT_ENABLED = os.getenv("TRACE_EXPORT_ENABLED", "true").lower() == "true"  # 是否导出每次运行的span与指标
+TRACE_DEFAULT_MAX_SPANS = 2000  # 未开始运行时（采集、命令行工具等）默认追踪器最多保留的span数，超出时丢弃最早的
+PROFILE_SAMPLE_INTERVAL = 0.005  # --profile 的调用栈采样间隔（秒）
+PROFILE_TOP_FUNCTIONS = 15  # 分析汇总中每个阶段列出的自身耗时最多的函数数
+
+# 运行性能历史
+PERF_HISTORY_ENABLED = os.getenv("PERF_HISTORY_ENABLED", "true").lower() == "true"  # 每次运行结束时记录各项指标
+PERF_HISTORY_PATH = STATE_DIR / "perf_history.db"
+PERF_BASELINE_RUNS = 20  # 基线取同一标签最近N次成功运行
+PERF_MIN_BASELINE_RUNS = 5  # 基线运行数少于该值时不检查
+PERF_REGRESSION_RATIO = 0.5  # 超过基线中位数的比例，且高于基线p95时视为退化
+# 检查的指标及视为退化所需的最小绝对增量；键为指标名，或以 "." 开头的指标名后缀
+PERF_CHECK_METRICS = {
+    ".seconds": 5.0,
+    "llm.cost": 0.01,
+    "llm.prompt_tokens": 5000,
+    "llm.completion_tokens": 1000,
+}
 
 # 日志配置
-LOG_LEVEL = "INFO"
+LOG_LEVEL = (os.getenv("LOG_LEVEL") or "INFO").upper()
+# 按模块覆盖日志级别（最长前缀匹配），例如 "src.search_service=WARNING,src.email_service=DEBUG"
+LOG_LEVELS = {
+    name.strip(): value.strip().upper()
+    for name, _, value in (item.partition("=") for item in os.getenv("LOG_LEVELS", "").split(","))
+    if name.strip() and value.strip()
+}
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() == "true"  # 控制台与日志文件输出JSON（每行一条记录）
+LOG_ENQUEUE = True  # 日志经队列由后台线程写出，调用方不等待终端与磁盘
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", 2000))  # 单条日志的最大字符数，超出部分截断，0表示不截断
+LOG_RATE_LIMIT_BURST = 20  # 同一代码位置在一个窗口内最多输出的日志条数（ERROR及以上不限），0表示不限流
+LOG_RATE_LIMIT_WINDOW = 60  # 限流窗口（秒）
 LOG_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
 
@@ -1,13 +1,20 @@
 """
 氢能产业简报生成系统 - 主程序入口
 """
-import os
 import sys
+
+# --startup-profile 需要在其它任何导入之前安装导入计时器
+if "--startup-profile" in sys.argv:
+    from src.startup_profile import ImportProfiler
+    _import_profiler = ImportProfiler().install()
+else:
+    _import_profiler = None
+
+import argparse
+import atexit
 from pathlib import Path
-from datetime import datetime
 from dotenv import load_dotenv
 from loguru import logger
-from tqdm import tqdm
 
 # 提前加载环境变量，确保所有模块都能访问
 load_dotenv()
@@ -16,119 +23,423 @@ load_dotenv()
 sys.path.insert(0, str(Path(__file__).parent))
 
 from src.utils import setup_logging, validate_api_keys, check_dependencies, get_project_info
-from src.llm_service import LLMService
-from src.report_generator import ReportGenerator
-from src.email_service import EmailService
-from templates.prompts import get_hydrogen_report_prompt
-from config import (
-    LOG_LEVEL, 
-    EMAIL_HOST, 
-    EMAIL_PORT, 
-    EMAIL_USER, 
-    EMAIL_PASSWORD, 
-    EMAIL_RECIPIENTS
-)
+from config import LOG_LEVEL
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="氢能产业简报生成系统")
+    parser.add_argument(
+        "--search-archive", metavar="TEXT",
+        help="在往期搜索结果和报告章节的历史索引中全文检索，不生成报告"
+    )
+    parser.add_argument(
+        "--engine-stats", action="store_true",
+        help="显示各搜索引擎对中文/英文查询的历史延迟与新增结果量"
+    )
+    parser.add_argument(
+        "--serpapi-keys", action="store_true",
+        help="显示各SerpApi密钥的用量、剩余配额与可用状态"
+    )
+    parser.add_argument(
+        "--collect", action="store_true",
+        help="执行一次增量采集：按查询计划搜索并写入本地存储（适合由cron每日调用），不生成报告"
+    )
+    parser.add_argument(
+        "--perf-history", type=int, nargs="?", const=30, metavar="N",
+        help="显示最近N次（默认30）成功运行各项指标的 p50/p95 趋势与最近的性能退化"
+    )
+    parser.add_argument(
+        "--perf-check", action="store_true",
+        help="最近一次运行相对历史基线存在性能退化时以非零状态退出（供cron或监控调用）"
+    )
+    parser.add_argument(
+        "--collect-status", action="store_true",
+        help="显示采集存储中最近各日分区的结果数与最近的采集记录"
+    )
+    parser.add_argument(
+        "--daemon", action="store_true",
+        help="以常驻服务方式运行，按内置调度（默认每两周）生成并发送报告"
+    )
+    parser.add_argument(
+        "--run-now", action="store_true",
+        help="与 --daemon 同用：启动后立即运行一次"
+    )
+    parser.add_argument(
+        "--serve", action="store_true",
+        help="启动本地HTTP服务，按需生成报告（相同请求自动合并）"
+    )
+    parser.add_argument(
+        "--batch", nargs="?", const="", metavar="VARIANTS_JSON",
+        help="批量生成多份地域/主题简报；可指定变体JSON文件，省略时使用内置变体"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=None,
+        help="与 --batch 同用：同时生成的报告数上限（默认 BATCH_CONCURRENCY）"
+    )
+    parser.add_argument(
+        "--enqueue", nargs="?", const="", metavar="VARIANTS_JSON",
+        help="将变体（格式同 --batch）作为任务加入任务队列后退出"
+    )
+    parser.add_argument(
+        "--worker", nargs="?", type=int, const=0, metavar="N",
+        help="启动N个工作进程消费任务队列（省略N时使用 WORKER_PROCESSES）"
+    )
+    parser.add_argument(
+        "--drain", action="store_true",
+        help="与 --worker 同用：队列清空后退出"
+    )
+    parser.add_argument(
+        "--queue-status", action="store_true",
+        help="显示任务队列中各状态的任务数和最近的任务"
+    )
+    parser.add_argument(
+        "--deadline", metavar="HH:MM",
+        help="本次运行的截止时刻（覆盖 RUN_DEADLINE），临近时各阶段自动降级以按时发出"
+    )
+    parser.add_argument(
+        "--regenerate-part", type=int, action="append", choices=range(1, 6), metavar="N",
+        help="以结构化格式生成报告，并重新搜索、重写第N部分（可重复指定），其余部分复用缓存"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="只检查配置并展示将要发送给LLM的提示，不调用任何外部服务"
+    )
+    parser.add_argument(
+        "--resend", action="store_true",
+        help="重新发送最近一次生成的PDF和页面图片，不重新生成报告"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="以采样分析器按阶段统计墙钟与CPU时间，折叠调用栈写入 output/runs/<运行ID>/profile/"
+    )
+    parser.add_argument(
+        "--cprofile", action="store_true",
+        help="同 --profile，并为各阶段额外写出 cProfile 的 pstats 文件（开销较大）"
+    )
+    parser.add_argument(
+        "--startup-profile", action="store_true",
+        help="退出时输出各模块的导入耗时"
+    )
+    return parser.parse_args(argv)
+
+
+def search_archive(text: str):
+    """检索历史索引并输出结果"""
+    from src.novelty_index import NoveltyIndex
+    
+    hits = NoveltyIndex().search(text)
+    logger.info(f"历史搜索结果中匹配 '{text}' 的条目: {len(hits['results'])} 条")
+    for row in hits["results"]:
+        logger.info(f"  [{row['run_id']}] {row['date'] or '无日期'} | {row['title']} ({row['source']}) {row['link']}")
+    logger.info(f"往期报告中匹配 '{text}' 的章节: {len(hits['sections'])} 个")
+    for row in hits["sections"]:
+        logger.info(f"  [{row['run_id']}] {row['part']} {row['title']}: {row['excerpt']}")
+
+
+def engine_stats():
+    """输出各搜索引擎的历史统计"""
+    from config import SERPAPI_ENGINES
+    from src.engine_stats import EngineStats
+    
+    rows = EngineStats().report([e.strip() for e in SERPAPI_ENGINES])
+    if not rows:
+        logger.info("暂无引擎统计数据")
+        return
+    logger.info(f"{'引擎':<10} {'类别':<6} {'样本':>5} {'平均新增':>8} {'新增比例':>8} {'平均延迟':>8} {'p95延迟':>8}")
+    for row in rows:
+        fmt = lambda value, spec: format(value, spec) if value is not None else "-"
+        logger.info(f"{row['engine']:<10} {row['query_class']:<6} {row['samples']:>5} "
+                    f"{fmt(row['mean_new'], '>8.1f')} {fmt(row['new_ratio'], '>8.0%')} "
+                    f"{fmt(row['mean_latency'], '>7.2f')}s {fmt(row['p95_latency'], '>7.2f')}s")
+
+
+def serpapi_keys():
+    """输出SerpApi密钥池状态"""
+    from src.search_service import SearchService
+    
+    service = SearchService()
+    if service.key_pool is None:
+        logger.error("未配置SerpApi密钥")
+        return
+    for row in service.key_pool.status():
+        state = "可用" if row["available"] else ("已停用" if row["disabled"] else "不可用")
+        logger.info(f"密钥 {row['key']}: {state} | 本月已用 {row['used_this_month']} | "
+                    f"剩余 {row['remaining'] if row['remaining'] is not None else '未知'} | "
+                    f"最近一小时 {row['last_hour']}/{row['rate_limit_per_hour'] or '未知'}"
+                    + (f" | 冷却 {row['cooldown_seconds']}s" if row["cooldown_seconds"] else ""))
+    service.close()
+
+
+def collect() -> bool:
+    """执行一次增量采集，全部查询均失败时返回False"""
+    from config import SERPAPI_API_KEYS
+    from src.collector import Collector
+    
+    if not SERPAPI_API_KEYS:
+        logger.error("未配置SerpApi密钥，无法采集")
+        return False
+    collector = Collector()
+    try:
+        stats = collector.run()
+    finally:
+        collector.close()
+    return stats["failed"] < stats["queries"]
+
+
+def collect_status():
+    """输出采集存储状态"""
+    from datetime import datetime
+    from src.collector import ResultStore
+    
+    store = ResultStore()
+    stats = store.stats()
+    total = sum(row["results"] for row in stats["partitions"])
+    logger.info(f"存储 {store.db_path}: 最近窗口内 {len(stats['partitions'])} 个分区，共 {total} 条结果")
+    for row in stats["partitions"]:
+        logger.info(f"  {row['day']}: {row['results']} 条")
+    for row in stats["collections"]:
+        finished = datetime.fromtimestamp(row["finished_at"]).strftime("%Y-%m-%d %H:%M")
+        logger.info(f"  采集 {finished}: {row['queries']} 个查询，{row['results']} 条结果，"
+                    f"新增 {row['added']} 条，失败 {row['failed']} 个查询")
+    store.close()
+
+
+def perf_history(limit: int, check_only: bool = False) -> bool:
+    """输出性能历史趋势；返回最近一次运行是否没有退化"""
+    from datetime import datetime
+    from src.perf_history import PerfHistory
+    
+    history = PerfHistory()
+    try:
+        runs = history.recent(limit)
+        if not runs:
+            logger.info("暂无性能历史")
+            return True
+        if not check_only:
+            logger.info(f"最近 {limit} 次成功运行的指标（{history.db_path}）:")
+            logger.info(f"{'指标':<40} {'次数':>4} {'最近':>12} {'p50':>12} {'p95':>12} {'最大':>12}")
+            for row in history.trends(limit):
+                logger.info(f"{row['metric']:<40} {row['runs']:>4} {row['last'] if row['last'] is not None else '-':>12} "
+                            f"{row['p50']:>12g} {row['p95']:>12g} {row['max']:>12g}")
+            for run in runs:
+                if run["regressions"]:
+                    started = datetime.fromtimestamp(run["started_at"]).strftime("%Y-%m-%d %H:%M")
+                    metrics = "，".join(f"{r['metric']} {r['value']:g}（p50 {r['p50']:g}）" for r in run["regressions"])
+                    logger.warning(f"  {started} [{run['run_id']}]{' ' + run['label'] if run['label'] else ''}: {metrics}")
+        latest = runs[0]
+        if latest["regressions"]:
+            logger.warning(f"最近一次运行 {latest['run_id']} 存在 {len(latest['regressions'])} 项性能退化")
+            return False
+        logger.info(f"最近一次运行 {latest['run_id']} 没有性能退化")
+        return True
+    finally:
+        history.close()
+
+
+def dry_run() -> bool:
+    """检查配置并展示提示词，不调用外部服务"""
+    from config import DEEPSEEK_MODEL, SERPAPI_ENGINES, EMAIL_RECIPIENTS, NOVELTY_MODE, SEARCH_SOURCE
+    from templates.prompts import get_hydrogen_report_messages
+    
+    keys_ok = validate_api_keys()
+    deps_ok = check_dependencies()
+    logger.info(f"LLM模型: {DEEPSEEK_MODEL}")
+    logger.info(f"搜索引擎: {', '.join(SERPAPI_ENGINES)}")
+    logger.info(f"收件人: {len(EMAIL_RECIPIENTS)} 个")
+    logger.info(f"新颖度模式: {NOVELTY_MODE}")
+    logger.info(f"搜索来源: {SEARCH_SOURCE}")
+    for message in get_hydrogen_report_messages():
+        logger.info(f"[{message['role']}] {len(message['content'])} 字符")
+        logger.debug(message["content"])
+    return keys_ok and deps_ok
+
+
+def resend() -> bool:
+    """重新发送最近一次生成的报告文件"""
+    from config import OUTPUT_DIR, EMAIL_HOST, EMAIL_PORT, EMAIL_USER, EMAIL_PASSWORD
+    from src.email_service import EmailService
+    from src.pipeline import send_report_email
+    
+    pdfs = sorted((OUTPUT_DIR / "reports").glob("*.pdf"), key=lambda p: p.stat().st_mtime)
+    if not pdfs:
+        logger.error("没有找到已生成的PDF报告，无法重新发送")
+        return False
+    pdf_path = pdfs[-1]
+    pages = sorted(
+        (OUTPUT_DIR / "pages").glob("hydrogen_report_page_*.png"),
+        key=lambda p: int(p.stem.rsplit("_", 1)[-1])
+    )
+    # 只附带与该PDF同一批次生成（不早于PDF前一小时）的页面图片
+    pages = [p for p in pages if p.stat().st_mtime >= pdf_path.stat().st_mtime - 3600]
+    
+    email_service = EmailService(host=EMAIL_HOST, port=EMAIL_PORT, user=EMAIL_USER, password=EMAIL_PASSWORD)
+    logger.info(f"重新发送: {pdf_path} 及 {len(pages)} 张页面图片")
+    return send_report_email(email_service, [str(pdf_path)] + [str(p) for p in pages])
 
 
 def main():
     """主函数"""
+    args = parse_args()
+    
     # 设置日志
     setup_logging(LOG_LEVEL)
     
+    if _import_profiler is not None:
+        atexit.register(lambda: logger.info(_import_profiler.report()))
+    
+    if args.search_archive:
+        search_archive(args.search_archive)
+        return
+    
+    if args.engine_stats:
+        engine_stats()
+        return
+    
+    if args.serpapi_keys:
+        serpapi_keys()
+        return
+    
+    if args.collect_status:
+        collect_status()
+        return
+    
+    if args.perf_history is not None or args.perf_check:
+        ok = perf_history(args.perf_history or 30, check_only=args.perf_history is None)
+        sys.exit(0 if ok or not args.perf_check else 1)
+    
+    if args.collect:
+        sys.exit(0 if collect() else 1)
+    
+    if args.dry_run:
+        sys.exit(0 if dry_run() else 1)
+    
+    if args.enqueue is not None:
+        enqueue(args.enqueue or None)
+        return
+    
+    if args.queue_status:
+        queue_status()
+        return
+    
+    if args.resend:
+        sys.exit(0 if resend() else 1)
+    
     # 显示项目信息
     info = get_project_info()
     logger.info(f"启动 {info['name']} v{info['version']}")
     
     # 检查依赖和API密钥
-    # if not check_dependencies():
-    #     logger.error("依赖检查失败，程序退出")
-    #     sys.exit(1)
+    if not check_dependencies():
+        logger.error("依赖检查失败，程序退出")
+        sys.exit(1)
     
     if not validate_api_keys():
         logger.error("API密钥验证失败，程序退出")
         sys.exit(1)
     
-    try:
-        # 初始化服务
-        logger.info("初始化服务...")
-        llm_service = LLMService()
-        report_generator = ReportGenerator()
-        
-        # 生成报告
-        logger.info("开始生成氢能产业简报...")
-        with tqdm(total=4, desc="生成进度") as pbar:
-            
-            # 步骤1: 生成报告内容
-            pbar.set_description("步骤1: 生成报告内容")
-            report_prompt = get_hydrogen_report_prompt()
-            markdown_content = llm_service.generate_report(report_prompt)
-            
-            if not markdown_content:
-                logger.error("报告内容生成失败")
-                return
-            
-            pbar.update(1)
-            
-            # 步骤2: 生成图片和PDF
-            pbar.set_description("步骤2: 生成报告文件")
-            image_paths, pdf_path = report_generator.generate_complete_report(markdown_content)
-            pbar.update(1)
-            
-            # 步骤3: 发送邮件
-            pbar.set_description("步骤3: 发送邮件")
-            email_service = EmailService(
-                host=EMAIL_HOST,
-                port=EMAIL_PORT,
-                user=EMAIL_USER,
-                password=EMAIL_PASSWORD
-            )
-            
-            attachments = []
-            if pdf_path:
-                attachments.append(pdf_path)
-            attachments.extend(image_paths)
-            
-            if attachments:
-                current_time_str = datetime.now().strftime("%Y年%m月%d日")
-                subject = f"{current_time_str} 氢能产业简报"
-                body = f"您好，以下附件为最新的氢能产业简报，请查收。此邮件为自动发送，请勿回复。祝好！"
-                email_service.send_email_with_attachments(
-                    recipients=EMAIL_RECIPIENTS,
-                    subject=subject,
-                    body=body,
-                    attachments=attachments
-                )
-            else:
-                logger.warning("没有文件可供发送，已跳过邮件发送。")
-            pbar.update(1)
-
-            # 步骤4: 完成
-            pbar.set_description("步骤4: 完成")
-            pbar.update(1)
-        
-        # 显示结果
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        logger.success(f"报告生成完成! ({current_time})")
+    if args.daemon:
+        run_daemon(args.run_now)
+        return
+    
+    if args.serve:
+        from src.http_service import serve
+        serve()
+        return
+    
+    if args.batch is not None:
+        sys.exit(0 if run_batch(args.batch or None, args.concurrency) else 1)
+    
+    if args.worker is not None:
+        from config import WORKER_PROCESSES
+        from src.worker import run_workers
         
-        if image_paths:
-            logger.info(f"生成了 {len(image_paths)} 张图片")
-            for i, path in enumerate(image_paths, 1):
-                logger.info(f"  页面 {i}: {path}")
+        exit_codes = run_workers(args.worker or WORKER_PROCESSES, log_level=LOG_LEVEL, exit_when_empty=args.drain)
+        sys.exit(0 if all(code == 0 for code in exit_codes) else 1)
+    
+    from src.pipeline import ReportPipeline
+    
+    pipeline = None
+    try:
+        deadline = None
+        if args.deadline:
+            from src.deadline import Deadline
+            deadline = Deadline.from_config(at=args.deadline)
         
-        if pdf_path:
-            logger.info(f"PDF报告: {pdf_path}")
+        if args.profile or args.cprofile:
+            from src.stage_profiler import StageProfiler, start_profiler
+            start_profiler(StageProfiler(cprofile=args.cprofile))
         
-        # 显示文件大小
-        if pdf_path and os.path.exists(pdf_path):
-            size = os.path.getsize(pdf_path)
-            from src.utils import format_file_size
-            logger.info(f"PDF大小: {format_file_size(size)}")
+        pipeline = ReportPipeline()
+        result = pipeline.run(deadline=deadline, regenerate_parts=args.regenerate_part)
+        # 内容生成失败时与以往一致地直接返回，其余失败以非零状态退出
+        if result.error and not result.markdown:
+            return
+        if not result.success:
+            sys.exit(1)
         
     except KeyboardInterrupt:
         logger.warning("用户中断程序")
     except Exception as e:
         logger.error(f"程序执行过程中发生错误: {e}")
         sys.exit(1)
+    finally:
+        if pipeline:
+            pipeline.close()
+
+
+def run_batch(variants_path=None, concurrency=None) -> bool:
+    """批量生成多份简报，全部成功时返回True"""
+    from config import BATCH_CONCURRENCY
+    from src.batch import BatchRunner, load_variants
+    
+    variants = load_variants(variants_path)
+    runner = BatchRunner(concurrency or BATCH_CONCURRENCY)
+    try:
+        results = runner.run(variants)
+    finally:
+        runner.close()
+    return all(result.success for result in results.values())
+
+
+def enqueue(variants_path=None):
+    """将变体作为任务加入任务队列"""
+    from src.batch import load_variants
+    from src.job_queue import JobQueue
+    from src.worker import job_payload
+    
+    queue = JobQueue()
+    for variant in load_variants(variants_path):
+        job_id = queue.enqueue(job_payload({
+            "name": variant.name,
+            "region": variant.region,
+            "topic": variant.topic,
+            "recipients": variant.recipients,
+        }))
+        logger.info(f"已加入任务 {job_id}: {variant.name}（{variant.label}）")
+    logger.info(f"队列状态: {queue.stats()}")
+
+
+def queue_status():
+    """显示任务队列状态"""
+    from src.job_queue import JobQueue
+    
+    queue = JobQueue()
+    logger.info(f"队列 {queue.db_path}: {queue.stats()}")
+    for job in queue.list_jobs(20):
+        owner = f" @ {job['lease_owner']}" if job["lease_owner"] else ""
+        error = f" - {job['error']}" if job["error"] else ""
+        logger.info(f"  #{job['id']} {job['payload'].get('name', '-'):<16} {job['status']:<9} "
+                    f"{job['attempts']}/{job['max_attempts']}{owner}{error}")
+
+
+def run_daemon(run_now: bool = False):
+    """以常驻服务方式运行"""
+    from src.daemon import ReportDaemon
+    
+    daemon = ReportDaemon()
+    daemon.install_signal_handlers()
+    daemon.serve_forever(run_immediately=run_now)
 
 
 if __name__ == "__main__":
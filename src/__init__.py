@@ -7,23 +7,39 @@ __author__ = "iuany7"
 __email__ = "nuozhixia123@gmail.com"
 __description__ = "基于LLM和搜索引擎的氢能产业简报自动生成系统"
 
-from .llm_service import LLMService
-from .search_service import SearchService
-from .report_generator import ReportGenerator
-from .utils import (
-    setup_logging,
-    validate_api_keys,
-    check_dependencies,
-    get_project_info,
-    ensure_dir,
-    format_file_size,
-    clean_output_directory
-)
+# 子模块按需加载（PEP 562），导入 src 包本身不会拉起 openai、PIL 等较重的依赖
+_LAZY_EXPORTS = {
+    "LLMService": ".llm_service",
+    "SearchService": ".search_service",
+    "ReportGenerator": ".report_generator",
+    "ReportPipeline": ".pipeline",
+    "PipelineResult": ".pipeline",
+    "setup_logging": ".utils",
+    "validate_api_keys": ".utils",
+    "check_dependencies": ".utils",
+    "get_project_info": ".utils",
+    "ensure_dir": ".utils",
+    "format_file_size": ".utils",
+    "clean_output_directory": ".utils",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     "LLMService",
     "SearchService", 
     "ReportGenerator",
+    "ReportPipeline",
+    "PipelineResult",
     "setup_logging",
     "validate_api_keys",
     "check_dependencies",
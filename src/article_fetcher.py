@@ -0,0 +1,458 @@
+"""
+正文抓取模块
+
+搜索结果只有一两句摘要，数据类信息（产能、装机量、销量等）常常缺失。启用后
+（ARTICLE_ENRICH_ENABLED），搜索完成后并发抓取排名靠前的结果页面，提取正文与包含数字的句子，
+作为摘录补充到搜索结果中：
+
+- asyncio + httpx 并发抓取，总并发与单站点并发分别受限，单页超时、整批总耗时受限；
+- 遵守各站点的 robots.txt（无法获取时视为允许）；
+- 提取结果按 URL 缓存在本地 SQLite 中，过期后携带 ETag / Last-Modified 条件请求，
+  未变化（304）时直接复用，重复运行不会重新下载。
+"""
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+from loguru import logger
+from config import (
+    ARTICLE_CACHE_PATH,
+    ARTICLE_CACHE_TTL_HOURS,
+    ARTICLE_EXCERPT_CHARS,
+    ARTICLE_FETCH_BUDGET,
+    ARTICLE_FETCH_CONCURRENCY,
+    ARTICLE_FETCH_TIMEOUT,
+    ARTICLE_MAX_BYTES,
+    ARTICLE_MAX_FACTS,
+    ARTICLE_PER_HOST_LIMIT,
+    ARTICLE_TOP_N,
+    ARTICLE_USER_AGENT,
+    DEADLINE_RESERVE_DELIVERY,
+    DEADLINE_RESERVE_WRITE,
+)
+from .deadline import get_deadline
+from .search_results import SearchResultBatch
+from .tracing import get_tracer
+from .utils import ensure_dir
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    title TEXT,
+    text TEXT,
+    facts TEXT,
+    fetched_at REAL
+);
+"""
+
+# 正文提取时跳过的标签（导航、脚本、页眉页脚等）
+SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form",
+             "iframe", "svg", "button", "select", "template"}
+BLOCK_TAGS = {"p", "div", "li", "td", "th", "tr", "br", "h1", "h2", "h3", "h4", "h5", "h6",
+              "article", "main", "section", "blockquote", "pre", "table", "ul", "ol"}
+MAIN_TAGS = {"article", "main"}
+MIN_BLOCK_CHARS = 20  # 短于该长度的文本块（菜单、按钮、版权声明等）不计入正文
+MIN_MAIN_CHARS = 200  # <article>/<main> 中的正文达到该长度时只使用其中的内容
+
+SENTENCE_SPLIT = re.compile(r"(?<=[。！？；!?;])|\n+|(?<=\.)\s+")
+FACT_PATTERN = re.compile(
+    r"\d[\d,.]*\s*(?:%|％|亿|万|千|百万|吨|千克|公斤|kg|GW|MW|kW|GWh|MWh|TWh|Nm3|标方|"
+    r"元|美元|欧元|日元|韩元|辆|座|台|套|家|项|公里|km|倍)",
+    re.IGNORECASE,
+)
+META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+
+class _TextExtractor(HTMLParser):
+    """收集页面中的文本块，并记录其是否位于 <article>/<main> 内"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Tuple[str, bool]] = []
+        self.title = ""
+        self._buffer: List[str] = []
+        self._skip_depth = 0
+        self._main_depth = 0
+        self._in_title = False
+
+    def _flush(self):
+        text = " ".join("".join(self._buffer).split())
+        if text:
+            self.blocks.append((text, self._main_depth > 0))
+        self._buffer = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in MAIN_TAGS:
+            self._main_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "title":
+            self._in_title = False
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in MAIN_TAGS:
+            self._main_depth = max(0, self._main_depth - 1)
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data.strip()
+        elif not self._skip_depth:
+            self._buffer.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def extract_facts(text: str, limit: int = ARTICLE_MAX_FACTS) -> List[str]:
+    """提取包含数量、金额、比例等数据的句子"""
+    facts = []
+    for sentence in SENTENCE_SPLIT.split(text):
+        sentence = (sentence or "").strip()
+        if 10 <= len(sentence) <= 200 and FACT_PATTERN.search(sentence) and sentence not in facts:
+            facts.append(sentence)
+            if len(facts) >= limit:
+                break
+    return facts
+
+
+def extract_article(html: str) -> Dict:
+    """
+    提取页面标题、正文与数据句
+
+    Returns:
+        {"title", "text", "facts"}
+    """
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:  # 残缺的HTML只保留已解析的部分
+        logger.debug(f"解析页面时出错: {e}")
+    main = [text for text, in_main in parser.blocks if in_main]
+    blocks = main if sum(len(text) for text in main) >= MIN_MAIN_CHARS else [text for text, _ in parser.blocks]
+    text = "\n".join(block for block in blocks if len(block) >= MIN_BLOCK_CHARS)
+    return {"title": parser.title, "text": text, "facts": extract_facts(text)}
+
+
+def _decode(body: bytes, encoding: Optional[str]) -> str:
+    # 响应头未声明编码时参考 <meta charset>，兼容仍使用GBK的中文站点
+    if not encoding:
+        match = META_CHARSET.search(body[:4096])
+        encoding = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        return body.decode(encoding, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+class ArticleCache:
+    """按URL缓存的页面提取结果"""
+
+    def __init__(self, db_path: Union[str, Path] = ARTICLE_CACHE_PATH,
+                 ttl_hours: float = ARTICLE_CACHE_TTL_HOURS):
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_hours * 3600
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            ensure_dir(self.db_path.parent)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, urls: List[str]) -> Dict[str, Tuple[Dict, bool]]:
+        """
+        批量读取缓存（抓取前在事件循环外调用一次）
+
+        Returns:
+            {url: (缓存的提取结果, 是否仍在有效期内)}，未缓存的URL不在其中
+        """
+        rows = []
+        with self._lock:
+            for i in range(0, len(urls), 500):  # 不超过 SQLite 的参数个数上限
+                chunk = urls[i:i + 500]
+                rows += self.conn.execute(
+                    f"SELECT * FROM articles WHERE url IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+        now = time.time()
+        return {
+            row["url"]: ({
+                "url": row["url"],
+                "title": row["title"],
+                "text": row["text"],
+                "facts": json.loads(row["facts"] or "[]"),
+                "etag": row["etag"],
+                "last_modified": row["last_modified"],
+            }, now - row["fetched_at"] < self.ttl_seconds)
+            for row in rows
+        }
+
+    def put_many(self, articles: List[Dict]):
+        """批量写入新抓取的提取结果"""
+        if not articles:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO articles (url, etag, last_modified, title, text, facts, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(article["url"], article.get("etag"), article.get("last_modified"), article["title"],
+                      article["text"], json.dumps(article["facts"], ensure_ascii=False), now)
+                     for article in articles],
+                )
+                self.conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"写入正文缓存失败: {e}")
+
+    def touch_many(self, urls: List[str]):
+        """条件请求确认内容未变化后，延长缓存有效期"""
+        if not urls:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                self.conn.executemany("UPDATE articles SET fetched_at = ? WHERE url = ?", [(now, url) for url in urls])
+                self.conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"更新正文缓存失败: {e}")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class ArticleFetcher:
+    """有界并发的页面抓取与正文提取"""
+
+    def __init__(self, cache: Optional[ArticleCache] = None,
+                 concurrency: int = ARTICLE_FETCH_CONCURRENCY,
+                 per_host: int = ARTICLE_PER_HOST_LIMIT,
+                 timeout: float = ARTICLE_FETCH_TIMEOUT,
+                 max_bytes: int = ARTICLE_MAX_BYTES,
+                 user_agent: str = ARTICLE_USER_AGENT):
+        """
+        Args:
+            cache: 提取结果缓存，默认使用 ARTICLE_CACHE_PATH
+            concurrency: 同时抓取的页面数上限
+            per_host: 同一站点同时抓取的页面数上限
+            timeout: 单个页面的超时（秒）
+            max_bytes: 单个页面读取的字节数上限
+            user_agent: 请求及匹配 robots.txt 规则时使用的 User-Agent
+        """
+        self.cache = cache or ArticleCache()
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.user_agent = user_agent
+
+    def enrich(self, results: SearchResultBatch, top_n: int = ARTICLE_TOP_N) -> SearchResultBatch:
+        """
+        抓取排名靠前的结果页面（本期新结果优先），将正文摘录与数据句写入 excerpt / facts 列
+
+        Args:
+            results: 搜索结果（原地补充）
+            top_n: 抓取的页面数量
+
+        Returns:
+            补充后的搜索结果
+        """
+        deadline = get_deadline()
+        reserve = DEADLINE_RESERVE_WRITE + DEADLINE_RESERVE_DELIVERY
+        if deadline.tight(reserve):
+            deadline.degrade("search", "skip_enrichment")
+            return results
+        candidates = sorted(
+            (i for i, row in enumerate(results) if row.get("link", "").startswith(("http://", "https://"))),
+            key=lambda i: results[i].get("novelty") == "covered",
+        )[:top_n]
+        if not candidates:
+            return results
+
+        tracer = get_tracer()
+        with tracer.span("search.enrich", pages=len(candidates)) as span:
+            articles, stats = self.fetch_all([results[i]["link"] for i in candidates],
+                                             budget=deadline.timeout(ARTICLE_FETCH_BUDGET, reserve=reserve))
+            enriched = 0
+            for i in candidates:
+                article = articles.get(results[i]["link"])
+                if article and (article["text"] or article["facts"]):
+                    results[i]["excerpt"] = article["text"][:ARTICLE_EXCERPT_CHARS]
+                    results[i]["facts"] = article["facts"]
+                    enriched += 1
+            span.set_attributes(enriched=enriched, **stats)
+        for outcome, count in stats.items():
+            tracer.incr("article_fetches", count, outcome=outcome)
+        logger.info(f"正文抓取完成: {enriched}/{len(candidates)} 条结果已补充正文摘录 {dict(stats)}")
+        return results
+
+    def fetch_all(self, urls: Iterable[str], budget: float = ARTICLE_FETCH_BUDGET) -> Tuple[Dict[str, Dict], Dict[str, int]]:
+        """
+        抓取一批页面（同步入口，内部使用独立的事件循环）
+
+        缓存在事件循环外批量读取和写入，协程中不访问 SQLite。
+
+        Args:
+            urls: 页面地址
+            budget: 整批的总耗时上限（秒），到时未完成的页面放弃
+
+        Returns:
+            ({url: {"url", "title", "text", "facts", ...}}, 各结果的计数)
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}, {}
+        try:
+            cached = self.cache.get_many(urls)
+        except sqlite3.Error as e:
+            logger.warning(f"读取正文缓存失败: {e}")
+            cached = {}
+        articles = {url: article for url, (article, fresh) in cached.items() if fresh}
+        stale = {url: article for url, (article, fresh) in cached.items() if not fresh}
+        stats: Counter = Counter()
+        if articles:
+            stats["cached"] = len(articles)
+        revalidated: List[str] = []
+        fetched: List[Dict] = []
+        pending = [url for url in urls if url not in articles]
+        if pending:
+            articles.update(asyncio.run(self._fetch_all(pending, stale, budget, stats, revalidated, fetched)))
+        self.cache.touch_many(revalidated)
+        self.cache.put_many(fetched)
+        return articles, dict(stats)
+
+    async def _fetch_all(self, urls: List[str], stale: Dict[str, Dict], budget: float, stats: Counter,
+                         revalidated: List[str], fetched: List[Dict]) -> Dict[str, Dict]:
+        import httpx
+
+        robots: Dict[str, asyncio.Future] = {}
+        limit = asyncio.Semaphore(self.concurrency)
+        host_limits: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+
+        async with httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": self.user_agent},
+            limits=httpx.Limits(max_connections=self.concurrency),
+        ) as client:
+            tasks = {
+                asyncio.ensure_future(self._fetch_one(client, url, stale.get(url), limit, host_limits, robots,
+                                                      stats, revalidated, fetched)): url
+                for url in urls
+            }
+            done, pending = await asyncio.wait(tasks, timeout=budget)
+            for task in pending:
+                task.cancel()
+            if pending:
+                stats["abandoned"] += len(pending)
+                await asyncio.gather(*pending, return_exceptions=True)
+            for future in robots.values():
+                future.cancel()
+
+        articles = {}
+        for task in done:
+            article = task.result()
+            if article is not None:
+                articles[tasks[task]] = article
+        return articles
+
+    async def _fetch_one(self, client, url: str, cached: Optional[Dict], limit: asyncio.Semaphore,
+                         host_limits: Dict[str, asyncio.Semaphore], robots: Dict[str, asyncio.Future],
+                         stats: Counter, revalidated: List[str], fetched: List[Dict]) -> Optional[Dict]:
+        """抓取单个页面；cached 为已过期的缓存（用于条件请求），缓存的更新记录到 revalidated / fetched"""
+        import httpx
+
+        try:
+            async with host_limits[urlsplit(url).netloc], limit:
+                if not await self._allowed(client, url, robots):
+                    stats["disallowed"] += 1
+                    return None
+                headers = {}
+                if cached is not None and cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached is not None and cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and cached is not None:
+                        revalidated.append(url)
+                        stats["revalidated"] += 1
+                        return cached
+                    if response.status_code >= 400:
+                        stats["failed"] += 1
+                        return None
+                    if "html" not in response.headers.get("content-type", "html"):
+                        stats["skipped"] += 1
+                        return None
+                    body = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        body += chunk
+                        if len(body) >= self.max_bytes:
+                            break
+                    charset = response.charset_encoding
+                    etag = response.headers.get("etag")
+                    last_modified = response.headers.get("last-modified")
+        # 无法解析的链接（ValueError、InvalidURL）只影响这一个页面
+        except (httpx.HTTPError, httpx.InvalidURL, ValueError) as e:
+            logger.debug(f"抓取 {url} 失败: {e}")
+            stats["failed"] += 1
+            return None
+
+        article = {"url": url, "etag": etag, "last_modified": last_modified,
+                   **extract_article(_decode(bytes(body), charset))}
+        fetched.append(article)
+        stats["fetched"] += 1
+        return article
+
+    async def _allowed(self, client, url: str, robots: Dict[str, asyncio.Future]) -> bool:
+        """按站点的 robots.txt 判断是否允许抓取；同一站点只请求一次 robots.txt"""
+        parts = urlsplit(url)
+        base = f"{parts.scheme}://{parts.netloc}"
+        if base not in robots:
+            robots[base] = asyncio.ensure_future(self._load_robots(client, base))
+        parser = await asyncio.shield(robots[base])
+        return parser is None or parser.can_fetch(self.user_agent, url)
+
+    @staticmethod
+    async def _load_robots(client, base: str) -> Optional[RobotFileParser]:
+        import httpx
+
+        try:
+            response = await client.get(f"{base}/robots.txt")
+        except httpx.HTTPError:
+            return None  # 无法获取时视为允许
+        if response.status_code >= 400:
+            return None
+        parser = RobotFileParser()
+        parser.parse(response.text.splitlines())
+        return parser
+
+    def close(self):
+        self.cache.close()
@@ -0,0 +1,132 @@
+"""
+批量生成模块
+
+在同一进程内按多个提示变体（地域、细分主题）生成多份简报：
+所有报告共享一个搜索缓存、一个HTTP连接池、一个LLM客户端和一个截图器池，
+按全局并发上限同时运行，并分别发送给各自的收件人。
+"""
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from loguru import logger
+from config import BATCH_CONCURRENCY, EMAIL_RECIPIENTS, SERPAPI_ENGINES
+from templates.prompts import DEFAULT_REPORT_VARIANTS, get_hydrogen_report_messages
+from .llm_service import LLMService
+from .pipeline import PipelineResult, ReportPipeline
+from .report_generator import ReportGenerator
+from .search_service import SearchCache, SearchService
+
+
+class ReportVariant:
+    """一份报告的提示变体"""
+
+    def __init__(self, name: str, region: Optional[str] = None, topic: Optional[str] = None,
+                 recipients: Optional[List[str]] = None):
+        # 名称用于输出文件名，只保留安全字符
+        self.name = re.sub(r"[^\w\-]+", "_", name).strip("_") or "variant"
+        self.region = region
+        self.topic = topic
+        self.recipients = list(EMAIL_RECIPIENTS) if recipients is None else list(recipients)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ReportVariant":
+        return cls(
+            name=data["name"],
+            region=data.get("region"),
+            topic=data.get("topic"),
+            recipients=data.get("recipients"),
+        )
+
+    @property
+    def label(self) -> str:
+        """邮件主题中使用的标签"""
+        if self.region:
+            return self.region
+        if self.topic:
+            return self.topic.split("（")[0]
+        return self.name
+
+    def messages(self) -> List[Dict[str, str]]:
+        return get_hydrogen_report_messages(topic=self.topic, region=self.region)
+
+
+def load_variants(path: Optional[Union[str, Path]] = None) -> List[ReportVariant]:
+    """
+    读取变体列表
+
+    Args:
+        path: JSON文件路径，内容为 [{"name", "region", "topic", "recipients"}, ...]；
+              为空时使用 templates.prompts.DEFAULT_REPORT_VARIANTS
+
+    Returns:
+        变体列表
+    """
+    if path is None:
+        items = DEFAULT_REPORT_VARIANTS
+    else:
+        items = json.loads(Path(path).read_text(encoding="utf-8"))
+    variants = [ReportVariant.from_dict(item) for item in items]
+    names = [v.name for v in variants]
+    if len(set(names)) != len(names):
+        raise ValueError(f"变体名称重复: {names}")
+    return variants
+
+
+class BatchRunner:
+    """共享资源的批量报告生成器"""
+
+    def __init__(self, concurrency: int = BATCH_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self.search_cache = SearchCache()
+        search_service = SearchService(
+            cache=self.search_cache,
+            pool_size=self.concurrency * max(1, len(SERPAPI_ENGINES)),
+        )
+        self.pipeline = ReportPipeline(
+            llm_service=LLMService(search_service=search_service),
+            report_generator=ReportGenerator(browser_pool_size=self.concurrency),
+        )
+
+    def run(self, variants: List[ReportVariant]) -> Dict[str, PipelineResult]:
+        """
+        并发生成所有变体的报告
+
+        Returns:
+            {变体名称: 运行结果}
+        """
+        logger.info(f"批量生成 {len(variants)} 份报告，并发上限 {self.concurrency}")
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+            futures = {variant.name: executor.submit(self._run_variant, variant) for variant in variants}
+            results = {name: future.result() for name, future in futures.items()}
+
+        succeeded = sum(1 for r in results.values() if r.success)
+        logger.info(
+            f"批量生成完成: 成功 {succeeded}/{len(results)}，"
+            f"搜索缓存命中 {self.search_cache.hits} 次 / 实际请求 {self.search_cache.misses} 次"
+        )
+        for name, result in results.items():
+            status = "成功" if result.success else f"失败（{result.error}）"
+            logger.info(f"  {name:<16} {status} | {result.duration:6.1f}s | {result.pdf_path or '-'}")
+        return results
+
+    def _run_variant(self, variant: ReportVariant) -> PipelineResult:
+        logger.info(f"开始生成变体 {variant.name}（{variant.label}）")
+        try:
+            return self.pipeline.run(
+                variant.messages(),
+                recipients=variant.recipients,
+                show_progress=False,
+                job_name=variant.name,
+                send_email=bool(variant.recipients),
+                label=variant.label,
+            )
+        except Exception as e:
+            logger.error(f"变体 {variant.name} 生成失败: {e}", exc_info=True)
+            result = PipelineResult(run_id="")
+            result.error = str(e)
+            return result
+
+    def close(self):
+        self.pipeline.close()
@@ -0,0 +1,292 @@
+"""
+增量采集模块
+
+把搜索从报告运行中移出：采集模式（python main.py --collect，可由cron每日调用，
+或在常驻服务中每日 COLLECT_RUN_TIME 自动运行）按查询计划执行搜索，
+将去重后的结果按首次采集日期分区写入本地 SQLite。
+
+SEARCH_SOURCE=store 时，报告的时间范围截止今天、不超过 COLLECT_WINDOW_DAYS 天且未指定地域或
+关注重点（即与采集计划一致）时，报告运行直接从存储中读取该时间范围内的分区（结果条数有上限），
+不再规划查询、不做现场搜索；范围不一致、存储过旧或结果不足时回退为现场搜索。
+
+查询计划取最近窗口内各次现场搜索中LLM规划过的查询词（多个变体时取并集），
+尚无记录时使用 COLLECT_QUERIES。
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from loguru import logger
+from config import (
+    COLLECT_MAX_QUERIES,
+    COLLECT_QUERIES,
+    COLLECT_RETENTION_DAYS,
+    COLLECT_STORE_PATH,
+    COLLECT_WINDOW_DAYS,
+    SEARCH_DELAY,
+)
+from .deadline import Deadline, start_deadline
+from .search_results import SearchResultBatch
+from .tracing import start_run
+from .utils import ensure_dir
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL,
+    link TEXT UNIQUE,
+    title TEXT,
+    date TEXT,
+    source TEXT,
+    snippet TEXT,
+    engine TEXT,
+    query TEXT,
+    first_seen REAL,
+    last_seen REAL
+);
+CREATE INDEX IF NOT EXISTS idx_results_day ON results(day);
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY,
+    queries TEXT,
+    created_at REAL
+);
+CREATE TABLE IF NOT EXISTS collections (
+    id INTEGER PRIMARY KEY,
+    day TEXT,
+    started_at REAL,
+    finished_at REAL,
+    queries INTEGER,
+    results INTEGER,
+    added INTEGER,
+    failed INTEGER
+);
+"""
+
+RESULT_COLUMNS = ("title", "link", "date", "source", "snippet", "engine", "query")
+
+
+class ResultStore:
+    """按采集日期（day 列，YYYY-MM-DD）分区的搜索结果存储"""
+
+    def __init__(self, db_path: Union[str, Path] = COLLECT_STORE_PATH,
+                 retention_days: int = COLLECT_RETENTION_DAYS):
+        """
+        Args:
+            db_path: SQLite数据库路径
+            retention_days: 分区保留天数
+        """
+        self.db_path = Path(db_path)
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            ensure_dir(self.db_path.parent)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def add(self, results: SearchResultBatch, day: Optional[date] = None) -> int:
+        """
+        写入一批结果；已存在的链接只更新最后出现时间，仍留在首次采集的分区
+
+        Returns:
+            新增的条数
+        """
+        day = (day or date.today()).isoformat()
+        now = time.time()
+        rows = [r for r in results if r.get("link")]
+        with self._lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO results (day, title, link, date, source, snippet, engine, query,"
+                " first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(day, *(r.get(name) or "" for name in RESULT_COLUMNS), now, now) for r in rows],
+            )
+            added = self.conn.total_changes - before
+            self.conn.executemany(
+                "UPDATE results SET last_seen = ? WHERE link = ? AND last_seen < ?",
+                [(now, r["link"], now) for r in rows],
+            )
+        return added
+
+    def window(self, since: date, until: Optional[date] = None,
+               limit: Optional[int] = None) -> SearchResultBatch:
+        """
+        读取采集日期在 [since, until]（until 默认今天）内的分区，新分区在前
+
+        Args:
+            since: 起始采集日期（含）
+            until: 结束采集日期（含）
+            limit: 最多读取的条数，超出时舍弃较早的分区
+        """
+        until = until or date.today()
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(RESULT_COLUMNS)} FROM results WHERE day >= ? AND day <= ?"
+                " ORDER BY day DESC, id LIMIT ?",
+                (since.isoformat(), until.isoformat(), -1 if limit is None else limit),
+            ).fetchall()
+        batch = SearchResultBatch()
+        for row in rows:
+            batch.append(**dict(row))
+        return batch
+
+    def last_collected_at(self) -> Optional[float]:
+        """最近一次完成采集的时间戳"""
+        with self._lock:
+            row = self.conn.execute("SELECT MAX(finished_at) AS t FROM collections").fetchone()
+        return row["t"]
+
+    def record_collection(self, day: date, started_at: float, queries: int,
+                          results: int, added: int, failed: int):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO collections (day, started_at, finished_at, queries, results, added, failed)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (day.isoformat(), started_at, time.time(), queries, results, added, failed),
+            )
+
+    def save_plan(self, queries: List[str]):
+        """保存一次LLM规划的查询词，供之后的采集复用"""
+        if not queries:
+            return
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO plans (queries, created_at) VALUES (?, ?)",
+                              (json.dumps(queries, ensure_ascii=False), time.time()))
+
+    def recent_queries(self, days: int = COLLECT_WINDOW_DAYS) -> List[str]:
+        """最近 days 天内规划过的查询词（去重，新规划在前）"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT queries FROM plans WHERE created_at >= ? ORDER BY created_at DESC",
+                (time.time() - days * 86400,),
+            ).fetchall()
+        queries: Dict[str, None] = {}
+        for row in rows:
+            for query in json.loads(row["queries"]):
+                queries.setdefault(query.strip(), None)
+        return [query for query in queries if query]
+
+    def prune(self, today: Optional[date] = None) -> int:
+        """删除超过保留天数的分区，返回删除的条数"""
+        cutoff = ((today or date.today()) - timedelta(days=self.retention_days)).isoformat()
+        with self._lock, self.conn:
+            cursor = self.conn.execute("DELETE FROM results WHERE day < ?", (cutoff,))
+            self.conn.execute("DELETE FROM plans WHERE created_at < ?",
+                              (time.time() - self.retention_days * 86400,))
+        return cursor.rowcount
+
+    def stats(self, days: int = COLLECT_WINDOW_DAYS) -> Dict:
+        """各分区条数与最近的采集记录"""
+        since = (date.today() - timedelta(days=days)).isoformat()
+        with self._lock:
+            partitions = self.conn.execute(
+                "SELECT day, COUNT(*) AS results FROM results WHERE day > ? GROUP BY day ORDER BY day DESC",
+                (since,),
+            ).fetchall()
+            collections = self.conn.execute(
+                "SELECT * FROM collections ORDER BY finished_at DESC LIMIT 10"
+            ).fetchall()
+        return {
+            "partitions": [dict(row) for row in partitions],
+            "collections": [dict(row) for row in collections],
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class Collector:
+    """按查询计划执行一次采集"""
+
+    def __init__(self, search_service=None, store: Optional[ResultStore] = None,
+                 max_queries: int = COLLECT_MAX_QUERIES):
+        """
+        Args:
+            search_service: 搜索服务，默认新建 SearchService
+            store: 结果存储，默认使用 COLLECT_STORE_PATH
+            max_queries: 每次采集执行的查询词数量上限
+        """
+        # 只关闭自己创建的服务；常驻服务中与报告流水线共享的实例由流水线关闭
+        self._owned = []
+        if search_service is None:
+            from .search_service import SearchService
+            search_service = SearchService()
+            self._owned.append(search_service)
+        if store is None:
+            store = ResultStore()
+            self._owned.append(store)
+        self.search_service = search_service
+        self.store = store
+        self.max_queries = max_queries
+
+    def plan(self) -> List[str]:
+        """本次采集的查询词：最近规划过的查询词，没有时使用默认计划"""
+        return (self.store.recent_queries() or list(COLLECT_QUERIES))[:self.max_queries]
+
+    def run(self, queries: Optional[List[str]] = None) -> Dict:
+        """
+        执行一次采集：逐一搜索，每个查询的结果立即写入当天分区
+
+        采集有自己的追踪器且不限时，不沿用同一线程中上一次报告运行的追踪器与（可能已过期的）截止时间。
+
+        Args:
+            queries: 查询词，默认使用 plan()
+
+        Returns:
+            {"day", "queries", "results", "added", "failed", "pruned", "duration"}
+        """
+        queries = queries or self.plan()
+        today = date.today()
+        started_at = time.time()
+        stats = {"day": today.isoformat(), "queries": len(queries), "results": 0, "added": 0, "failed": 0}
+        logger.info(f"开始采集 {today}：{len(queries)} 个查询词")
+
+        tracer = start_run()
+        start_deadline(Deadline())
+        with tracer.span("collect", queries=len(queries)) as span:
+            for query in queries:
+                try:
+                    results = self.search_service.search(query)
+                    added = self.store.add(results, today) if results else 0
+                except Exception as e:
+                    # 单个查询失败不影响其余查询，已写入的结果保留
+                    logger.warning(f"采集查询 '{query}' 失败: {e}")
+                    stats["failed"] += 1
+                    continue
+                if not results:
+                    # search() 记录并吞掉各引擎的错误，所有引擎都没有返回结果时按失败计
+                    logger.warning(f"采集查询 '{query}' 没有任何引擎返回结果，记为失败")
+                    stats["failed"] += 1
+                stats["results"] += len(results)
+                stats["added"] += added
+                if not self.search_service.paced:
+                    time.sleep(SEARCH_DELAY)
+            stats["pruned"] = self.store.prune(today)
+            span.set_attributes(**{k: v for k, v in stats.items() if k != "day"})
+
+        if stats["failed"] < len(queries):
+            self.store.record_collection(today, started_at, len(queries), stats["results"],
+                                         stats["added"], stats["failed"])
+        else:
+            # 不记录为一次完成的采集，报告运行据此判断存储已过旧并回退为现场搜索
+            logger.error("本次采集的查询全部失败，不记录采集时间")
+        tracer.incr("collected_results", stats["added"])
+        stats["duration"] = round(time.time() - started_at, 1)
+        logger.success(f"采集完成: {stats}")
+        return stats
+
+    def close(self):
+        for owned in self._owned:
+            owned.close()
@@ -0,0 +1,244 @@
+"""
+常驻服务模块
+
+以守护进程方式运行报告流水线：内置按周期触发的调度器（默认每两周一次），
+支持信号或触发文件发起临时运行，运行之间保持HTTP会话、LLM客户端和截图器常驻，
+并定期写出健康状态文件。收到 SIGTERM/SIGINT 时等待当前运行结束后退出。
+SEARCH_SOURCE=store 时还会每天 COLLECT_RUN_TIME 执行一次增量采集。
+"""
+import json
+import os
+import signal
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Union
+from loguru import logger
+from config import (
+    COLLECT_RUN_TIME,
+    DAEMON_ANCHOR_DATE,
+    DAEMON_EVERY_WEEKS,
+    DAEMON_HEALTH_PATH,
+    DAEMON_POLL_INTERVAL,
+    DAEMON_RUN_TIME,
+    DAEMON_TRIGGER_PATH,
+    SEARCH_SOURCE,
+)
+from .collector import Collector
+from .pipeline import PipelineResult, ReportPipeline
+from .utils import ensure_dir
+
+
+class BiweeklySchedule:
+    """
+    类cron的周期调度：从锚定日期开始，每隔 every_weeks 周在 run_time 触发一次。
+
+    例如锚定日期为某个周一、every_weeks=2、run_time="07:00"，即"每隔一周的周一07:00"。
+    """
+
+    def __init__(self, anchor: Union[str, date] = DAEMON_ANCHOR_DATE,
+                 every_weeks: int = DAEMON_EVERY_WEEKS, run_time: str = DAEMON_RUN_TIME):
+        self.anchor = date.fromisoformat(anchor) if isinstance(anchor, str) else anchor
+        self.every_weeks = max(1, every_weeks)
+        hour, minute = (int(part) for part in run_time.split(":"))
+        self.run_time = (hour, minute)
+
+    def next_after(self, now: datetime) -> datetime:
+        """返回严格晚于 now 的下一次触发时间"""
+        period = timedelta(weeks=self.every_weeks)
+        first = datetime.combine(self.anchor, datetime.min.time()).replace(
+            hour=self.run_time[0], minute=self.run_time[1]
+        )
+        if now < first:
+            return first
+        periods = (now - first) // period + 1
+        return first + periods * period
+
+    def __repr__(self) -> str:
+        return (f"BiweeklySchedule(anchor={self.anchor}, every_weeks={self.every_weeks}, "
+                f"run_time={self.run_time[0]:02d}:{self.run_time[1]:02d})")
+
+
+class DailySchedule:
+    """每天在 run_time 触发一次"""
+
+    def __init__(self, run_time: str = COLLECT_RUN_TIME):
+        hour, minute = (int(part) for part in run_time.split(":"))
+        self.run_time = (hour, minute)
+
+    def next_after(self, now: datetime) -> datetime:
+        """返回严格晚于 now 的下一次触发时间"""
+        candidate = now.replace(hour=self.run_time[0], minute=self.run_time[1], second=0, microsecond=0)
+        return candidate if candidate > now else candidate + timedelta(days=1)
+
+    def __repr__(self) -> str:
+        return f"DailySchedule(run_time={self.run_time[0]:02d}:{self.run_time[1]:02d})"
+
+
+class ReportDaemon:
+    """按调度运行报告流水线的常驻服务"""
+
+    def __init__(self, schedule: Optional[BiweeklySchedule] = None,
+                 pipeline: Optional[ReportPipeline] = None,
+                 health_path: Union[str, Path] = DAEMON_HEALTH_PATH,
+                 trigger_path: Union[str, Path] = DAEMON_TRIGGER_PATH,
+                 poll_interval: float = DAEMON_POLL_INTERVAL):
+        self.schedule = schedule or BiweeklySchedule()
+        self.pipeline = pipeline or ReportPipeline()
+        self.health_path = Path(health_path)
+        self.trigger_path = Path(trigger_path)
+        self.poll_interval = poll_interval
+
+        self.started_at = datetime.now()
+        self.next_run = self.schedule.next_after(self.started_at)
+
+        # 增量采集与报告流水线共享搜索服务和结果存储
+        self.collector: Optional[Collector] = None
+        self.collect_schedule = DailySchedule()
+        self.next_collect: Optional[datetime] = None
+        self.last_collect: Optional[Dict] = None
+        if SEARCH_SOURCE == "store":
+            llm_service = self.pipeline.llm_service
+            self.collector = Collector(search_service=llm_service.search_service, store=llm_service.result_store)
+            self.next_collect = self.collect_schedule.next_after(self.started_at)
+        self.status = "idle"
+        self.last_result: Optional[PipelineResult] = None
+        self.last_finished_at: Optional[datetime] = None
+        self.runs_total = 0
+        self.failures_total = 0
+
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._adhoc_reason: Optional[str] = None
+
+    def request_run(self, reason: str = "ad-hoc"):
+        """请求一次临时运行（线程安全，可在信号处理函数中调用）"""
+        self._adhoc_reason = reason
+        self._wake.set()
+
+    def stop(self):
+        """请求优雅退出；正在进行的运行会先完成"""
+        self._stop.set()
+        self._wake.set()
+
+    def install_signal_handlers(self):
+        """注册 SIGTERM/SIGINT 优雅退出和 SIGUSR1 临时触发"""
+        def _handle_stop(signum, frame):
+            logger.warning(f"收到信号 {signum}，将在当前运行结束后退出")
+            self.stop()
+
+        signal.signal(signal.SIGTERM, _handle_stop)
+        signal.signal(signal.SIGINT, _handle_stop)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.request_run("SIGUSR1"))
+
+    def serve_forever(self, run_immediately: bool = False):
+        """
+        进入调度循环，直到收到退出请求
+
+        Args:
+            run_immediately: 启动后是否立即运行一次
+        """
+        logger.info(f"常驻服务已启动 (pid={os.getpid()})，调度: {self.schedule}")
+        logger.info(f"下一次计划运行: {self.next_run:%Y-%m-%d %H:%M}")
+        if self.next_collect:
+            logger.info(f"每日采集: {self.collect_schedule}，下一次: {self.next_collect:%Y-%m-%d %H:%M}")
+        if run_immediately:
+            self.request_run("startup")
+
+        try:
+            while not self._stop.is_set():
+                if self.next_collect and datetime.now() >= self.next_collect:
+                    self.next_collect = self.collect_schedule.next_after(datetime.now())
+                    self._collect_once()
+                    continue
+                reason = self._due_reason()
+                if reason:
+                    self._run_once(reason)
+                    continue
+                self._write_health()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        finally:
+            self.status = "stopped"
+            self._write_health()
+            self.pipeline.close()
+            logger.info("常驻服务已退出")
+
+    def _due_reason(self) -> Optional[str]:
+        if self._adhoc_reason:
+            reason, self._adhoc_reason = self._adhoc_reason, None
+            return reason
+        if self.trigger_path.exists():
+            try:
+                self.trigger_path.unlink()
+            except OSError:
+                pass
+            return "trigger-file"
+        if datetime.now() >= self.next_run:
+            self.next_run = self.schedule.next_after(datetime.now())
+            return "schedule"
+        return None
+
+    def _run_once(self, reason: str):
+        logger.info(f"开始运行（触发原因: {reason}）")
+        self.status = "running"
+        self._write_health(reason)
+        try:
+            result = self.pipeline.run(show_progress=False)
+        except Exception as e:
+            logger.error(f"运行过程中发生未处理的错误: {e}", exc_info=True)
+            result = None
+
+        self.runs_total += 1
+        if result is None or not result.success:
+            self.failures_total += 1
+        self.last_result = result
+        self.last_finished_at = datetime.now()
+        self.status = "idle"
+        self._write_health()
+        logger.info(f"运行结束，下一次计划运行: {self.next_run:%Y-%m-%d %H:%M}")
+
+    def _collect_once(self):
+        self.status = "collecting"
+        self._write_health("collect")
+        try:
+            self.last_collect = self.collector.run()
+        except Exception as e:
+            logger.error(f"增量采集失败: {e}", exc_info=True)
+            self.last_collect = {"error": str(e)}
+        self.status = "idle"
+        self._write_health()
+
+    def health(self, current_reason: Optional[str] = None) -> Dict:
+        """返回当前健康状态"""
+        last = None
+        if self.last_finished_at:
+            last = {
+                "finished_at": self.last_finished_at.isoformat(timespec="seconds"),
+                **(self.last_result.to_dict() if self.last_result else {"success": False}),
+            }
+        return {
+            "pid": os.getpid(),
+            "status": self.status,
+            "current_reason": current_reason,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "uptime_seconds": round((datetime.now() - self.started_at).total_seconds()),
+            "next_run": self.next_run.isoformat(timespec="minutes"),
+            "runs_total": self.runs_total,
+            "failures_total": self.failures_total,
+            "last_run": last,
+            "next_collect": self.next_collect.isoformat(timespec="minutes") if self.next_collect else None,
+            "last_collect": self.last_collect,
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def _write_health(self, current_reason: Optional[str] = None):
+        try:
+            ensure_dir(self.health_path.parent)
+            tmp_path = self.health_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self.health(current_reason), ensure_ascii=False, indent=2),
+                                encoding="utf-8")
+            os.replace(tmp_path, self.health_path)
+        except Exception as e:
+            logger.warning(f"写入健康状态失败: {e}")
@@ -0,0 +1,127 @@
+"""
+运行截止时间模块
+
+为一次运行设定截止时间（如每天 08:00 前必须发出），并在当前上下文中传递给
+搜索、LLM、渲染和邮件各阶段。各阶段据剩余时间收紧超时或主动降级
+（减少引擎与查询、缩小结果规模、只发送PDF），降级决定记录在运行结果中。
+"""
+import math
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from loguru import logger
+from config import DEADLINE_TIGHT_SECONDS, RUN_BUDGET_SECONDS, RUN_DEADLINE
+from .tracing import get_tracer
+
+
+class Deadline:
+    """一次运行的截止时间及降级记录；expires_at 为空表示不限时"""
+
+    def __init__(self, expires_at: Optional[datetime] = None):
+        self.expires_at = expires_at
+        self._monotonic = (
+            time.monotonic() + (expires_at - datetime.now()).total_seconds() if expires_at else None
+        )
+        self.decisions: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, at: Optional[str] = RUN_DEADLINE,
+                    budget_seconds: float = RUN_BUDGET_SECONDS) -> "Deadline":
+        """
+        按配置创建截止时间
+
+        Args:
+            at: 每日截止时刻 "HH:MM"，取此刻之后最近的一次
+            budget_seconds: 自现在起的时间预算（秒），0表示不限；与 at 同时设置时取较早者
+        """
+        now = datetime.now()
+        candidates = []
+        if at:
+            hour, minute = (int(part) for part in at.split(":"))
+            expires = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if expires <= now:
+                expires += timedelta(days=1)
+            candidates.append(expires)
+        if budget_seconds:
+            candidates.append(now + timedelta(seconds=budget_seconds))
+        return cls(min(candidates) if candidates else None)
+
+    @property
+    def bounded(self) -> bool:
+        return self._monotonic is not None
+
+    @property
+    def monotonic(self) -> Optional[float]:
+        """截止时间对应的 time.monotonic() 值，不限时为None"""
+        return self._monotonic
+
+    def remaining(self) -> float:
+        """剩余秒数，不限时为无穷大"""
+        if self._monotonic is None:
+            return math.inf
+        return self._monotonic - time.monotonic()
+
+    def tight(self, reserve: float = 0.0) -> bool:
+        """扣除 reserve 秒的预留后，剩余时间是否已少于 DEADLINE_TIGHT_SECONDS"""
+        return self.remaining() - reserve < DEADLINE_TIGHT_SECONDS
+
+    def timeout(self, default: float, reserve: float = 0.0, minimum: float = 1.0) -> float:
+        """不超过剩余时间（扣除预留）的超时值"""
+        return max(minimum, min(default, self.remaining() - reserve))
+
+    def degrade(self, stage: str, decision: str, **details):
+        """
+        记录一次降级决定；同一阶段的同一决定只记录一条并累计次数
+
+        Args:
+            stage: 阶段，例如 "search"、"llm"、"render"、"email"
+            decision: 降级决定，例如 "fewer_engines"、"pdf_only"
+            **details: 附加信息
+        """
+        remaining = round(self.remaining(), 1)
+        with self._lock:
+            for item in self.decisions:
+                if item["stage"] == stage and item["decision"] == decision:
+                    item["count"] += 1
+                    return
+            self.decisions.append({
+                "stage": stage,
+                "decision": decision,
+                "remaining_seconds": remaining,
+                "at": datetime.now().isoformat(timespec="seconds"),
+                "count": 1,
+                **details,
+            })
+        get_tracer().incr("deadline_degradations", stage=stage, decision=decision)
+        logger.warning(f"截止时间临近（剩余 {remaining}s），{stage} 阶段降级: {decision} {details or ''}")
+
+    def to_dict(self) -> Dict:
+        return {
+            "expires_at": self.expires_at.isoformat(timespec="seconds") if self.expires_at else None,
+            "remaining_seconds": round(self.remaining(), 1) if self.bounded else None,
+            "degradations": list(self.decisions),
+        }
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def get_deadline() -> Deadline:
+    """获取当前上下文的截止时间；未设置时返回一个不限时的截止时间"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        deadline = Deadline()
+        _current_deadline.set(deadline)
+    return deadline
+
+
+def start_deadline(deadline: Optional[Deadline] = None) -> Deadline:
+    """为当前上下文（线程）设定截止时间，默认按配置创建"""
+    deadline = deadline or Deadline.from_config()
+    _current_deadline.set(deadline)
+    if deadline.bounded:
+        logger.info(f"本次运行截止时间: {deadline.expires_at:%Y-%m-%d %H:%M:%S}")
+    return deadline
@@ -9,8 +9,22 @@ from email.mime.application import MIMEApplication
 from email.mime.image import MIMEImage
 from typing import List
 from loguru import logger
-from PIL import Image
 import io
+from config import EMAIL_SMTP_DEBUG, EMAIL_TIMEOUT, LOG_MAX_MESSAGE_CHARS
+from .tracing import get_tracer
+from .deadline import get_deadline
+
+
+class _LoggedSMTP(smtplib.SMTP_SSL):
+    """SMTP会话记录写入日志而不是stderr；DATA阶段发送的整封邮件只记录长度"""
+
+    def _print_debug(self, *args):
+        # send()/putcmd() 会把整封邮件（含base64附件）作为参数传入，先截短再格式化；
+        # LOG_MAX_MESSAGE_CHARS 为0表示不截断，此时原样输出
+        parts = [f"<{len(arg)} 字节>" if isinstance(arg, (bytes, str)) and 0 < LOG_MAX_MESSAGE_CHARS < len(arg)
+                 else str(arg) for arg in args]
+        logger.debug("smtp " + " ".join(parts))
+
 
 class EmailService:
     """用于发送带附件邮件的服务"""
@@ -24,6 +38,8 @@ class EmailService:
     def _compress_image(self, file_path: str, quality: int = 75) -> bytes:
         """压缩图片并返回其字节流"""
         try:
+            from PIL import Image
+            
             img = Image.open(file_path)
             img_byte_arr = io.BytesIO()
             img.save(img_byte_arr, format=img.format, quality=quality, optimize=True)
@@ -90,18 +106,27 @@ class EmailService:
                 logger.error(f"附加文件 {file_path} 时发生错误: {e}")
 
         # 发送邮件的健壮性处理
+        with get_tracer().span("email.send", recipients=len(recipients),
+                               attachments=len(msg.get_payload()) - 1) as span:
+            return self._send_message(msg, recipients, span)
+
+    def _send_message(self, msg: MIMEMultipart, recipients: List[str], span) -> bool:
+        """通过SMTP发送已构建好的邮件，结果记录到span中"""
         server = None
         try:
-            server = smtplib.SMTP_SSL(self.host, self.port)
-            server.set_debuglevel(1)
+            server = _LoggedSMTP(self.host, self.port, timeout=get_deadline().timeout(EMAIL_TIMEOUT))
+            if EMAIL_SMTP_DEBUG:
+                server.set_debuglevel(1)
             server.login(self.user, self.password)
             server.send_message(msg)
             logger.success(f"邮件数据已成功发送至: {', '.join(recipients)}")
             return True
-        except smtplib.SMTPAuthenticationError:
+        except smtplib.SMTPAuthenticationError as e:
+            span.set_error(e)
             logger.error("SMTP认证失败！请检查您的邮箱地址和授权码。")
             return False
         except Exception as e:
+            span.set_error(e)
             logger.error(f"发送邮件过程中发生错误: {e}", exc_info=True)
             return False
         finally:
@@ -0,0 +1,212 @@
+"""
+搜索引擎统计模块
+
+按"引擎 × 查询类别（中文/拉丁文）"持久化记录每次请求的延迟和新增结果数
+（留一法：该引擎结果中不在同一查询其它引擎结果里的条数，与请求顺序无关），
+并据此规划后续查询：按历史新增量排序引擎，跳过或减少长期新增很少的引擎的请求数量，
+同时保留一定比例的探索请求，避免对引擎的判断固化。
+"""
+import math
+import random
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from loguru import logger
+from config import (
+    ENGINE_EXPLORATION_RATE,
+    ENGINE_MIN_NUM,
+    ENGINE_MIN_SAMPLES,
+    ENGINE_REDUCE_RATIO,
+    ENGINE_SKIP_THRESHOLD,
+    ENGINE_STATS_PATH,
+    ENGINE_STATS_WINDOW,
+)
+from .utils import ensure_dir
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS engine_samples (
+    id INTEGER PRIMARY KEY,
+    engine TEXT NOT NULL,
+    query_class TEXT NOT NULL,
+    requested INTEGER,
+    results INTEGER,
+    new_results INTEGER,
+    latency REAL,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_engine_samples ON engine_samples(engine, query_class, id);
+"""
+
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]')
+
+
+def query_class(query: str) -> str:
+    """查询类别：含中日韩文字的为 "cjk"，否则为 "latin" """
+    return "cjk" if CJK_PATTERN.search(query or "") else "latin"
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class EngineStats:
+    """引擎延迟与新增结果量的历史统计及查询规划"""
+
+    def __init__(self, db_path: Union[str, Path] = ENGINE_STATS_PATH,
+                 window: int = ENGINE_STATS_WINDOW,
+                 exploration_rate: float = ENGINE_EXPLORATION_RATE):
+        """
+        Args:
+            db_path: SQLite数据库路径
+            window: 每个引擎/类别只使用最近的N条样本
+            exploration_rate: 本应跳过的引擎仍被查询的概率
+        """
+        self.db_path = Path(db_path)
+        self.window = window
+        self.exploration_rate = exploration_rate
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._random = random.Random()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            ensure_dir(self.db_path.parent)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def record(self, engine: str, query: str, requested: int, results: Optional[int],
+               new_results: Optional[int], latency: Optional[float]):
+        """
+        记录一次引擎请求
+
+        Args:
+            engine: 引擎名
+            query: 查询词（用于判断类别）
+            requested: 请求的结果数量
+            results: 引擎返回的结果数量
+            new_results: 其它引擎都未返回的结果数量
+            latency: 请求耗时（秒），命中缓存时为None
+
+        results 与 new_results 为None的是只有延迟的样本：竞速中被放弃或慢于对冲请求的请求，
+        latency 为放弃时已等待的时间（真实延迟不低于该值），只参与延迟统计。
+        """
+        try:
+            with self._lock:
+                self.conn.execute(
+                    "INSERT INTO engine_samples (engine, query_class, requested, results, new_results, latency, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (engine, query_class(query), requested, results, new_results, latency, time.time()),
+                )
+                self.conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"写入引擎统计失败: {e}")
+
+    def summary(self, engine: str, qclass: str) -> Dict:
+        """
+        某引擎在某类查询上的近期统计
+
+        Returns:
+            {"samples", "mean_new", "new_ratio", "mean_latency", "p95_latency"}
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT requested, new_results, latency FROM engine_samples "
+                "WHERE engine = ? AND query_class = ? ORDER BY id DESC LIMIT ?",
+                (engine, qclass, self.window),
+            ).fetchall()
+        latencies = [row["latency"] for row in rows if row["latency"] is not None]
+        measured = [row for row in rows if row["new_results"] is not None]
+        new_total = sum(row["new_results"] for row in measured)
+        requested_total = sum(row["requested"] or 0 for row in measured)
+        return {
+            "samples": len(measured),
+            "mean_new": new_total / len(measured) if measured else None,
+            "new_ratio": new_total / requested_total if requested_total else None,
+            "mean_latency": sum(latencies) / len(latencies) if latencies else None,
+            "p95_latency": _percentile(latencies, 95),
+        }
+
+    def latency_samples(self, engine: str, query: str) -> List[float]:
+        """某引擎在该查询所属类别上的近期延迟样本"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT latency FROM engine_samples WHERE engine = ? AND query_class = ? "
+                "AND latency IS NOT NULL ORDER BY id DESC LIMIT ?",
+                (engine, query_class(query), self.window),
+            ).fetchall()
+        return [row["latency"] for row in rows]
+
+    def p95_latency(self, engine: str, query: str) -> Optional[float]:
+        """某引擎在该查询所属类别上的p95延迟，样本不足时返回None"""
+        samples = self.latency_samples(engine, query)
+        if len(samples) < ENGINE_MIN_SAMPLES:
+            return None
+        return _percentile(samples, 95)
+
+    def plan(self, query: str, engines: List[str], num_results: int) -> List[Tuple[str, int]]:
+        """
+        规划一次查询要请求的引擎及各自的结果数量
+
+        样本不足的引擎照常请求；新增量低于 ENGINE_SKIP_THRESHOLD 的引擎被跳过（探索时除外）；
+        新增比例低于 ENGINE_REDUCE_RATIO 的引擎按历史新增量缩减请求数量。
+        至少保留一个引擎。
+
+        Returns:
+            [(引擎, 请求数量), ...]，按历史新增量从高到低排列
+        """
+        qclass = query_class(query)
+        summaries = {engine: self.summary(engine, qclass) for engine in engines}
+
+        def expected_new(engine: str) -> float:
+            mean_new = summaries[engine]["mean_new"]
+            # 样本不足的引擎排在前面，保证其获得足够的测量
+            if summaries[engine]["samples"] < ENGINE_MIN_SAMPLES or mean_new is None:
+                return float("inf")
+            return mean_new
+
+        ordered = sorted(engines, key=expected_new, reverse=True)
+        plan = []
+        for engine in ordered:
+            summary = summaries[engine]
+            if summary["samples"] < ENGINE_MIN_SAMPLES:
+                plan.append((engine, num_results))
+                continue
+            explore = self._random.random() < self.exploration_rate
+            if summary["mean_new"] < ENGINE_SKIP_THRESHOLD and not explore:
+                logger.info(f"    跳过 {engine}：近期对{qclass}查询平均仅新增 {summary['mean_new']:.1f} 条")
+                continue
+            num = num_results
+            if summary["new_ratio"] is not None and summary["new_ratio"] < ENGINE_REDUCE_RATIO and not explore:
+                num = min(num_results, max(ENGINE_MIN_NUM, math.ceil(summary["mean_new"] * 2)))
+            plan.append((engine, num))
+
+        if not plan and ordered:
+            plan.append((ordered[0], num_results))
+        return plan
+
+    def report(self, engines: List[str]) -> List[Dict]:
+        """所有引擎/类别的统计，用于命令行展示"""
+        rows = []
+        for engine in engines:
+            for qclass in ("cjk", "latin"):
+                summary = self.summary(engine, qclass)
+                if summary["samples"] or summary["p95_latency"] is not None:
+                    rows.append({"engine": engine, "query_class": qclass, **summary})
+        return rows
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
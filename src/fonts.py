@@ -0,0 +1,213 @@
+"""
+报告字体模块
+
+样式表中的 "Microsoft YaHei"、"LXGW WenKai" 在 Linux 渲染主机上通常不存在，Chrome 只能为每段文字
+逐级回退查找系统字体：排版变慢，不同主机的输出也不一致。本模块为每份报告准备一个确定的中文字体：
+
+- 定位：FONT_PATH；否则 assets/fonts/ 下的字体；否则 FONT_SEARCH_PATTERNS 中的系统中文字体；
+- 子集化：安装 fontTools 时只保留报告实际用到的字符（另加全部ASCII可打印字符），
+  结果按"字体 + 字符集"的哈希缓存在 FONT_CACHE_DIR，同一份报告重新渲染时直接复用；
+  未安装时使用完整字体（.ttc 字体集合浏览器无法直接加载，此时不注入）；
+- 注入：以 @font-face 声明为 ReportCJK，并排在正文字体列表的最前面。
+
+找不到字体时不注入，页面仍按样式表中的字体列表渲染。
+"""
+import glob
+import hashlib
+import os
+import string
+import threading
+from pathlib import Path
+from typing import Iterable, Optional, Union
+from loguru import logger
+from config import (
+    ASSETS_DIR,
+    FONT_CACHE_DIR,
+    FONT_CACHE_MAX_FILES,
+    FONT_PATH,
+    FONT_SEARCH_PATTERNS,
+    FONT_SUBSET_ENABLED,
+    REPORT_CONFIG,
+)
+from .utils import ensure_dir
+
+FONT_FAMILY = "ReportCJK"
+FONT_SUFFIXES = (".ttf", ".otf", ".ttc", ".woff", ".woff2")
+# 子集始终包含的字符：英文、数字与常用标点，页眉页脚、页码与表格中的数字不必逐一统计
+BASE_CHARACTERS = frozenset(string.printable.strip() + " ·—…“”‘’、。，：；！？（）《》【】％")
+_FORMATS = {".ttf": "truetype", ".otf": "opentype", ".woff": "woff", ".woff2": "woff2"}
+
+
+class ReportFont:
+    """一份报告使用的字体文件及其 @font-face 声明"""
+
+    def __init__(self, path: Path, fallback_stack: str, filename: Optional[str] = None):
+        self.path = path
+        # 文件名含哈希，截图器临时目录中可按文件名判断是否已复制
+        self.filename = filename or path.name
+        fmt = _FORMATS.get(path.suffix.lower(), "truetype")
+        self.css = (
+            f'@font-face{{font-family:"{FONT_FAMILY}";src:url("{self.filename}") format("{fmt}");'
+            f'font-display:block}}'
+            f'body{{font-family:"{FONT_FAMILY}",{fallback_stack}}}'
+        )
+
+
+class FontManager:
+    """定位报告字体，按报告用到的字符生成并缓存子集"""
+
+    def __init__(self, font_path: Optional[Union[str, Path]] = FONT_PATH,
+                 cache_dir: Union[str, Path] = FONT_CACHE_DIR,
+                 subset: bool = FONT_SUBSET_ENABLED,
+                 max_files: int = FONT_CACHE_MAX_FILES,
+                 fallback_stack: str = REPORT_CONFIG["font_family"]):
+        """
+        Args:
+            font_path: 字体文件路径，为空时自动查找
+            cache_dir: 子集缓存目录
+            subset: 是否子集化
+            max_files: 缓存的子集文件数上限
+            fallback_stack: 注入字体之后的回退字体列表
+        """
+        self.font_path = Path(font_path) if font_path else None
+        self.cache_dir = Path(cache_dir)
+        self.subset = subset
+        self.max_files = max_files
+        self.fallback_stack = fallback_stack
+        self._source: Optional[Path] = None
+        self._located = False
+        self._warned = False
+        self._lock = threading.Lock()
+
+    @property
+    def source(self) -> Optional[Path]:
+        """报告字体的源文件；只查找一次"""
+        if not self._located:
+            self._source = self._locate()
+            self._located = True
+            if self._source:
+                logger.info(f"报告字体: {self._source}")
+            else:
+                logger.warning("未找到中文字体，页面将依赖浏览器的字体回退（可设置 FONT_PATH 或放入 assets/fonts/）")
+        return self._source
+
+    def _locate(self) -> Optional[Path]:
+        if self.font_path:
+            if self.font_path.exists():
+                return self.font_path
+            logger.warning(f"FONT_PATH 指定的字体不存在: {self.font_path}")
+        bundled = sorted(p for p in (ASSETS_DIR / "fonts").glob("*") if p.suffix.lower() in FONT_SUFFIXES)
+        if bundled:
+            return bundled[0]
+        for pattern in FONT_SEARCH_PATTERNS:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if matches:
+                return Path(matches[0])
+        return None
+
+    def prepare(self, texts: Iterable[str]) -> Optional[ReportFont]:
+        """
+        为一份报告准备字体
+
+        Args:
+            texts: 报告中会出现的全部文本（各页内容、页眉、页脚）
+
+        Returns:
+            ReportFont；没有可用字体时返回None
+        """
+        source = self.source
+        if source is None:
+            return None
+        characters = set(BASE_CHARACTERS)
+        for text in texts:
+            characters.update(text)
+        characters = {c for c in characters if c.isprintable()}
+
+        if self.subset:
+            try:
+                return ReportFont(self._subset(source, characters), self.fallback_stack)
+            except ImportError:
+                self._warn_once("未安装 fonttools，使用完整字体（pip install fonttools 后可按报告子集化）")
+            except Exception as e:
+                # 子集化失败不影响渲染：退回完整字体
+                logger.warning(f"字体子集化失败，使用完整字体: {e}")
+        if source.suffix.lower() == ".ttc":
+            self._warn_once(f"{source.name} 为字体集合，浏览器无法直接加载；安装 fonttools 后可子集化为单个字体")
+            return None
+        return ReportFont(source, self.fallback_stack,
+                          filename=f"{FONT_FAMILY}.{_font_key(source)}{source.suffix.lower()}")
+
+    def _subset(self, source: Path, characters: set) -> Path:
+        """生成（或复用缓存的）子集字体，返回其路径"""
+        from fontTools import subset as ft_subset
+        from fontTools.ttLib import TTFont
+
+        stat = source.stat()
+        key = _font_key(source, "".join(sorted(characters)))
+        flavor = _subset_flavor()
+        path = self.cache_dir / f"{FONT_FAMILY}.{key}.{flavor}"
+        if path.exists():
+            os.utime(path)  # 记录最近使用，供清理时判断
+            return path
+
+        with self._lock:
+            if path.exists():
+                return path
+            options = ft_subset.Options()
+            options.flavor = flavor
+            options.layout_features = ["*"]  # 保留竖排、全角标点等排版特性
+            options.name_IDs = ["*"]
+            options.notdef_outline = True
+            # .ttc 取集合中的第一个字体（各CJK字体集合的第一个通常是简体中文）
+            font = TTFont(str(source), fontNumber=0, lazy=False)
+            subsetter = ft_subset.Subsetter(options)
+            subsetter.populate(text="".join(characters))
+            subsetter.subset(font)
+            ensure_dir(self.cache_dir)
+            # 先写临时文件再替换：多个工作进程可能同时生成同一子集
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            ft_subset.save_font(font, str(tmp_path), options)
+            os.replace(tmp_path, path)
+            logger.info(f"已生成字体子集: {path.name}（{len(characters)} 个字符，"
+                        f"{path.stat().st_size / 1024:.0f}KB，原字体 {stat.st_size / 1024 / 1024:.1f}MB）")
+            self._prune()
+        return path
+
+    def _prune(self):
+        """删除最久未用的子集，保留 max_files 个；其它进程正在写入的临时文件不计入也不删除"""
+        files = []
+        for path in self.cache_dir.glob(f"{FONT_FAMILY}.*"):
+            if path.suffix == ".tmp":
+                continue
+            try:
+                files.append((path.stat().st_mtime, path))
+            except FileNotFoundError:  # 已被其它进程清理
+                continue
+        files.sort(reverse=True)
+        for _, path in files[self.max_files:]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def _warn_once(self, message: str):
+        if not self._warned:
+            logger.warning(message)
+            self._warned = True
+
+
+def _font_key(source: Path, characters: str = "") -> str:
+    """字体文件（路径、大小、修改时间）与字符集的哈希"""
+    stat = source.stat()
+    return hashlib.sha1(
+        f"{source.resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{characters}".encode("utf-8")
+    ).hexdigest()[:16]
+
+
+def _subset_flavor() -> str:
+    """子集的封装格式：有 brotli 时用 woff2，否则用 woff（zlib），都比 ttf 小"""
+    try:
+        import brotli  # noqa: F401
+        return "woff2"
+    except ImportError:
+        return "woff"
@@ -0,0 +1,320 @@
+"""
+本地HTTP服务模块
+
+在 LLMService / ReportGenerator 之上提供一个小型HTTP接口，供内部团队按需生成简报：
+
+- POST /jobs                         提交任务，JSON参数: start_date, end_date, topic, recipients（均可选）
+- GET  /jobs/<job_id>                查询任务状态与产物列表
+- GET  /jobs/<job_id>/artifacts/<name>  下载产物（PDF或页面图片）
+- GET  /health                       服务健康状态
+
+相同主题与时间窗口的请求会合并到同一次生成上：进行中的任务直接复用，
+已完成且未过期的任务直接返回缓存的产物。
+"""
+import hashlib
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+from loguru import logger
+from config import (
+    HTTP_CACHE_TTL_HOURS,
+    HTTP_FAILED_JOB_RETENTION_MINUTES,
+    HTTP_HOST,
+    HTTP_JOBS_INDEX_PATH,
+    HTTP_MAX_CONCURRENT_JOBS,
+    HTTP_PORT,
+)
+from templates.prompts import get_hydrogen_report_messages
+from .pipeline import ReportPipeline, send_report_email
+from .utils import ensure_dir
+
+
+class ReportJob:
+    """一次按需生成任务"""
+
+    def __init__(self, key: str, start: date, end: date, topic: Optional[str]):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.start = start
+        self.end = end
+        self.topic = topic
+        self.status = "queued"
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.run_id: Optional[str] = None
+        self.error: Optional[str] = None
+        self.artifacts: Dict[str, str] = {}  # 文件名 -> 路径
+        self.recipients: set = set()
+        self.requests = 1  # 合并到该任务上的请求数
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "start_date": self.start.isoformat(),
+            "end_date": self.end.isoformat(),
+            "topic": self.topic,
+            "run_id": self.run_id,
+            "error": self.error,
+            "requests": self.requests,
+            "created_at": self.created_at.isoformat(timespec="seconds"),
+            "finished_at": self.finished_at.isoformat(timespec="seconds") if self.finished_at else None,
+            "artifacts": [
+                {"name": name, "url": f"/jobs/{self.id}/artifacts/{name}"} for name in self.artifacts
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, key: str, data: Dict) -> "ReportJob":
+        job = cls(key, date.fromisoformat(data["start_date"]), date.fromisoformat(data["end_date"]), data["topic"])
+        job.id = data["job_id"]
+        job.status = data["status"]
+        job.run_id = data.get("run_id")
+        job.created_at = datetime.fromisoformat(data["created_at"])
+        job.finished_at = datetime.fromisoformat(data["finished_at"]) if data.get("finished_at") else None
+        job.artifacts = data.get("paths", {})
+        return job
+
+
+def coalescing_key(start: date, end: date, topic: Optional[str]) -> str:
+    """相同主题与时间窗口的请求得到相同的键"""
+    raw = f"{(topic or '').strip().lower()}|{start.isoformat()}|{end.isoformat()}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class ReportJobManager:
+    """任务调度、请求合并与产物缓存"""
+
+    def __init__(self, pipeline: Optional[ReportPipeline] = None,
+                 max_workers: int = HTTP_MAX_CONCURRENT_JOBS,
+                 cache_ttl_hours: float = HTTP_CACHE_TTL_HOURS,
+                 index_path: Path = HTTP_JOBS_INDEX_PATH,
+                 failed_retention_minutes: float = HTTP_FAILED_JOB_RETENTION_MINUTES):
+        self.pipeline = pipeline or ReportPipeline()
+        self.cache_ttl = timedelta(hours=cache_ttl_hours)
+        self.failed_retention = timedelta(minutes=failed_retention_minutes)
+        self.index_path = Path(index_path)
+        self.jobs: Dict[str, ReportJob] = {}
+        self.by_key: Dict[str, ReportJob] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._load_index()
+
+    def submit(self, start: date, end: date, topic: Optional[str],
+               recipients: Optional[List[str]] = None) -> Tuple[ReportJob, str]:
+        """
+        提交任务；相同参数的进行中或已缓存任务会被复用
+
+        Returns:
+            (任务, 处理方式)，处理方式为 "created"、"coalesced" 或 "cached"
+        """
+        key = coalescing_key(start, end, topic)
+        recipients = [r for r in (recipients or []) if r]
+        with self._lock:
+            self._evict()
+            job = self.by_key.get(key)
+            if job and not job.done:
+                job.requests += 1
+                job.recipients.update(recipients)
+                logger.info(f"请求已合并到进行中的任务 {job.id}（共 {job.requests} 个请求）")
+                return job, "coalesced"
+            if job and job.status == "succeeded" and self._cache_valid(job):
+                job.requests += 1
+                logger.info(f"命中缓存任务 {job.id}")
+                if recipients:
+                    self._executor.submit(self._send, job, recipients)
+                return job, "cached"
+
+            job = ReportJob(key, start, end, topic)
+            job.recipients.update(recipients)
+            self.jobs[job.id] = job
+            self.by_key[key] = job
+        self._executor.submit(self._run, job)
+        logger.info(f"已创建任务 {job.id}: {start} ~ {end} 主题={topic or '默认'}")
+        return job, "created"
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _evict(self):
+        """
+        移除不再需要的已结束任务（调用方已持有锁）：失败的任务不再参与合并，保留 failed_retention 供查询状态；
+        成功的任务在缓存过期或产物被删除后移除
+        """
+        now = datetime.now()
+        for job_id, job in list(self.jobs.items()):
+            if not job.done or job.finished_at is None:
+                continue
+            if job.status == "failed":
+                expired = now - job.finished_at > self.failed_retention
+            else:
+                expired = not self._cache_valid(job)
+            if (job.status == "failed" or expired) and self.by_key.get(job.key) is job:
+                del self.by_key[job.key]
+            if expired:
+                del self.jobs[job_id]
+
+    def _cache_valid(self, job: ReportJob) -> bool:
+        if not job.finished_at or datetime.now() - job.finished_at > self.cache_ttl:
+            return False
+        return all(Path(path).exists() for path in job.artifacts.values())
+
+    def _run(self, job: ReportJob):
+        job.status = "running"
+        try:
+            messages = get_hydrogen_report_messages(job.start, job.end, job.topic)
+            result = self.pipeline.run(messages, show_progress=False,
+                                       job_name=f"job_{job.id}", send_email=False)
+            job.run_id = result.run_id
+            job.artifacts = {Path(path).name: path for path in result.attachments}
+            if result.success:
+                job.status = "succeeded"
+            else:
+                job.status = "failed"
+                job.error = result.error or "生成失败"
+        except Exception as e:
+            logger.error(f"任务 {job.id} 执行失败: {e}", exc_info=True)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now()
+
+        with self._lock:
+            recipients = sorted(job.recipients)
+            self._evict()
+            if job.status == "succeeded":
+                self._save_index()
+        if job.status == "succeeded" and recipients:
+            self._send(job, recipients)
+
+    def _send(self, job: ReportJob, recipients: List[str]):
+        send_report_email(self.pipeline.email_service, list(job.artifacts.values()), recipients)
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            return
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+            for key, item in data.items():
+                job = ReportJob.from_dict(key, item)
+                if self._cache_valid(job):
+                    self.jobs[job.id] = job
+                    self.by_key[key] = job
+            logger.info(f"已加载 {len(self.jobs)} 个缓存任务")
+        except Exception as e:
+            logger.warning(f"读取任务缓存索引失败: {e}")
+
+    def _save_index(self):
+        data = {}
+        for key, job in self.by_key.items():
+            if job.status == "succeeded" and self._cache_valid(job):
+                data[key] = {**job.to_dict(), "paths": job.artifacts}
+        ensure_dir(self.index_path.parent)
+        self.index_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def shutdown(self):
+        """等待进行中的任务结束并释放资源"""
+        self._executor.shutdown(wait=True)
+        self.pipeline.close()
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """HTTP请求处理"""
+
+    manager: ReportJobManager = None
+
+    def do_GET(self):
+        parts = [unquote(p) for p in urlparse(self.path).path.strip("/").split("/") if p]
+        if parts == ["health"]:
+            return self._send_json(HTTPStatus.OK, {"status": "ok", "jobs": len(self.manager.jobs)})
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self.manager.get(parts[1])
+            if job is None:
+                return self._send_json(HTTPStatus.NOT_FOUND, {"error": "任务不存在"})
+            if len(parts) == 2:
+                return self._send_json(HTTPStatus.OK, job.to_dict())
+            if len(parts) == 4 and parts[2] == "artifacts":
+                return self._send_artifact(job, parts[3])
+        self._send_json(HTTPStatus.NOT_FOUND, {"error": "未知路径"})
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": "未知路径"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("请求体必须是JSON对象")
+            topic = payload.get("topic")
+            if topic is not None and not isinstance(topic, str):
+                raise ValueError("topic 必须是字符串")
+            end = date.fromisoformat(payload["end_date"]) if payload.get("end_date") else date.today()
+            start = date.fromisoformat(payload["start_date"]) if payload.get("start_date") else end - timedelta(weeks=2)
+            if start > end:
+                raise ValueError("start_date 不能晚于 end_date")
+            recipients = payload.get("recipients") or []
+            if not isinstance(recipients, list) or not all(isinstance(r, str) for r in recipients):
+                raise ValueError("recipients 必须是字符串列表")
+        except (ValueError, TypeError, json.JSONDecodeError) as e:
+            return self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"参数错误: {e}"})
+
+        job, outcome = self.manager.submit(start, end, topic, recipients)
+        status = HTTPStatus.OK if job.status == "succeeded" else HTTPStatus.ACCEPTED
+        self._send_json(status, {**job.to_dict(), "outcome": outcome})
+
+    def _send_artifact(self, job: ReportJob, name: str):
+        path = job.artifacts.get(name)
+        if job.status != "succeeded" or not path or not Path(path).exists():
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": "产物不存在"})
+        data = Path(path).read_bytes()
+        content_type = "application/pdf" if name.endswith(".pdf") else "image/png"
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status: HTTPStatus, payload: Dict):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(f"HTTP {self.address_string()} - {format % args}")
+
+
+def create_server(manager: ReportJobManager, host: str = HTTP_HOST, port: int = HTTP_PORT) -> ThreadingHTTPServer:
+    """创建绑定到指定任务管理器的HTTP服务器"""
+    handler = type("BoundReportRequestHandler", (ReportRequestHandler,), {"manager": manager})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(host: str = HTTP_HOST, port: int = HTTP_PORT):
+    """启动HTTP服务，直到收到中断"""
+    manager = ReportJobManager()
+    server = create_server(manager, host, port)
+    logger.info(f"HTTP服务已启动: http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.warning("收到中断，正在停止HTTP服务...")
+    finally:
+        server.server_close()
+        manager.shutdown()
+        logger.info("HTTP服务已停止")
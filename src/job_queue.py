@@ -0,0 +1,206 @@
+"""
+任务队列模块
+
+基于 SQLite 的本地任务队列，供多个工作进程（同一主机或共享文件系统的多台主机）领取报告任务：
+
+- 领取任务时写入租约（持有者与到期时间），工作者运行期间定期续约；
+- 租约过期（进程崩溃、主机失联）的任务会被其它工作者重新领取；
+- 失败的任务在达到最大尝试次数之前重新排队。
+
+每次操作单独打开连接并使用 BEGIN IMMEDIATE 事务，使用默认的回滚日志而非WAL，
+以便数据库位于网络文件系统上时也能正确加锁。
+"""
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+from loguru import logger
+from config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_QUEUE_PATH
+from .utils import ensure_dir
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id);
+"""
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+
+class QueuedJob:
+    """从队列中领取的任务"""
+
+    def __init__(self, row: sqlite3.Row):
+        self.id: int = row["id"]
+        self.payload: Dict = json.loads(row["payload"])
+        self.attempts: int = row["attempts"]
+        self.max_attempts: int = row["max_attempts"]
+        self.lease_owner: Optional[str] = row["lease_owner"]
+
+    def __repr__(self) -> str:
+        return f"QueuedJob(id={self.id}, attempt={self.attempts}/{self.max_attempts})"
+
+
+class JobQueue:
+    """SQLite任务队列"""
+
+    def __init__(self, db_path: Union[str, Path] = JOB_QUEUE_PATH,
+                 lease_seconds: float = JOB_LEASE_SECONDS):
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds
+        ensure_dir(self.db_path.parent)
+        with self._transaction() as conn:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # 每次操作独立连接：可在心跳线程中安全使用，且不会长时间持有文件锁
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def enqueue(self, payload: Dict, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+        """
+        加入一个任务
+
+        Args:
+            payload: 任务参数（需可JSON序列化）
+            max_attempts: 最大尝试次数
+
+        Returns:
+            任务ID
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (payload, max_attempts, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (json.dumps(payload, ensure_ascii=False), max(1, max_attempts), now, now),
+            )
+            return cursor.lastrowid
+
+    def claim(self, owner: str) -> Optional[QueuedJob]:
+        """
+        领取一个待运行的任务（含租约已过期的运行中任务）
+
+        Args:
+            owner: 工作者标识
+
+        Returns:
+            任务，队列为空时返回None
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # 租约过期且已无剩余尝试次数的任务直接判定为失败
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = '租约过期且已达到最大尝试次数', "
+                "lease_owner = NULL, updated_at = ? "
+                "WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = conn.execute(
+                "SELECT id, lease_owner FROM jobs "
+                "WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?) "
+                "ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            if row["lease_owner"]:
+                logger.warning(f"任务 {row['id']} 的租约已过期（原持有者 {row['lease_owner']}），重新领取")
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                "lease_expires = ?, updated_at = ? WHERE id = ?",
+                (owner, now + self.lease_seconds, now, row["id"]),
+            )
+            return QueuedJob(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def heartbeat(self, job_id: int, owner: str) -> bool:
+        """
+        续约
+
+        Returns:
+            是否仍持有租约；返回False说明任务已被其它工作者接管
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (now + self.lease_seconds, now, job_id, owner),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, owner: str, result: Optional[Dict] = None) -> bool:
+        """标记任务成功；返回是否仍持有租约"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?",
+                (json.dumps(result or {}, ensure_ascii=False), time.time(), job_id, owner),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, owner: str, error: str) -> Optional[str]:
+        """
+        记录一次失败：未达到最大尝试次数时重新排队，否则标记为失败
+
+        Returns:
+            任务的新状态（"queued" 或 "failed"），已不持有租约时返回None
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ?",
+                (job_id, owner),
+            ).fetchone()
+            if row is None:
+                return None
+            status = "queued" if row["attempts"] < row["max_attempts"] else "failed"
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+            return status
+
+    def stats(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def list_jobs(self, limit: int = 50) -> List[Dict]:
+        """最近的任务列表（新任务在前）"""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, payload, status, attempts, max_attempts, lease_owner, error, updated_at "
+                "FROM jobs ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [{**dict(row), "payload": json.loads(row["payload"])} for row in rows]
@@ -1,21 +1,81 @@
 """
 LLM服务模块
 """
+import hashlib
 import json
 import time
-from typing import List, Dict, Optional
-from openai import OpenAI
+from datetime import date
+from contextvars import ContextVar
+from typing import List, Dict, Optional, Tuple, Union
 from loguru import logger
-from config import DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, DEEPSEEK_MODEL, SEARCH_DELAY
+from config import (
+    DEEPSEEK_API_KEY,
+    DEEPSEEK_BASE_URL,
+    DEEPSEEK_MODEL,
+    SEARCH_DELAY,
+    LLM_TIMEOUT,
+    LLM_MAX_ATTEMPTS,
+    SEARCH_CHECKPOINT_DIR,
+    SEARCH_CHECKPOINT_TTL_HOURS,
+    DEADLINE_RESERVE_WRITE,
+    DEADLINE_RESERVE_DELIVERY,
+    DEADLINE_RESULT_BUDGET,
+    SECTION_MAX_ATTEMPTS,
+    SECTION_MAX_QUERIES,
+    ARTICLE_ENRICH_ENABLED,
+    SEARCH_SOURCE,
+    COLLECT_MAX_AGE_HOURS,
+    COLLECT_MIN_RESULTS,
+    COLLECT_MAX_RESULTS,
+    COLLECT_CANDIDATE_RESULTS,
+    COLLECT_WINDOW_DAYS,
+)
+from templates.prompts import (
+    STRUCTURED_REPORT_INSTRUCTIONS,
+    get_section_output_prompt,
+    get_section_regenerate_prompt,
+    parse_report_scope,
+)
+from .deadline import get_deadline
+from .memory_guard import MB, MemoryCeilingExceeded, get_memory_guard
 from .search_service import SearchService
+from .search_results import SearchResultBatch
+from .novelty_index import NoveltyIndex, report_items
+from .article_fetcher import ArticleFetcher
+from .collector import ResultStore
+from .report_sections import (
+    PART_NUMBERS,
+    SectionCache,
+    SectionValidationError,
+    parse_json_object,
+    validate_report,
+    validate_section,
+)
+from .resilience import get_breaker, retry_call
+from .tracing import get_tracer
+from .llm_usage import get_usage_ledger
+from .utils import ensure_dir
+
+# 本次运行提供给LLM的搜索结果（运行ID, {链接: 结果}），报告交付后据此索引各条目对应的原始结果
+_provided_results: ContextVar[Optional[Tuple[str, Dict[str, Dict]]]] = ContextVar("provided_results", default=None)
+
 
 class LLMService:
     """大语言模型服务类"""
     
-    def __init__(self, api_key: str = DEEPSEEK_API_KEY, base_url: str = DEEPSEEK_BASE_URL):
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
+    def __init__(self, api_key: str = DEEPSEEK_API_KEY, base_url: str = DEEPSEEK_BASE_URL,
+                 search_service: Optional[SearchService] = None):
+        # openai 导入较重，只在真正创建服务时加载
+        from openai import OpenAI
+        
+        # 重试由 retry_call 统一处理（带抖动退避与熔断），关闭客户端自带的重试
+        self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=LLM_TIMEOUT, max_retries=0)
         self.model = DEEPSEEK_MODEL
-        self.search_service = SearchService()
+        self.search_service = search_service or SearchService()
+        self.novelty_index = NoveltyIndex()
+        self.section_cache = SectionCache()
+        self.article_fetcher = ArticleFetcher() if ARTICLE_ENRICH_ENABLED else None
+        self.result_store = ResultStore()
         
         self.tools = [
             {
@@ -38,86 +98,521 @@ class LLMService:
             }
         ]
     
-    def generate_report(self, initial_prompt: str) -> Optional[str]:
+    def generate_report(self, initial_prompt: Union[str, List[Dict]]) -> Optional[str]:
         """
         通过多轮、串行的聚焦搜索，生成氢能产业报告。
 
         Args:
-            initial_prompt (str): 包含报告要求的初始提示。
+            initial_prompt (Union[str, List[Dict]]): 包含报告要求的初始提示，
+                或由 get_hydrogen_report_messages 生成的初始消息列表（固定前缀在前，利于缓存命中）。
 
         Returns:
             Optional[str]: 生成的Markdown格式报告，如果失败则返回None。
         """
         try:
             logger.info("开始生成氢能产业报告（稳定串行搜索策略）")
-            messages = [{"role": "user", "content": initial_prompt}]
-            
-            # 步骤 1: 让LLM根据prompt生成多个搜索查询
-            logger.info("第一步: 生成搜索查询列表...")
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=self.tools,
-                tool_choice={"type": "function", "function": {"name": "execute_searches"}}
-            )
+            if isinstance(initial_prompt, str):
+                messages = [{"role": "user", "content": initial_prompt}]
+            else:
+                messages = list(initial_prompt)
             
-            message = response.choices[0].message
-            messages.append(message)
-            
-            # 步骤 2: 逐一执行搜索并将结果返回给LLM
-            if not message.tool_calls:
+            checkpoint_key = self._checkpoint_key(messages)
+            tracer = get_tracer()
+            gathered = self._gather(messages, checkpoint_key)
+            if gathered is None:
                 logger.warning("LLM未能生成搜索查询，将尝试直接生成报告。")
                 return self.chat_completion(messages)
-
-            logger.info("第二步: 开始逐一执行聚焦搜索...")
-            all_search_results = []
-            tool_call = message.tool_calls[0]
-            if tool_call.function.name == "execute_searches":
-                args = json.loads(tool_call.function.arguments)
-                queries = args.get("queries", [])
-                logger.info(f"LLM请求搜索以下查询: {queries}")
-                
-                for query in queries:
-                    # 对每个查询调用串行搜索服务
-                    search_results = self.search_service.search(query)
-                    all_search_results.extend(search_results)
-                    # 在不同查询词之间也加入延时，进一步确保稳定
-                    time.sleep(SEARCH_DELAY)
-            
-            # 格式化并添加工具结果
-            formatted_results = self.search_service.format_search_results(all_search_results)
-            messages.append({
-                "role": "tool",
-                "name": "execute_searches",
-                "content": formatted_results,
-                "tool_call_id": tool_call.id
-            })
+            tool_call_id, all_search_results = gathered
+            formatted_results = self._append_search_results(messages, tool_call_id, all_search_results)
 
             # 步骤 3: 基于所有搜索结果，生成最终报告
             logger.info("第三步: 汇总信息并生成最终报告...")
-            final_response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages
-            )
+            with tracer.span("llm.write_report", model=self.model,
+                             tool_result_chars=len(formatted_results)) as span:
+                final_response = self._create(messages=messages)
+                self._record_usage(span, final_response)
             
             report_content = final_response.choices[0].message.content
             logger.success("报告生成成功！")
+            self._clear_checkpoint(checkpoint_key)
             return report_content
                 
+        except MemoryCeilingExceeded:
+            # 内存超过上限且配置为直接失败：交由流水线记录为本次运行的错误
+            raise
         except Exception as e:
             logger.error(f"生成报告过程中发生严重错误: {e}", exc_info=True)
             return None
     
+    def generate_structured_report(self, initial_prompt: Union[str, List[Dict]],
+                                   regenerate: Optional[List[int]] = None) -> Optional[List[Dict]]:
+        """
+        生成结构化报告：五个部分以JSON输出，逐部分校验并缓存。
+
+        缓存中已有的部分直接复用；缺失、不合格或在 regenerate 中指定的部分
+        单独补充搜索并重写，其余部分不受影响。
+
+        Args:
+            initial_prompt: 同 generate_report
+            regenerate: 需要重新生成的部分编号（1-5）
+
+        Returns:
+            按部分编号排列的部分列表（每部分带 "origin"：cache / report / regenerated），失败返回None
+        """
+        try:
+            messages = [{"role": "user", "content": initial_prompt}] if isinstance(initial_prompt, str) \
+                else list(initial_prompt)
+            key = self._checkpoint_key(messages)
+            regenerate = set(regenerate or [])
+
+            sections = {}
+            for part in PART_NUMBERS:
+                cached = None if part in regenerate else self.section_cache.get(key, part)
+                if cached:
+                    sections[part] = dict(cached, origin="cache")
+            if sections:
+                logger.info(f"复用已缓存的部分: {', '.join(f'Part {part}' for part in sorted(sections))}")
+            else:
+                logger.info("开始生成结构化氢能产业报告")
+                sections = self._write_structured_report(list(messages), key)
+
+            for part in PART_NUMBERS:
+                if part in sections:
+                    continue
+                section = self._regenerate_section(messages, key, part, sections)
+                if section is None:
+                    logger.error(f"Part {part} 重写后仍不合格，报告生成失败")
+                    return None
+                sections[part] = section
+
+            ordered = [sections[part] for part in PART_NUMBERS]
+            logger.success("结构化报告生成成功！")
+            return ordered
+
+        except MemoryCeilingExceeded:
+            # 内存超过上限且配置为直接失败：交由流水线记录为本次运行的错误
+            raise
+        except Exception as e:
+            logger.error(f"生成结构化报告过程中发生严重错误: {e}", exc_info=True)
+            return None
+
+    def _write_structured_report(self, messages: List[Dict], key: str) -> Dict[int, Dict]:
+        """规划、搜索并一次性撰写五个部分，返回校验合格的部分并写入缓存"""
+        tracer = get_tracer()
+        gathered = self._gather(messages, key)
+        if gathered is None:
+            logger.warning("LLM未能生成搜索查询，将逐部分生成。")
+            return {}
+        tool_call_id, results = gathered
+        formatted_results = self._append_search_results(messages, tool_call_id, results)
+        messages.append({"role": "user", "content": STRUCTURED_REPORT_INSTRUCTIONS})
+
+        logger.info("第三步: 汇总信息并生成结构化报告...")
+        with tracer.span("llm.write_report", model=self.model, format="sections",
+                         tool_result_chars=len(formatted_results)) as span:
+            response = self._create(messages=messages, response_format={"type": "json_object"})
+            self._record_usage(span, response)
+
+        try:
+            valid, invalid = validate_report(parse_json_object(response.choices[0].message.content))
+        except SectionValidationError as e:
+            valid, invalid = {}, {part: str(e) for part in PART_NUMBERS}
+        for part, reason in invalid.items():
+            logger.warning(f"Part {part} 不合格（{reason}），将单独重写")
+            tracer.incr("report_sections_invalid", part=part)
+        for section in valid.values():
+            self.section_cache.put(key, section)
+        self._clear_checkpoint(key)
+        return {part: dict(section, origin="report") for part, section in valid.items()}
+
+    def _regenerate_section(self, base_messages: List[Dict], key: str, part: int,
+                            sections: Dict[int, Dict]) -> Optional[Dict]:
+        """针对某一部分补充搜索并单独重写，其它部分的条目作为去重参考"""
+        tracer = get_tracer()
+        existing = [item["title"] for section in sections.values() for item in section["items"]]
+        for attempt in range(1, SECTION_MAX_ATTEMPTS + 1):
+            logger.info(f"单独重写 Part {part}（第 {attempt}/{SECTION_MAX_ATTEMPTS} 次）...")
+            messages = list(base_messages)
+            messages.append({"role": "user", "content": get_section_regenerate_prompt(part, existing)})
+            with tracer.span("llm.plan_section_queries", model=self.model, part=part) as span:
+                response = self._create(
+                    messages=messages,
+                    tools=self.tools,
+                    tool_choice={"type": "function", "function": {"name": "execute_searches"}}
+                )
+                self._record_usage(span, response)
+            message = response.choices[0].message
+            messages.append(message)
+
+            if message.tool_calls:
+                tool_call = message.tool_calls[0]
+                queries = json.loads(tool_call.function.arguments).get("queries", [])[:SECTION_MAX_QUERIES]
+                logger.info(f"Part {part} 补充搜索: {queries}")
+                results = self._enrich(self._apply_novelty(self._run_searches(queries)))
+                self._append_search_results(messages, tool_call.id, results)
+            messages.append({"role": "user", "content": get_section_output_prompt(part)})
+
+            with tracer.span("llm.write_section", model=self.model, part=part) as span:
+                response = self._create(messages=messages, response_format={"type": "json_object"})
+                self._record_usage(span, response)
+            try:
+                section = validate_section(parse_json_object(response.choices[0].message.content), part)
+            except SectionValidationError as e:
+                logger.warning(f"Part {part} 重写结果不合格: {e}")
+                continue
+            self.section_cache.put(key, section)
+            tracer.incr("report_sections_regenerated", part=part)
+            return dict(section, origin="regenerated")
+        return None
+
+    def _gather(self, messages: List[Dict], checkpoint_key: str):
+        """
+        让LLM规划查询并执行搜索（或复用搜索检查点、读取采集存储），规划消息追加到 messages
+
+        Returns:
+            (tool_call_id, 搜索结果)；LLM未生成查询时返回None
+        """
+        checkpoint = self._load_checkpoint(checkpoint_key)
+        if checkpoint:
+            # 上次运行已完成搜索但撰写报告失败：直接复用，不再重复规划和搜索
+            logger.info(f"复用 {checkpoint['created_at']} 的搜索检查点（{len(checkpoint['results'])} 条结果）")
+            messages.append(checkpoint["assistant_message"])
+            results = checkpoint["results"]
+            return checkpoint["tool_call_id"], SearchResultBatch.from_dicts(results) \
+                if isinstance(results, list) else SearchResultBatch.from_columns(results)
+
+        stored = self._load_from_store(messages) if SEARCH_SOURCE == "store" else None
+        if stored is not None:
+            # 采集存储足够新且结果充足：不再规划查询和现场搜索
+            message, all_search_results = stored
+            messages.append(message)
+            tool_call_id = message["tool_calls"][0]["id"]
+        else:
+            planned = self._plan_and_search(messages)
+            if planned is None:
+                return None
+            message, tool_call_id, all_search_results = planned
+
+        # 对照往期索引标记或剔除已报道过的条目（本期条目在报告交付后才写入索引）
+        all_search_results = self._apply_novelty(all_search_results)
+        if stored is not None and len(all_search_results) > COLLECT_MAX_RESULTS:
+            # 存储中的结果按采集日期从新到旧排列，本期新结果再提前
+            all_search_results = all_search_results.rank(lambda r: r.get("novelty") == "covered") \
+                .head(COLLECT_MAX_RESULTS)
+        all_search_results = self._enrich(all_search_results)
+        self._save_checkpoint(checkpoint_key, message, tool_call_id, all_search_results)
+        return tool_call_id, all_search_results
+
+    def _plan_and_search(self, messages: List[Dict]):
+        """
+        让LLM规划查询并逐一执行现场搜索，规划消息追加到 messages
+
+        Returns:
+            (assistant消息, tool_call_id, 搜索结果)；LLM未生成查询时返回None
+        """
+        tracer = get_tracer()
+        # 步骤 1: 让LLM根据prompt生成多个搜索查询
+        logger.info("第一步: 生成搜索查询列表...")
+        with tracer.span("llm.plan_queries", model=self.model) as span:
+            response = self._create(
+                messages=messages,
+                tools=self.tools,
+                tool_choice={"type": "function", "function": {"name": "execute_searches"}}
+            )
+            self._record_usage(span, response)
+
+        message = response.choices[0].message
+        messages.append(message)
+
+        # 步骤 2: 逐一执行搜索并将结果返回给LLM
+        if not message.tool_calls:
+            return None
+
+        logger.info("第二步: 开始逐一执行聚焦搜索...")
+        all_search_results = SearchResultBatch()
+        tool_call = message.tool_calls[0]
+        if tool_call.function.name == "execute_searches":
+            args = json.loads(tool_call.function.arguments)
+            queries = args.get("queries", [])
+            logger.info(f"LLM请求搜索以下查询: {queries}")
+            all_search_results = self._run_searches(queries)
+            # 记录本次规划的查询词，增量采集按最近的规划执行
+            self._save_plan(queries)
+        return message, tool_call.id, all_search_results
+
+    def _load_from_store(self, messages: List[Dict]):
+        """
+        本期范围与采集计划一致时，从采集存储读取该时间范围内的结果，并构造与现场搜索等价的工具调用消息
+
+        采集计划不区分地域和关注重点，覆盖截止今天的 COLLECT_WINDOW_DAYS 天；本期范围不在其内时
+        存储中的结果与请求不符，改为现场搜索。
+
+        Returns:
+            (assistant消息, 搜索结果)；范围不一致、存储过旧、结果不足或不可用时返回None
+        """
+        content = next((m["content"] for m in messages if isinstance(m, dict) and m.get("role") == "user"), "")
+        scope = parse_report_scope(content)
+        today = date.today()
+        if scope is None:
+            logger.info("无法确定本期时间范围，改为现场搜索")
+            return None
+        start, end, focused = scope
+        if focused or end != today or start > end or (end - start).days > COLLECT_WINDOW_DAYS:
+            logger.info(f"本期范围（{start} 至 {end}{'，指定了地域或关注重点' if focused else ''}）"
+                        f"与采集计划（截止今天的 {COLLECT_WINDOW_DAYS} 天）不一致，改为现场搜索")
+            return None
+        try:
+            with get_tracer().span("search.store", since=start.isoformat(), until=end.isoformat()) as span:
+                collected_at = self.result_store.last_collected_at()
+                results = self.result_store.window(start, end, limit=COLLECT_CANDIDATE_RESULTS)
+                age_hours = (time.time() - collected_at) / 3600 if collected_at else None
+                span.set_attributes(results=len(results),
+                                    age_hours=round(age_hours, 1) if age_hours is not None else None)
+        except Exception as e:
+            logger.warning(f"采集存储不可用，改为现场搜索: {e}")
+            return None
+        if age_hours is None or age_hours > COLLECT_MAX_AGE_HOURS:
+            logger.warning(f"采集存储过旧（最近一次采集: {'无' if age_hours is None else f'{age_hours:.1f} 小时前'}），改为现场搜索")
+            return None
+        if len(results) < COLLECT_MIN_RESULTS:
+            logger.warning(f"采集存储仅有 {len(results)} 条结果，少于 {COLLECT_MIN_RESULTS} 条，改为现场搜索")
+            return None
+
+        logger.info(f"使用采集存储中 {start} 至 {end} 的 {len(results)} 条结果"
+                    f"（{age_hours:.1f} 小时前采集），跳过查询规划与现场搜索")
+        queries = [query for query in dict.fromkeys(results.columns["query"]) if query]
+        message = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": "call_collected",
+                "type": "function",
+                "function": {
+                    "name": "execute_searches",
+                    "arguments": json.dumps({"queries": queries}, ensure_ascii=False),
+                },
+            }],
+        }
+        return message, results
+
+    def _save_plan(self, queries: List[str]):
+        try:
+            self.result_store.save_plan(queries)
+        except Exception as e:
+            logger.warning(f"保存查询计划失败: {e}")
+
+    def _run_searches(self, queries: List[str]) -> SearchResultBatch:
+        """逐一执行查询并合并去重；截止时间临近时放弃剩余查询"""
+        all_search_results = SearchResultBatch()
+        deadline = get_deadline()
+        with get_tracer().span("search.all", queries=len(queries)) as span:
+            for i, query in enumerate(queries):
+                # 为撰写报告和发送预留时间，不够时放弃剩余查询
+                if deadline.remaining() < DEADLINE_RESERVE_WRITE + DEADLINE_RESERVE_DELIVERY:
+                    deadline.degrade("search", "skip_queries", skipped=len(queries) - i)
+                    break
+                # 对每个查询调用串行搜索服务
+                search_results = self.search_service.search(query)
+                all_search_results.extend(search_results)
+                # 在不同查询词之间也加入延时，进一步确保稳定（密钥池已按密钥控制间隔时无需等待）
+                if not self.search_service.paced:
+                    time.sleep(SEARCH_DELAY)
+            # 不同查询之间也会搜到同一链接，只保留首次出现的结果
+            gathered = len(all_search_results)
+            all_search_results = all_search_results.dedup()
+            span.set_attributes(results=len(all_search_results),
+                                duplicates=gathered - len(all_search_results))
+        return all_search_results
+
+    def _append_search_results(self, messages: List[Dict], tool_call_id: str,
+                               results: SearchResultBatch) -> str:
+        """按截止时间缩减结果规模后格式化，作为工具结果追加到 messages，返回格式化文本"""
+        results = self._apply_result_budget(results)
+        self._remember_results(results)
+        formatted_results = self.search_service.format_search_results(results)
+        messages.append({
+            "role": "tool",
+            "name": "execute_searches",
+            "content": formatted_results,
+            "tool_call_id": tool_call_id
+        })
+        return formatted_results
+
+    @staticmethod
+    def _remember_results(results: SearchResultBatch):
+        """记录本次运行提供给LLM的结果（按链接），同一运行内补充搜索的结果累加"""
+        run_id = get_tracer().run_id
+        current = _provided_results.get()
+        provided = current[1] if current and current[0] == run_id else {}
+        provided.update((r["link"], r.to_dict()) for r in results if r.get("link"))
+        _provided_results.set((run_id, provided))
+
+    def _create(self, **kwargs):
+        """调用 chat.completions.create，暂时性错误退避重试，DeepSeek持续故障时熔断"""
+        # 有截止时间时，单次请求超时与重试都不越过为渲染和发送预留的时间
+        deadline = get_deadline()
+        retry_deadline = None
+        if deadline.bounded:
+            kwargs["timeout"] = deadline.timeout(LLM_TIMEOUT, reserve=DEADLINE_RESERVE_DELIVERY)
+            retry_deadline = deadline.monotonic - DEADLINE_RESERVE_DELIVERY
+        return retry_call(
+            lambda: self.client.chat.completions.create(model=self.model, **kwargs),
+            name="deepseek",
+            max_attempts=LLM_MAX_ATTEMPTS,
+            breaker=get_breaker("deepseek"),
+            deadline=retry_deadline,
+        )
+
+    def _apply_result_budget(self, results: SearchResultBatch) -> SearchResultBatch:
+        """截止时间临近或内存接近上限时只保留部分搜索结果（本期新结果优先），缩短撰写报告的耗时"""
+        if len(results) <= DEADLINE_RESULT_BUDGET:
+            return results
+        deadline = get_deadline()
+        details = {"kept": DEADLINE_RESULT_BUDGET, "dropped": len(results) - DEADLINE_RESULT_BUDGET}
+        if deadline.tight(DEADLINE_RESERVE_WRITE + DEADLINE_RESERVE_DELIVERY):
+            deadline.degrade("llm", "smaller_result_budget", **details)
+        elif not get_memory_guard().low_memory("generate_content", "smaller_result_budget",
+                                               projected_mb=self._prompt_footprint_mb(results), **details):
+            return results
+        return results.rank(lambda r: r.get("novelty") == "covered").head(DEADLINE_RESULT_BUDGET)
+
+    @staticmethod
+    def _prompt_footprint_mb(results: SearchResultBatch) -> float:
+        """
+        估算把搜索结果交给LLM所需的内存：格式化后的工具结果、请求体JSON（中文转义为\\uXXXX）
+        及其UTF-8编码在发送时同时存在，按每个字符约12字节计
+        """
+        columns = results.columns
+        chars = sum(len(value or "") for name in ("title", "link", "snippet", "excerpt") for value in columns[name])
+        return chars * 12 / MB
+
+    @staticmethod
+    def _checkpoint_key(messages: List[Dict]) -> str:
+        raw = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+    def _load_checkpoint(self, key: str) -> Optional[Dict]:
+        """读取未过期的搜索检查点"""
+        path = SEARCH_CHECKPOINT_DIR / f"{key}.json"
+        if not path.exists():
+            return None
+        if time.time() - path.stat().st_mtime > SEARCH_CHECKPOINT_TTL_HOURS * 3600:
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取搜索检查点失败: {e}")
+            return None
+
+    def _save_checkpoint(self, key: str, message, tool_call_id: str, results: SearchResultBatch):
+        """保存查询规划与搜索结果，撰写报告失败后重跑时复用"""
+        try:
+            ensure_dir(SEARCH_CHECKPOINT_DIR)
+            data = {
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "run_id": get_tracer().run_id,
+                "assistant_message": message if isinstance(message, dict) else message.model_dump(exclude_none=True),
+                "tool_call_id": tool_call_id,
+                "results": results.to_columns(),
+            }
+            (SEARCH_CHECKPOINT_DIR / f"{key}.json").write_text(
+                json.dumps(data, ensure_ascii=False), encoding="utf-8"
+            )
+        except Exception as e:
+            logger.warning(f"保存搜索检查点失败: {e}")
+
+    def _clear_checkpoint(self, key: str):
+        (SEARCH_CHECKPOINT_DIR / f"{key}.json").unlink(missing_ok=True)
+
+    def _apply_novelty(self, results: SearchResultBatch) -> SearchResultBatch:
+        """查询跨期索引，按配置标记或剔除往期报告已报道过的搜索结果"""
+        tracer = get_tracer()
+        try:
+            with tracer.span("novelty.annotate", results=len(results)) as span:
+                kept = self.novelty_index.annotate(results, tracer.run_id, started_at=tracer.started_at)
+                span.set_attribute("kept", len(kept))
+            return kept
+        except Exception as e:
+            logger.warning(f"新颖度索引不可用，跳过往期比对: {e}")
+            return results
+
+    def _enrich(self, results: SearchResultBatch) -> SearchResultBatch:
+        """抓取排名靠前的结果页面，补充正文摘录与数据句"""
+        if self.article_fetcher is None:
+            return results
+        try:
+            return self.article_fetcher.enrich(results)
+        except Exception as e:
+            logger.warning(f"正文抓取失败，仅使用搜索摘要: {e}")
+            return results
+
+    def index_report(self, report_content: Optional[str], sections: Optional[List[Dict]] = None):
+        """
+        报告交付后，将报告中的条目和章节写入跨期索引，供之后的运行判断哪些条目已经报道过
+
+        Args:
+            report_content: 报告Markdown
+            sections: 结构化报告的各部分；提供时直接取其中的条目，否则从Markdown中提取
+        """
+        if not report_content:
+            return
+        run_id = get_tracer().run_id
+        if sections:
+            items = [{"title": item["title"], "link": item["url"], "snippet": item["content"],
+                      "source": item["source"], "date": item["date"]}
+                     for section in sections for item in section["items"]]
+        else:
+            items = report_items(report_content)
+        # 条目引用的原始搜索结果（原标题、摘要）一并写入：下一期的搜索结果按链接或原标题即可匹配，
+        # 不依赖LLM改写后的条目标题
+        current = _provided_results.get()
+        provided = current[1] if current and current[0] == run_id else {}
+        backing = [provided[item["link"]] for item in items if item.get("link") in provided]
+        try:
+            self.novelty_index.add_results(backing + items, run_id)
+            count = self.novelty_index.add_report(report_content, run_id)
+            logger.debug(f"已将 {len(items)} 个报告条目（{len(backing)} 个对应搜索结果）、"
+                         f"{count} 个报告章节写入历史索引")
+        except Exception as e:
+            logger.warning(f"写入报告索引失败: {e}")
+
+    def close(self):
+        """释放HTTP客户端、搜索会话和索引连接"""
+        self.client.close()
+        self.search_service.close()
+        self.novelty_index.close()
+        if self.article_fetcher is not None:
+            self.article_fetcher.close()
+        self.result_store.close()
+
     def chat_completion(self, messages: List[Dict]) -> Optional[str]:
         """
         通用聊天完成接口
         """
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages
-            )
+            with get_tracer().span("llm.chat", model=self.model) as span:
+                response = self._create(messages=messages)
+                self._record_usage(span, response)
             return response.choices[0].message.content
         except Exception as e:
             logger.error(f"聊天完成请求失败: {e}")
             return None
+
+    def _record_usage(self, span, response):
+        """将响应中的token用量写入span、计数器和用量账本"""
+        entry = get_usage_ledger().record(span.name, self.model, getattr(response, "usage", None))
+        if entry is None:
+            return
+        span.set_attributes(
+            prompt_tokens=entry.prompt_tokens,
+            completion_tokens=entry.completion_tokens,
+            cache_hit_tokens=entry.cache_hit_tokens,
+            cache_miss_tokens=entry.cache_miss_tokens,
+            cost=round(entry.cost, 6),
+        )
+        tracer = get_tracer()
+        tracer.incr("llm_tokens", entry.prompt_tokens, kind="prompt", call=span.name)
+        tracer.incr("llm_tokens", entry.completion_tokens, kind="completion", call=span.name)
+        tracer.incr("llm_tokens", entry.cache_hit_tokens, kind="cache_hit", call=span.name)
+        tracer.incr("llm_cost", entry.cost, call=span.name)
@@ -0,0 +1,200 @@
+"""
+LLM用量与成本核算模块
+
+记录每次LLM调用的提示/补全token、DeepSeek上下文缓存命中/未命中token，
+并按 config.DEEPSEEK_PRICING 估算费用。
+"""
+import json
+import threading
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from loguru import logger
+from config import DEEPSEEK_PRICING
+from .utils import ensure_dir
+
+
+class LLMCallUsage:
+    """单次LLM调用的用量记录"""
+
+    __slots__ = (
+        "call", "model", "prompt_tokens", "completion_tokens",
+        "cache_hit_tokens", "cache_miss_tokens", "cost",
+    )
+
+    def __init__(self, call: str, model: str, prompt_tokens: int, completion_tokens: int,
+                 cache_hit_tokens: int, cache_miss_tokens: int):
+        self.call = call
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cache_hit_tokens = cache_hit_tokens
+        self.cache_miss_tokens = cache_miss_tokens
+        self.cost = estimate_cost(cache_hit_tokens, cache_miss_tokens, completion_tokens)
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        return self.cache_hit_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "call": self.call,
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache_hit_tokens": self.cache_hit_tokens,
+            "cache_miss_tokens": self.cache_miss_tokens,
+            "cache_hit_ratio": round(self.cache_hit_ratio, 4),
+            "cost": round(self.cost, 6),
+        }
+
+
+def estimate_cost(cache_hit_tokens: int, cache_miss_tokens: int, completion_tokens: int) -> float:
+    """
+    按每百万token单价估算费用
+
+    Args:
+        cache_hit_tokens: 命中上下文缓存的输入token数
+        cache_miss_tokens: 未命中缓存的输入token数
+        completion_tokens: 输出token数
+
+    Returns:
+        估算费用（单位与 DEEPSEEK_PRICING["currency"] 一致）
+    """
+    return (
+        cache_hit_tokens * DEEPSEEK_PRICING["input_cache_hit"]
+        + cache_miss_tokens * DEEPSEEK_PRICING["input_cache_miss"]
+        + completion_tokens * DEEPSEEK_PRICING["output"]
+    ) / 1_000_000
+
+
+def parse_usage(usage) -> Dict[str, int]:
+    """
+    从OpenAI兼容的usage对象中提取token数
+
+    DeepSeek 返回 prompt_cache_hit_tokens / prompt_cache_miss_tokens；
+    OpenAI 风格的接口返回 prompt_tokens_details.cached_tokens，两者都兼容。
+    """
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+    hit = getattr(usage, "prompt_cache_hit_tokens", None)
+    miss = getattr(usage, "prompt_cache_miss_tokens", None)
+    if hit is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        hit = getattr(details, "cached_tokens", 0) or 0
+    if miss is None:
+        miss = max(prompt_tokens - hit, 0)
+
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cache_hit_tokens": hit,
+        "cache_miss_tokens": miss,
+    }
+
+
+class UsageLedger:
+    """一次运行内所有LLM调用的用量账本"""
+
+    def __init__(self):
+        self.calls: List[LLMCallUsage] = []
+        self._lock = threading.Lock()
+
+    def record(self, call: str, model: str, usage) -> Optional[LLMCallUsage]:
+        """
+        记录一次调用的用量
+
+        Args:
+            call: 调用名称，例如 "llm.plan_queries"
+            model: 模型名称
+            usage: 响应中的usage对象
+
+        Returns:
+            用量记录，如果响应不含usage则返回None
+        """
+        if usage is None:
+            return None
+        entry = LLMCallUsage(call, model, **parse_usage(usage))
+        with self._lock:
+            self.calls.append(entry)
+        logger.debug(
+            f"{call} 用量: 输入 {entry.prompt_tokens}（缓存命中 {entry.cache_hit_tokens}）"
+            f" / 输出 {entry.completion_tokens}，约 {entry.cost:.4f} {DEEPSEEK_PRICING['currency']}"
+        )
+        return entry
+
+    def totals(self) -> Dict:
+        """汇总本次运行的用量"""
+        with self._lock:
+            calls = list(self.calls)
+        prompt = sum(c.prompt_tokens for c in calls)
+        hit = sum(c.cache_hit_tokens for c in calls)
+        return {
+            "calls": len(calls),
+            "prompt_tokens": prompt,
+            "completion_tokens": sum(c.completion_tokens for c in calls),
+            "cache_hit_tokens": hit,
+            "cache_miss_tokens": sum(c.cache_miss_tokens for c in calls),
+            "cache_hit_ratio": round(hit / prompt, 4) if prompt else 0.0,
+            "cost": round(sum(c.cost for c in calls), 6),
+            "currency": DEEPSEEK_PRICING["currency"],
+        }
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            calls = [c.to_dict() for c in self.calls]
+        return {"calls": calls, "totals": self.totals()}
+
+    def export(self, output_dir: Union[str, Path]) -> str:
+        """
+        将用量明细写入 usage.json
+
+        Args:
+            output_dir: 导出目录（通常为本次运行的追踪目录）
+
+        Returns:
+            文件路径
+        """
+        path = ensure_dir(output_dir) / "usage.json"
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return str(path)
+
+    def log_summary(self):
+        """在日志中输出本次运行的用量汇总"""
+        with self._lock:
+            calls = list(self.calls)
+        if not calls:
+            return
+        logger.info("LLM用量汇总:")
+        for c in calls:
+            logger.info(
+                f"  {c.call:<20} 输入 {c.prompt_tokens:>7} | 缓存命中 {c.cache_hit_tokens:>7}"
+                f" ({c.cache_hit_ratio:6.1%}) | 输出 {c.completion_tokens:>6} | {c.cost:.4f}"
+            )
+        totals = self.totals()
+        logger.info(
+            f"  合计: 输入 {totals['prompt_tokens']} | 缓存命中率 {totals['cache_hit_ratio']:.1%}"
+            f" | 输出 {totals['completion_tokens']} | 估算费用 {totals['cost']:.4f} {totals['currency']}"
+        )
+
+
+_current_ledger: ContextVar[Optional[UsageLedger]] = ContextVar("current_usage_ledger", default=None)
+_default_ledger = UsageLedger()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """获取当前上下文的用量账本；未开始运行时返回全局默认账本"""
+    return _current_ledger.get() or _default_ledger
+
+
+def start_usage_ledger() -> UsageLedger:
+    """为当前上下文（线程）开始一个新的用量账本"""
+    ledger = UsageLedger()
+    _current_ledger.set(ledger)
+    return ledger
+
+
+def set_usage_ledger(ledger: Optional[UsageLedger]):
+    """将指定账本设为当前上下文的账本"""
+    _current_ledger.set(ledger)
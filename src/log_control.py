@@ -0,0 +1,104 @@
+"""
+日志控制模块
+
+在 setup_logging 安装的各个输出之前，对每条日志统一做三件事：
+
+- 截断：超过 LOG_MAX_MESSAGE_CHARS 的消息只保留开头和结尾（搜索结果、提示词、SMTP收发记录等大段内容），
+  并在 extra 中记录被省略的字符数；
+- 限流：同一代码位置在 LOG_RATE_LIMIT_WINDOW 秒内最多输出 LOG_RATE_LIMIT_BURST 条，
+  其余丢弃，窗口结束后的下一条注明省略了多少条；
+- 分模块级别：按 LOG_LEVELS 中最长匹配的模块前缀决定最低级别。
+
+截断与限流在 patcher 中对每条日志只判定一次，各输出共用结果。
+"""
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from loguru import logger
+from config import (
+    LOG_LEVELS,
+    LOG_MAX_MESSAGE_CHARS,
+    LOG_RATE_LIMIT_BURST,
+    LOG_RATE_LIMIT_WINDOW,
+)
+
+
+def truncate_text(text: str, limit: int = LOG_MAX_MESSAGE_CHARS) -> Tuple[str, int]:
+    """
+    保留开头约四分之三和结尾约四分之一，中间替换为省略说明
+
+    Returns:
+        (截断后的文本, 省略的字符数)
+    """
+    if limit <= 0 or len(text) <= limit:
+        return text, 0
+    head = limit * 3 // 4
+    tail = limit - head
+    omitted = len(text) - head - tail
+    return f"{text[:head]} …[省略 {omitted} 字符]… {text[-tail:]}", omitted
+
+
+class LogControl:
+    """日志截断、限流与分模块级别"""
+
+    def __init__(self, level: str = "INFO", levels: Optional[Dict[str, str]] = None,
+                 max_chars: int = LOG_MAX_MESSAGE_CHARS,
+                 burst: int = LOG_RATE_LIMIT_BURST, window: float = LOG_RATE_LIMIT_WINDOW):
+        """
+        Args:
+            level: 默认最低级别
+            levels: 按模块前缀覆盖的级别，例如 {"src.search_service": "WARNING"}
+            max_chars: 单条消息的最大字符数，0表示不截断
+            burst: 同一代码位置在一个窗口内最多输出的条数，0表示不限流
+            window: 限流窗口（秒）
+        """
+        self.default_level = logger.level(level).no
+        self.levels = {prefix: logger.level(name).no
+                       for prefix, name in (LOG_LEVELS if levels is None else levels).items()}
+        self.max_chars = max_chars
+        self.burst = burst
+        self.window = window
+        self._level_cache: Dict[str, int] = {}
+        self._windows: Dict[Tuple, list] = {}  # 代码位置 -> [窗口开始时间, 已输出条数, 已丢弃条数]
+        self._lock = threading.Lock()
+
+    def min_level(self, name: Optional[str]) -> int:
+        """模块的最低级别：取最长匹配的前缀"""
+        name = name or ""
+        level = self._level_cache.get(name)
+        if level is None:
+            matches = [prefix for prefix in self.levels if name == prefix or name.startswith(prefix + ".")]
+            level = self.levels[max(matches, key=len)] if matches else self.default_level
+            self._level_cache[name] = level
+        return level
+
+    def patch(self, record: Dict):
+        """loguru patcher：每条日志调用一次，判定截断与限流"""
+        extra = record["extra"]
+        if record["level"].no < self.min_level(record["name"]):
+            extra["_drop"] = True
+            return
+        if self.burst > 0 and record["level"].no < 40:  # ERROR及以上不限流
+            key = (record["name"], record["function"], record["line"])
+            now = time.monotonic()
+            with self._lock:
+                state = self._windows.get(key)
+                if state is None or now - state[0] >= self.window:
+                    dropped = state[2] if state else 0
+                    state = self._windows[key] = [now, 0, 0]
+                    if dropped:
+                        extra["suppressed"] = dropped
+                        record["message"] += f"（此前 {self.window:g} 秒内同一位置另有 {dropped} 条日志被省略）"
+                state[1] += 1
+                if state[1] > self.burst:
+                    state[2] += 1
+                    extra["_drop"] = True
+                    return
+        if self.max_chars > 0 and len(record["message"]) > self.max_chars:
+            record["message"], omitted = truncate_text(record["message"], self.max_chars)
+            extra["truncated"] = omitted
+
+    @staticmethod
+    def filter(record: Dict) -> bool:
+        """loguru 输出过滤器：丢弃 patch() 判定为丢弃的日志"""
+        return not record["extra"].get("_drop")
@@ -0,0 +1,244 @@
+"""
+内存记账与上限模块
+
+为一次运行记录各阶段（生成内容、渲染、发送邮件）的内存占用，并在当前上下文中
+传递给各阶段：
+
+- MEMORY_PROFILE_ENABLED 时，每个阶段以 tracemalloc 统计Python对象的峰值与主要分配位置，
+  并以后台线程采样峰值RSS；
+- 设置 MEMORY_CEILING_MB / MEMORY_STAGE_CEILINGS_MB 后，各阶段在占用大块内存之前
+  估算所需内存，超过上限时改走低内存路径（逐页写PDF、只发送PDF、缩小搜索结果规模），
+  MEMORY_CEILING_ACTION=fail 时则直接以 MemoryCeilingExceeded 失败。
+
+RSS 为进程级数值：批量模式下多个报告共享同一进程，各阶段的数值包含其它报告的占用。
+"""
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+from loguru import logger
+from config import (
+    MEMORY_CEILING_ACTION,
+    MEMORY_CEILING_MB,
+    MEMORY_PROFILE_ENABLED,
+    MEMORY_SAMPLE_INTERVAL,
+    MEMORY_STAGE_CEILINGS_MB,
+    MEMORY_TOP_ALLOCATIONS,
+)
+from .tracing import get_tracer
+
+MB = 1024 * 1024
+
+
+class MemoryCeilingExceeded(MemoryError):
+    """阶段所需内存超过上限，且配置为直接失败"""
+
+
+def current_rss_mb() -> Optional[float]:
+    """当前进程的常驻内存（MB）；无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / MB
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _RssSampler(threading.Thread):
+    """阶段执行期间按固定间隔采样RSS，记录峰值"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval = interval
+        self.peak = current_rss_mb() or 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb() or 0.0)
+
+    def stop(self) -> float:
+        self._stop_event.set()
+        self.join()
+        return max(self.peak, current_rss_mb() or 0.0)
+
+
+class MemoryGuard:
+    """一次运行的内存记录与各阶段上限"""
+
+    def __init__(self, profile: bool = MEMORY_PROFILE_ENABLED,
+                 ceiling_mb: float = MEMORY_CEILING_MB,
+                 stage_ceilings_mb: Optional[Dict[str, float]] = None,
+                 action: str = MEMORY_CEILING_ACTION):
+        """
+        Args:
+            profile: 是否启用 tracemalloc 与RSS采样
+            ceiling_mb: 各阶段默认的RSS上限（MB），0表示不限
+            stage_ceilings_mb: 按阶段覆盖的上限
+            action: 超过上限时 "degrade" 改走低内存路径，"fail" 抛出 MemoryCeilingExceeded
+        """
+        self.profile = profile
+        self.ceiling_mb = ceiling_mb
+        self.stage_ceilings_mb = dict(MEMORY_STAGE_CEILINGS_MB if stage_ceilings_mb is None else stage_ceilings_mb)
+        self.action = action
+        self.stages: List[Dict] = []
+        self.decisions: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def ceiling(self, stage: str) -> float:
+        """阶段的RSS上限（MB），0表示不限"""
+        return self.stage_ceilings_mb.get(stage, self.ceiling_mb)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict]:
+        """
+        记录一个阶段的内存占用；启用 profile 时统计峰值与主要分配位置
+
+        Yields:
+            该阶段的记录（结束后补全）
+        """
+        record = {"stage": name, "rss_start_mb": _round(current_rss_mb())}
+        self.check(name)
+        sampler = baseline = None
+        if self.profile:
+            # 启动后不再停止：批量模式下其它线程的阶段可能仍在统计
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = _filtered_snapshot()
+            sampler = _RssSampler(MEMORY_SAMPLE_INTERVAL)
+            sampler.start()
+        try:
+            yield record
+        finally:
+            record["rss_end_mb"] = _round(current_rss_mb())
+            if sampler is not None:
+                record["rss_peak_mb"] = _round(sampler.stop())
+                _, peak = tracemalloc.get_traced_memory()
+                record["traced_peak_mb"] = _round(peak / MB)
+                record["top_allocations"] = _top_allocations(baseline)
+                get_tracer().set_gauge("memory_peak_rss_mb", record["rss_peak_mb"], stage=name)
+            with self._lock:
+                self.stages.append(record)
+
+    def exceeds(self, stage: str, projected_mb: float = 0.0) -> bool:
+        """当前RSS加上预计新增的内存是否超过该阶段的上限"""
+        ceiling = self.ceiling(stage)
+        if not ceiling:
+            return False
+        rss = current_rss_mb()
+        return rss is not None and rss + projected_mb > ceiling
+
+    def low_memory(self, stage: str, path: str, projected_mb: float = 0.0, **details) -> bool:
+        """
+        判断某阶段是否应改走低内存路径，是则记录该决定
+
+        Args:
+            stage: 阶段名，与上限配置一致
+            path: 低内存路径的名称，例如 "streaming_pdf"、"pdf_only"
+            projected_mb: 常规路径预计新增的内存（MB）
+            **details: 附加信息
+
+        Raises:
+            MemoryCeilingExceeded: 超过上限且配置为直接失败
+        """
+        if not self.exceeds(stage, projected_mb):
+            return False
+        self._record(stage, path, projected_mb, **details)
+        return True
+
+    def check(self, stage: str):
+        """阶段开始时检查；已超过上限且配置为直接失败时抛出异常，否则只记录"""
+        if self.exceeds(stage):
+            self._record(stage, "over_ceiling", 0.0)
+
+    def _record(self, stage: str, path: str, projected_mb: float, **details):
+        rss = _round(current_rss_mb())
+        ceiling = self.ceiling(stage)
+        message = (f"{stage} 阶段内存 {rss}MB（预计再增加 {projected_mb:.0f}MB）"
+                   f"超过上限 {ceiling:.0f}MB")
+        if self.action == "fail":
+            raise MemoryCeilingExceeded(message)
+        with self._lock:
+            for item in self.decisions:
+                if item["stage"] == stage and item["path"] == path:
+                    item["count"] += 1
+                    return
+            self.decisions.append({
+                "stage": stage,
+                "path": path,
+                "rss_mb": rss,
+                "projected_mb": _round(projected_mb),
+                "ceiling_mb": ceiling,
+                "count": 1,
+                **details,
+            })
+        get_tracer().incr("memory_low_paths", stage=stage, path=path)
+        if path == "over_ceiling":
+            logger.warning(f"{message}（阶段开始时）")
+        else:
+            logger.warning(f"{message}，改走低内存路径: {path} {details or ''}")
+
+    def to_dict(self) -> Dict:
+        return {
+            "stages": list(self.stages),
+            "low_memory_paths": list(self.decisions),
+        }
+
+    def log_summary(self):
+        """输出各阶段的内存占用与主要分配位置"""
+        for record in self.stages:
+            peak = f"，峰值 {record['rss_peak_mb']}MB（Python对象 {record['traced_peak_mb']}MB）" \
+                if "rss_peak_mb" in record else ""
+            logger.info(f"内存 {record['stage']}: {record['rss_start_mb']}MB -> {record['rss_end_mb']}MB{peak}")
+            for allocation in record.get("top_allocations", []):
+                logger.info(f"    {allocation['size_mb']:>+8.2f}MB {allocation['count']:>+7} 个  {allocation['location']}")
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def _filtered_snapshot() -> "tracemalloc.Snapshot":
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+
+
+def _top_allocations(baseline: "tracemalloc.Snapshot", limit: int = MEMORY_TOP_ALLOCATIONS) -> List[Dict]:
+    """阶段结束时仍存活、且相对阶段开始增长最多的分配位置"""
+    stats = _filtered_snapshot().compare_to(baseline, "lineno")
+    return [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_mb": round(stat.size_diff / MB, 2),
+            "count": stat.count_diff,
+        }
+        for stat in stats[:limit] if stat.size_diff > 0
+    ]
+
+
+_current_guard: ContextVar[Optional[MemoryGuard]] = ContextVar("current_memory_guard", default=None)
+
+
+def get_memory_guard() -> MemoryGuard:
+    """获取当前上下文的内存记录；未设置时返回一个按配置创建的实例"""
+    guard = _current_guard.get()
+    if guard is None:
+        guard = MemoryGuard()
+        _current_guard.set(guard)
+    return guard
+
+
+def start_memory_guard(guard: Optional[MemoryGuard] = None) -> MemoryGuard:
+    """为当前上下文（线程）开始一次新的内存记录"""
+    guard = guard or MemoryGuard()
+    _current_guard.set(guard)
+    return guard
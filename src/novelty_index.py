@@ -0,0 +1,303 @@
+"""
+跨期新颖度索引模块
+
+报告交付后，将报告实际包含的条目和章节写入本地 SQLite（FTS5）索引，
+在下一期报告准备搜索结果时标记或剔除往期已经报道过的条目，
+同时作为可全文检索的历史资料库。
+
+只索引已交付报告中的条目：未写进报告、被结果预算截掉或运行失败时搜到的结果不算"已报道"，
+并发运行（批量模式、HTTP任务）也不会因为彼此尚未交付的搜索结果互相标记。
+"""
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from loguru import logger
+from config import NOVELTY_INDEX_PATH, NOVELTY_LOOKBACK_DAYS, NOVELTY_MODE, NOVELTY_RERUN_HOURS
+from .search_results import SearchResultBatch
+from .utils import ensure_dir
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    link TEXT UNIQUE,
+    title_key TEXT,
+    title TEXT,
+    snippet TEXT,
+    source TEXT,
+    date TEXT,
+    engine TEXT,
+    query TEXT,
+    run_id TEXT,
+    first_seen REAL,
+    last_seen REAL
+);
+CREATE INDEX IF NOT EXISTS idx_results_title_key ON results(title_key);
+CREATE TABLE IF NOT EXISTS sections (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT,
+    part TEXT,
+    title TEXT,
+    content TEXT,
+    created_at REAL
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
+    title, snippet, content='results', content_rowid='id', tokenize='{tokenizer}'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS sections_fts USING fts5(
+    title, content, content='sections', content_rowid='id', tokenize='{tokenizer}'
+);
+"""
+
+# 报告中 "### Part N: 标题" 形式的章节标题
+SECTION_PATTERN = re.compile(r'^###\s*\**\s*(Part\s*\d+)\s*\**\s*[:：]?\s*(.*?)\**\s*$', re.MULTILINE)
+# 报告中的列表条目，条目标题取加粗文字，来源链接取第一个 http(s) 链接
+ITEM_PATTERN = re.compile(r'^\s*(?:[-*+]|\d+[.、)])\s+(.*)$', re.MULTILINE)
+BOLD_PATTERN = re.compile(r'\*\*(.+?)\*\*')
+LINK_PATTERN = re.compile(r'\[([^\]]*)\]\((https?://[^)\s]+)\)')
+
+
+def normalize_title(title: str) -> str:
+    """归一化标题，用于识别不同来源转载的同一条新闻"""
+    return re.sub(r'[\W_]+', '', (title or "").lower())
+
+
+def report_items(markdown_text: str) -> List[Dict]:
+    """
+    从报告Markdown中提取条目（标题与来源链接），用于写入索引
+
+    Returns:
+        [{"title", "link", "snippet"}, ...]；既无加粗标题也无链接的列表项不计入
+    """
+    items = []
+    for match in ITEM_PATTERN.finditer(markdown_text or ""):
+        line = match.group(1)
+        bold, link = BOLD_PATTERN.search(line), LINK_PATTERN.search(line)
+        if not bold and not link:
+            continue
+        title = bold.group(1) if bold else link.group(1)
+        items.append({"title": title.strip(), "link": link.group(2) if link else "", "snippet": line.strip()})
+    return items
+
+
+class NoveltyIndex:
+    """往期搜索结果与报告章节的本地索引"""
+
+    def __init__(self, db_path: Union[str, Path] = NOVELTY_INDEX_PATH,
+                 mode: str = NOVELTY_MODE, lookback_days: int = NOVELTY_LOOKBACK_DAYS,
+                 rerun_hours: float = NOVELTY_RERUN_HOURS):
+        """
+        Args:
+            db_path: SQLite数据库路径
+            mode: "tag" 标记往期已报道的条目，"drop" 直接剔除，"off" 不做处理（仍会建立索引）
+            lookback_days: 只与该天数内的往期结果比对
+            rerun_hours: 运行开始前该小时数内才首次交付的条目属于同一期，不视为往期
+        """
+        self.db_path = Path(db_path)
+        self.mode = mode
+        self.lookback_days = lookback_days
+        self.rerun_hours = rerun_hours
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            ensure_dir(self.db_path.parent)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.executescript(SCHEMA)
+            try:
+                # trigram分词器对中文子串检索友好，需要 SQLite 3.34+
+                conn.executescript(FTS_SCHEMA.format(tokenizer="trigram"))
+            except sqlite3.OperationalError:
+                conn.executescript(FTS_SCHEMA.format(tokenizer="unicode61"))
+            self._conn = conn
+        return self._conn
+
+    def annotate(self, results: Union[SearchResultBatch, List[Dict]], run_id: str,
+                 started_at: Optional[float] = None) -> Union[SearchResultBatch, List[Dict]]:
+        """
+        标记（或剔除）往期报告中已经报道过的搜索结果
+
+        Args:
+            results: 本次运行汇总的搜索结果（SearchResultBatch 或字典列表）
+            run_id: 本次运行ID，本次运行交付的条目不视为旧闻
+            started_at: 本次运行的开始时间戳；此前 rerun_hours 小时内才首次交付的条目属于同一期，不视为旧闻
+
+        Returns:
+            处理后的结果列表；每条结果带有 "novelty" 字段（"new" 或 "covered"）
+        """
+        if not results or self.mode == "off":
+            return results
+        since = time.time() - self.lookback_days * 86400
+        before = (started_at or time.time()) - self.rerun_hours * 3600
+        links = [r.get("link") for r in results if r.get("link")]
+        title_keys = [normalize_title(r.get("title", "")) for r in results]
+
+        with self._lock:
+            seen_links = self._query_seen("link", links, run_id, since, before)
+            seen_titles = self._query_seen("title_key", [k for k in title_keys if k], run_id, since, before)
+
+        covered = 0
+        kept = []
+        for i, (result, title_key) in enumerate(zip(results, title_keys)):
+            is_covered = result.get("link") in seen_links or (title_key and title_key in seen_titles)
+            result["novelty"] = "covered" if is_covered else "new"
+            if is_covered:
+                covered += 1
+                if self.mode == "drop":
+                    continue
+            kept.append(i)
+
+        logger.info(f"新颖度检查: {len(results)} 条结果中有 {covered} 条在往期已出现（模式: {self.mode}）")
+        if len(kept) == len(results):
+            return results
+        if isinstance(results, SearchResultBatch):
+            return results.take(kept)
+        return [results[i] for i in kept]
+
+    def _query_seen(self, column: str, values: List[str], run_id: str, since: float, before: float) -> set:
+        seen = set()
+        # 分批查询，避免超过SQLite的变量数量上限
+        for i in range(0, len(values), 500):
+            batch = values[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT {column} FROM results WHERE {column} IN ({placeholders})"
+                f" AND run_id != ? AND last_seen >= ? AND first_seen < ?",
+                (*batch, run_id, since, before),
+            ).fetchall()
+            seen.update(row[0] for row in rows)
+        return seen
+
+    def add_results(self, results: List[Dict], run_id: str):
+        """
+        将已交付报告中的条目写入索引
+
+        Args:
+            results: 条目列表（title、link，可选 snippet、source、date 等）；没有链接的条目按标题识别
+            run_id: 交付该报告的运行ID
+        """
+        now = time.time()
+        with self._lock, self.conn:
+            for r in results:
+                link = r.get("link") or None
+                title_key = normalize_title(r.get("title", ""))
+                if not link and not title_key:
+                    continue
+                row = self.conn.execute(
+                    "SELECT id FROM results WHERE link = ?" if link
+                    else "SELECT id FROM results WHERE link IS NULL AND title_key = ?",
+                    (link or title_key,),
+                ).fetchone()
+                if row:
+                    self.conn.execute(
+                        "UPDATE results SET last_seen = ?, run_id = ? WHERE id = ?",
+                        (now, run_id, row["id"]),
+                    )
+                    continue
+                cursor = self.conn.execute(
+                    "INSERT INTO results (link, title_key, title, snippet, source, date, engine, query,"
+                    " run_id, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (link, title_key, r.get("title", ""), r.get("snippet", ""),
+                     r.get("source", ""), r.get("date", ""), r.get("engine", ""), r.get("query", ""),
+                     run_id, now, now),
+                )
+                self.conn.execute(
+                    "INSERT INTO results_fts (rowid, title, snippet) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, r.get("title", ""), r.get("snippet", "")),
+                )
+
+    def add_report(self, markdown_text: str, run_id: str) -> int:
+        """
+        将生成的报告按 "### Part N" 拆分为章节写入索引
+
+        Returns:
+            写入的章节数
+        """
+        matches = list(SECTION_PATTERN.finditer(markdown_text or ""))
+        if not matches:
+            sections = [("全文", "", markdown_text or "")]
+        else:
+            sections = []
+            for i, match in enumerate(matches):
+                end = matches[i + 1].start() if i + 1 < len(matches) else len(markdown_text)
+                sections.append((re.sub(r'\s+', ' ', match.group(1)), match.group(2).strip(),
+                                 markdown_text[match.end():end].strip()))
+
+        now = time.time()
+        with self._lock, self.conn:
+            for part, title, content in sections:
+                cursor = self.conn.execute(
+                    "INSERT INTO sections (run_id, part, title, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (run_id, part, title, content, now),
+                )
+                self.conn.execute(
+                    "INSERT INTO sections_fts (rowid, title, content) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, title, content),
+                )
+        return len(sections)
+
+    def search(self, text: str, limit: int = 20) -> Dict[str, List[Dict]]:
+        """
+        全文检索历史搜索结果和报告章节
+
+        Args:
+            text: 检索词
+            limit: 每类返回的最大条数
+
+        Returns:
+            {"results": [...], "sections": [...]}
+        """
+        if len(text) < 3:
+            # trigram分词器无法匹配少于3个字符的检索词，退化为LIKE扫描
+            return self._search_like(text, limit)
+
+        phrase = '"' + text.replace('"', '""') + '"'
+        with self._lock:
+            results = self.conn.execute(
+                "SELECT r.title, r.link, r.source, r.date, r.run_id, r.first_seen FROM results_fts"
+                " JOIN results r ON r.id = results_fts.rowid WHERE results_fts MATCH ?"
+                " ORDER BY bm25(results_fts) LIMIT ?",
+                (phrase, limit),
+            ).fetchall()
+            sections = self.conn.execute(
+                "SELECT s.run_id, s.part, s.title, snippet(sections_fts, 1, '[', ']', '…', 24) AS excerpt,"
+                " s.created_at FROM sections_fts JOIN sections s ON s.id = sections_fts.rowid"
+                " WHERE sections_fts MATCH ? ORDER BY s.created_at DESC LIMIT ?",
+                (phrase, limit),
+            ).fetchall()
+        return {
+            "results": [dict(row) for row in results],
+            "sections": [dict(row) for row in sections],
+        }
+
+    def _search_like(self, text: str, limit: int) -> Dict[str, List[Dict]]:
+        pattern = f"%{text}%"
+        with self._lock:
+            results = self.conn.execute(
+                "SELECT title, link, source, date, run_id, first_seen FROM results"
+                " WHERE title LIKE ? OR snippet LIKE ? ORDER BY last_seen DESC LIMIT ?",
+                (pattern, pattern, limit),
+            ).fetchall()
+            sections = self.conn.execute(
+                "SELECT run_id, part, title, substr(content, 1, 80) AS excerpt, created_at FROM sections"
+                " WHERE title LIKE ? OR content LIKE ? ORDER BY created_at DESC LIMIT ?",
+                (pattern, pattern, limit),
+            ).fetchall()
+        return {
+            "results": [dict(row) for row in results],
+            "sections": [dict(row) for row in sections],
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
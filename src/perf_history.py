@@ -0,0 +1,232 @@
+"""
+运行性能历史模块
+
+日志文件只保留7天，每次运行的各阶段耗时、外部调用次数、LLM用量与产物大小随之丢失。
+本模块在每次运行结束时把这些指标压缩为一条记录写入本地 SQLite（PERF_HISTORY_PATH），并：
+
+- 与同一标签最近 PERF_BASELINE_RUNS 次成功运行组成的滚动基线对比，耗时或费用明显偏离时
+  记录为退化并告警，及早发现供应商或模板变化带来的变慢；
+- 供 `python main.py --perf-history [N]` 输出最近N次运行各指标的 p50/p95 趋势。
+
+指标名形如：
+- <span名称>.seconds：各阶段与各类调用的合计耗时，例如 stage.render.seconds、llm.write_report.seconds；
+- count.<计数器>：外部调用等计数，例如 count.search_requests、count.article_fetches；
+- llm.calls / llm.prompt_tokens / llm.completion_tokens / llm.cache_hit_tokens / llm.cost；
+- artifact.pages / artifact.pdf_bytes / artifact.png_bytes；
+- memory.<阶段>.rss_peak_mb（启用内存记账时）。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from loguru import logger
+from config import (
+    PERF_BASELINE_RUNS,
+    PERF_CHECK_METRICS,
+    PERF_HISTORY_PATH,
+    PERF_MIN_BASELINE_RUNS,
+    PERF_REGRESSION_RATIO,
+)
+from .engine_stats import _percentile
+from .utils import ensure_dir
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT UNIQUE,
+    label TEXT NOT NULL DEFAULT '',
+    started_at REAL,
+    success INTEGER,
+    metrics TEXT,
+    regressions TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_label ON runs(label, id);
+"""
+
+# 计入 llm.* 指标的计数器不再重复记录
+_SKIPPED_COUNTERS = ("llm_tokens", "llm_cost")
+
+
+def collect_metrics(result, tracer, usage: Optional[Dict] = None) -> Dict[str, float]:
+    """
+    汇总一次运行的指标
+
+    Args:
+        result: PipelineResult
+        tracer: 本次运行的 Tracer
+        usage: LLM用量汇总，默认使用 result.usage
+
+    Returns:
+        {指标名: 数值}
+    """
+    metrics: Dict[str, float] = {"run.seconds": round(result.duration, 3)}
+    for name, item in tracer.stage_summary().items():
+        metrics[f"{name}.seconds"] = round(item["total"], 3)
+
+    for name, value in tracer.counter_totals().items():
+        if name not in _SKIPPED_COUNTERS:
+            metrics[f"count.{name}"] = value
+
+    usage = usage if usage is not None else result.usage
+    for key in ("calls", "prompt_tokens", "completion_tokens", "cache_hit_tokens", "cost"):
+        if key in usage:
+            metrics[f"llm.{key}"] = usage[key]
+
+    metrics["artifact.pages"] = len(result.image_paths)
+    metrics["artifact.png_bytes"] = sum(os.path.getsize(p) for p in result.image_paths if os.path.exists(p))
+    if result.pdf_path and os.path.exists(result.pdf_path):
+        metrics["artifact.pdf_bytes"] = os.path.getsize(result.pdf_path)
+
+    for record in result.memory.get("stages", []):
+        if record.get("rss_peak_mb") is not None:
+            metrics[f"memory.{record['stage']}.rss_peak_mb"] = record["rss_peak_mb"]
+    return metrics
+
+
+def _min_delta(metric: str) -> Optional[float]:
+    """指标需检查时返回视为退化的最小绝对增量，否则返回None"""
+    if metric in PERF_CHECK_METRICS:
+        return PERF_CHECK_METRICS[metric]
+    for suffix, delta in PERF_CHECK_METRICS.items():
+        if suffix.startswith(".") and metric.endswith(suffix):
+            return delta
+    return None
+
+
+class PerfHistory:
+    """每次运行一条记录的指标历史"""
+
+    def __init__(self, db_path: Union[str, Path] = PERF_HISTORY_PATH,
+                 baseline_runs: int = PERF_BASELINE_RUNS,
+                 min_baseline_runs: int = PERF_MIN_BASELINE_RUNS,
+                 ratio: float = PERF_REGRESSION_RATIO):
+        """
+        Args:
+            db_path: SQLite数据库路径
+            baseline_runs: 基线取最近N次成功运行
+            min_baseline_runs: 基线运行数少于该值时不检查
+            ratio: 超过基线中位数的比例
+        """
+        self.db_path = Path(db_path)
+        self.baseline_runs = baseline_runs
+        self.min_baseline_runs = min_baseline_runs
+        self.ratio = ratio
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            ensure_dir(self.db_path.parent)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def record(self, run_id: str, metrics: Dict[str, float], success: bool,
+               label: Optional[str] = None, started_at: Optional[float] = None) -> List[Dict]:
+        """
+        写入一次运行的指标；成功的运行先与基线对比
+
+        Args:
+            run_id: 运行ID
+            metrics: collect_metrics() 的结果
+            success: 运行是否成功
+            label: 报告标签（批量模式下的地域/主题），基线只取同一标签的运行
+            started_at: 开始时间戳
+
+        Returns:
+            退化的指标列表
+        """
+        label = label or ""
+        regressions = self.check(metrics, label) if success else []
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO runs (run_id, label, started_at, success, metrics, regressions)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, label, started_at or time.time(), int(success),
+                 json.dumps(metrics, ensure_ascii=False), json.dumps(regressions, ensure_ascii=False)),
+            )
+        return regressions
+
+    def recent(self, limit: int, label: Optional[str] = None, success_only: bool = False) -> List[Dict]:
+        """最近的运行（新运行在前）；label 为None时不按标签过滤"""
+        conditions, params = [], []
+        if label is not None:
+            conditions.append("label = ?")
+            params.append(label)
+        if success_only:
+            conditions.append("success = 1")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM runs {where} ORDER BY id DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [
+            {**dict(row), "metrics": json.loads(row["metrics"]), "regressions": json.loads(row["regressions"] or "[]")}
+            for row in rows
+        ]
+
+    def check(self, metrics: Dict[str, float], label: str = "") -> List[Dict]:
+        """
+        与滚动基线对比：高于基线中位数 (1 + ratio) 倍、高于基线p95，且增量不小于该指标的最小增量时视为退化
+
+        Returns:
+            [{"metric", "value", "p50", "p95", "runs"}, ...]
+        """
+        baseline = self.recent(self.baseline_runs, label=label, success_only=True)
+        if len(baseline) < self.min_baseline_runs:
+            return []
+        regressions = []
+        for metric, value in metrics.items():
+            min_delta = _min_delta(metric)
+            if min_delta is None:
+                continue
+            values = [run["metrics"][metric] for run in baseline if metric in run["metrics"]]
+            if len(values) < self.min_baseline_runs:
+                continue
+            p50, p95 = _percentile(values, 50), _percentile(values, 95)
+            if value > p50 * (1 + self.ratio) and value > p95 and value - p50 >= min_delta:
+                regressions.append({"metric": metric, "value": value, "p50": p50, "p95": p95, "runs": len(values)})
+        return regressions
+
+    def trends(self, limit: int, label: Optional[str] = None) -> List[Dict]:
+        """
+        最近 limit 次成功运行中各指标的分布
+
+        Returns:
+            [{"metric", "runs", "last", "p50", "p95", "max"}, ...]，按指标名排序
+        """
+        runs = self.recent(limit, label=label, success_only=True)
+        values: Dict[str, List[float]] = {}
+        for run in runs:
+            for metric, value in run["metrics"].items():
+                values.setdefault(metric, []).append(value)
+        last = runs[0]["metrics"] if runs else {}
+        return [
+            {
+                "metric": metric,
+                "runs": len(series),
+                "last": last.get(metric),
+                "p50": _percentile(series, 50),
+                "p95": _percentile(series, 95),
+                "max": max(series),
+            }
+            for metric, series in sorted(values.items())
+        ]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def log_regressions(regressions: List[Dict]):
+    for item in regressions:
+        logger.warning(f"性能退化: {item['metric']} = {item['value']:g}，"
+                       f"基线中位数 {item['p50']:g}、p95 {item['p95']:g}（最近 {item['runs']} 次成功运行）")
@@ -0,0 +1,307 @@
+"""
+报告流水线模块
+
+将"生成内容 -> 渲染图片与PDF -> 发送邮件"的完整流程封装为可重复调用的对象，
+服务实例（HTTP会话、LLM客户端、浏览器）在多次运行之间复用。
+"""
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+from loguru import logger
+from config import (
+    RUNS_DIR,
+    TRACE_EXPORT_ENABLED,
+    PERF_HISTORY_ENABLED,
+    EMAIL_HOST,
+    EMAIL_PORT,
+    EMAIL_USER,
+    EMAIL_PASSWORD,
+    EMAIL_RECIPIENTS,
+    DEADLINE_PDF_ONLY_SECONDS,
+    REPORT_FORMAT,
+)
+from templates.prompts import get_hydrogen_report_messages
+from .llm_service import LLMService
+from .report_generator import ReportGenerator
+from .report_sections import sections_to_markdown
+from .email_service import EmailService
+from .tracing import get_tracer, start_run
+from .llm_usage import start_usage_ledger
+from .deadline import Deadline, get_deadline, start_deadline
+from .memory_guard import get_memory_guard, start_memory_guard
+from .stage_profiler import get_profiler
+from .perf_history import PerfHistory, collect_metrics, log_regressions
+from .utils import format_file_size
+
+
+class PipelineResult:
+    """一次流水线运行的结果"""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.success = False
+        self.markdown: Optional[str] = None
+        self.sections: Optional[List[Dict]] = None  # 结构化报告的各部分（REPORT_FORMAT=sections）
+        self.image_paths: List[str] = []
+        self.pdf_path: Optional[str] = None
+        self.email_sent = False
+        self.error: Optional[str] = None
+        self.duration: float = 0.0
+        self.usage: Dict = {}
+        self.deadline: Dict = {}  # 截止时间与各阶段的降级决定
+        self.memory: Dict = {}  # 各阶段的内存占用与低内存路径
+        self.regressions: List[Dict] = []  # 相对历史基线退化的指标
+
+    @property
+    def attachments(self) -> List[str]:
+        """邮件附件：PDF在前，页面图片在后"""
+        return ([self.pdf_path] if self.pdf_path else []) + list(self.image_paths)
+
+    def to_dict(self) -> Dict:
+        return {
+            "run_id": self.run_id,
+            "success": self.success,
+            "image_paths": self.image_paths,
+            "pdf_path": self.pdf_path,
+            "email_sent": self.email_sent,
+            "error": self.error,
+            "duration": round(self.duration, 3),
+            "usage": self.usage,
+            "deadline": self.deadline,
+            "memory": self.memory,
+            "regressions": self.regressions,
+            "sections": [
+                {"part": section["part"], "items": len(section["items"]), "origin": section.get("origin")}
+                for section in self.sections
+            ] if self.sections else None,
+        }
+
+
+def send_report_email(email_service: EmailService, attachments: List[str],
+                      recipients: Optional[List[str]] = None, label: Optional[str] = None) -> bool:
+    """
+    以统一的主题和正文发送报告附件
+
+    Args:
+        email_service: 邮件服务
+        attachments: 附件路径列表
+        recipients: 收件人列表，默认使用 EMAIL_RECIPIENTS
+        label: 可选的报告标签（如地域或主题），附加在邮件主题之后
+
+    Returns:
+        是否发送成功
+    """
+    if not attachments:
+        logger.warning("没有文件可供发送，已跳过邮件发送。")
+        return False
+
+    current_time_str = datetime.now().strftime("%Y年%m月%d日")
+    subject = f"{current_time_str} 氢能产业简报" + (f"（{label}）" if label else "")
+    body = f"您好，以下附件为最新的氢能产业简报，请查收。此邮件为自动发送，请勿回复。祝好！"
+    return email_service.send_email_with_attachments(
+        recipients=recipients if recipients is not None else EMAIL_RECIPIENTS,
+        subject=subject,
+        body=body,
+        attachments=attachments
+    )
+
+
+def _mime_footprint_mb(paths: List[str]) -> float:
+    """估算构建邮件所需内存：原始字节、base64编码与序列化后的整封邮件同时存在，约为附件总大小的3倍"""
+    total = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+    return total * 3 / (1024 * 1024)
+
+
+class ReportPipeline:
+    """报告流水线，持有可在多次运行之间复用的服务实例"""
+
+    def __init__(self, llm_service: Optional[LLMService] = None,
+                 report_generator: Optional[ReportGenerator] = None,
+                 email_service: Optional[EmailService] = None):
+        logger.info("初始化服务...")
+        self.llm_service = llm_service or LLMService()
+        self.report_generator = report_generator or ReportGenerator()
+        self.email_service = email_service or EmailService(
+            host=EMAIL_HOST,
+            port=EMAIL_PORT,
+            user=EMAIL_USER,
+            password=EMAIL_PASSWORD
+        )
+        # 每次运行的指标历史与退化检查
+        self.perf_history = PerfHistory() if PERF_HISTORY_ENABLED else None
+
+    def run(self, messages: Optional[Union[str, List[Dict]]] = None,
+            recipients: Optional[List[str]] = None,
+            show_progress: bool = True,
+            job_name: Optional[str] = None,
+            send_email: bool = True,
+            label: Optional[str] = None,
+            deadline: Optional[Deadline] = None,
+            regenerate_parts: Optional[List[int]] = None) -> PipelineResult:
+        """
+        执行一次完整的报告流程
+
+        Args:
+            messages: 初始提示或消息列表，默认使用 get_hydrogen_report_messages()
+            recipients: 收件人列表，默认使用 EMAIL_RECIPIENTS
+            show_progress: 是否显示进度条
+            job_name: 可选的任务名，用于隔离并发任务的输出文件
+            send_email: 是否在渲染完成后发送邮件
+            label: 可选的报告标签，用于邮件主题
+            deadline: 截止时间，默认按 RUN_DEADLINE / RUN_BUDGET_SECONDS 配置
+            regenerate_parts: 以结构化格式生成，并重新搜索、重写指定的部分（1-5），其余部分复用缓存
+
+        Returns:
+            PipelineResult
+        """
+        from tqdm import tqdm
+
+        tracer = start_run()
+        usage_ledger = start_usage_ledger()
+        deadline = start_deadline(deadline)
+        memory = start_memory_guard()
+        profiler = get_profiler()
+        result = PipelineResult(tracer.run_id)
+        started = time.perf_counter()
+        logger.info(f"运行ID: {tracer.run_id}")
+
+        try:
+            logger.info("开始生成氢能产业简报...")
+            with tracer.span("run"), tqdm(total=4, desc="生成进度", disable=not show_progress) as pbar:
+
+                # 步骤1: 生成报告内容
+                pbar.set_description("步骤1: 生成报告内容")
+                report_prompt = messages if messages is not None else get_hydrogen_report_messages()
+                with tracer.span("stage.generate_content"), memory.stage("generate_content"), \
+                        profiler.stage("generate_content"):
+                    if REPORT_FORMAT == "sections" or regenerate_parts:
+                        result.sections = self.llm_service.generate_structured_report(
+                            report_prompt, regenerate=regenerate_parts
+                        )
+                        result.markdown = sections_to_markdown(result.sections) if result.sections else None
+                    else:
+                        result.markdown = self.llm_service.generate_report(report_prompt)
+
+                if not result.markdown:
+                    result.error = "报告内容生成失败"
+                    logger.error(result.error)
+                    return result
+
+                pbar.update(1)
+
+                # 步骤2: 生成图片和PDF
+                pbar.set_description("步骤2: 生成报告文件")
+                with tracer.span("stage.render") as span, memory.stage("render"), profiler.stage("render"):
+                    result.image_paths, result.pdf_path = \
+                        self.report_generator.generate_complete_report(result.markdown, job_name=job_name,
+                                                                       sections=result.sections)
+                    span.set_attributes(pages=len(result.image_paths))
+                pbar.update(1)
+
+                # 步骤3: 发送邮件
+                pbar.set_description("步骤3: 发送邮件")
+                if send_email:
+                    with memory.stage("email"), profiler.stage("email"):
+                        result.email_sent = self._send(result, recipients, label)
+                if result.email_sent or not send_email:
+                    # 只有交付了的报告条目才算"已报道"
+                    self.llm_service.index_report(result.markdown, result.sections)
+                pbar.update(1)
+
+                # 步骤4: 完成
+                pbar.set_description("步骤4: 完成")
+                pbar.update(1)
+
+            result.success = True
+            self._log_result(result)
+            return result
+
+        except Exception as e:
+            result.error = str(e)
+            logger.error(f"程序执行过程中发生错误: {e}")
+            return result
+        finally:
+            result.duration = time.perf_counter() - started
+            result.usage = usage_ledger.totals()
+            result.deadline = deadline.to_dict()
+            result.memory = memory.to_dict()
+            tracer.log_summary()
+            if memory.profile:
+                memory.log_summary()
+            if profiler.enabled:
+                # --profile 为显式请求，不受 TRACE_EXPORT_ENABLED 影响
+                profiler.log_summary()
+                paths = profiler.export(RUNS_DIR / tracer.run_id / "profile")
+                logger.info(f"分析结果已写入 {RUNS_DIR / tracer.run_id / 'profile'}（{len(paths)} 个文件）")
+            usage_ledger.log_summary()
+            tracer.set_gauge("llm_cache_hit_ratio", result.usage["cache_hit_ratio"])
+            if self.perf_history is not None:
+                self._record_history(result, tracer, label)
+            if TRACE_EXPORT_ENABLED:
+                tracer.export(RUNS_DIR / tracer.run_id)
+                usage_ledger.export(RUNS_DIR / tracer.run_id)
+                (RUNS_DIR / tracer.run_id / "run.json").write_text(
+                    json.dumps(result.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8"
+                )
+                if result.markdown:
+                    # 保留报告原文，供渲染基准测试使用真实报告
+                    (RUNS_DIR / tracer.run_id / "report.md").write_text(result.markdown, encoding="utf-8")
+
+    def _send(self, result: PipelineResult, recipients: Optional[List[str]],
+              label: Optional[str] = None) -> bool:
+        attachments = result.attachments
+        deadline = get_deadline()
+        if result.pdf_path and result.image_paths:
+            if deadline.remaining() < DEADLINE_PDF_ONLY_SECONDS:
+                # 截止时间临近：不再压缩和上传页面图片，只发送PDF
+                deadline.degrade("email", "pdf_only", skipped_images=len(result.image_paths))
+                attachments = [result.pdf_path]
+            elif get_memory_guard().low_memory("email", "pdf_only", projected_mb=_mime_footprint_mb(attachments),
+                                               skipped_images=len(result.image_paths)):
+                attachments = [result.pdf_path]
+        with get_tracer().span("stage.email", attachments=len(attachments)):
+            return send_report_email(self.email_service, attachments, recipients, label)
+
+    def _record_history(self, result: PipelineResult, tracer, label: Optional[str]):
+        """写入性能历史并与基线对比；失败不影响本次运行"""
+        try:
+            result.regressions = self.perf_history.record(
+                tracer.run_id, collect_metrics(result, tracer), result.success,
+                label=label, started_at=tracer.started_at,
+            )
+        except Exception as e:
+            logger.warning(f"写入性能历史失败: {e}")
+            return
+        log_regressions(result.regressions)
+        for item in result.regressions:
+            tracer.incr("perf_regressions", metric=item["metric"])
+
+    def _log_result(self, result: PipelineResult):
+        # 显示结果
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        logger.success(f"报告生成完成! ({current_time})")
+
+        if result.image_paths:
+            logger.info(f"生成了 {len(result.image_paths)} 张图片")
+            for i, path in enumerate(result.image_paths, 1):
+                logger.info(f"  页面 {i}: {path}")
+
+        if result.pdf_path:
+            logger.info(f"PDF报告: {result.pdf_path}")
+        
+        for item in get_deadline().decisions:
+            logger.warning(f"降级: {item['stage']} / {item['decision']}（剩余 {item['remaining_seconds']}s 时）")
+
+        # 显示文件大小
+        if result.pdf_path and os.path.exists(result.pdf_path):
+            size = os.path.getsize(result.pdf_path)
+            logger.info(f"PDF大小: {format_file_size(size)}")
+
+    def close(self):
+        """释放复用的资源"""
+        self.llm_service.close()
+        self.report_generator.close()
+        if self.perf_history is not None:
+            self.perf_history.close()
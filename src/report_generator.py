@@ -1,41 +1,66 @@
 """
 报告生成器模块
 """
+import json
 import os
+import queue
 import re
+import shutil
+import tempfile
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Tuple
-from PIL import Image
-import markdown2
-from html2image import Html2Image
+from typing import Dict, List, Optional, Tuple, Union
 from loguru import logger
-from config import OUTPUT_DIR, ASSETS_DIR, REPORT_CONFIG
-from templates.html_template import BASE_CSS_STYLES
+from config import (
+    OUTPUT_DIR,
+    ASSETS_DIR,
+    REPORT_CONFIG,
+    RENDER_BROWSER_POOL_SIZE,
+    DEADLINE_PDF_ONLY_SECONDS,
+    MARKDOWN_BACKEND,
+)
 from .utils import ensure_dir
+from .tracing import get_tracer
+from .deadline import get_deadline
+from .memory_guard import MB, MemoryCeilingExceeded, get_memory_guard
+from .markdown_backends import get_converter
+from .report_sections import render_sections_html
+from .templating import PageTemplate
+from .fonts import FONT_FAMILY, FontManager, ReportFont
 
 
 class ReportGenerator:
     """报告生成器类"""
     
-    def __init__(self):
+    def __init__(self, browser_pool_size: int = RENDER_BROWSER_POOL_SIZE,
+                 markdown_backend: str = MARKDOWN_BACKEND):
         self.output_dir = OUTPUT_DIR
         self.assets_dir = ASSETS_DIR
         self.config = REPORT_CONFIG
         
-        # 统一使用html_template中的样式，并为表格添加强制换行
-        self.base_style = BASE_CSS_STYLES.replace(
-            "tr:hover td {",
-            "td { word-break: break-all; } tr:hover td {"
-        )
+        # 页面骨架（含样式表）只编译一次，每页只填入页眉、页脚和正文
+        self.page_template = PageTemplate(title="氢能产业双周简报")
+        # 截图器池：实例在多次运行之间复用（浏览器可执行文件查找、临时目录只需初始化一次），
+        # 每个实例同一时刻只服务一次截图，池大小即截图并发度
+        self.browser_pool_size = max(1, browser_pool_size)
+        self._browser_pool: "queue.LifoQueue" = queue.LifoQueue()
+        self._browsers = []
+        self._pool_lock = threading.Lock()
+        # Markdown转换后端，见 markdown_backends
+        self.markdown = get_converter(markdown_backend)
+        # 报告字体：定位一次，每份报告按用到的字符生成（或复用）子集
+        self.fonts = FontManager()
     
-    def generate_report_images(self, markdown_text: str, output_subdir: str = "pages") -> List[str]:
+    def generate_report_images(self, markdown_text: str, output_subdir: str = "pages",
+                               sections: Optional[List[Dict]] = None) -> List[str]:
         """
         将Markdown文本转换为图片
         
         Args:
             markdown_text: Markdown格式的报告内容
             output_subdir: 输出子目录
+            sections: 可选的结构化报告各部分；提供时按模板渲染，不再解析Markdown
             
         Returns:
             生成的图片路径列表
@@ -49,35 +74,43 @@ class ReportGenerator:
             ensure_dir(output_path)
             
             # 分页处理
-            pages = self._split_markdown_pages(markdown_text)
+            pages = self._split_section_pages(sections) if sections else self._split_markdown_pages(markdown_text)
             total_pages = len(pages)
             
-            hti = Html2Image(
-                output_path=str(output_path),
-                size=self.config["image_size"],
-                browser="chrome"
-            )
-            
             image_paths = []
+            tracer = get_tracer()
+            
+            with tracer.span("render.font") as span:
+                font = self.fonts.prepare([header_text, footer_text, *map(_page_text, pages)])
+                if font:
+                    span.set_attributes(font=font.filename, bytes=font.path.stat().st_size)
             
             for i, page_content in enumerate(pages):
                 page_num = i + 1
-                html_content = self._create_html_page(
-                    page_content, header_text, footer_text, page_num, total_pages
-                )
+                with tracer.span("render.html", page=page_num,
+                                 chars=len(page_content) if isinstance(page_content, str) else None,
+                                 backend="sections" if sections else self.markdown.name):
+                    html_content = self._create_html_page(
+                        page_content, header_text, footer_text, page_num, total_pages, font
+                    )
                 
                 image_filename = f"hydrogen_report_page_{page_num}.png"
-                hti.screenshot(html_str=html_content, save_as=image_filename)
+                with tracer.span("render.screenshot", page=page_num):
+                    self._screenshot(output_path, html_content, image_filename, font)
                 
                 image_path = output_path / image_filename
                 image_paths.append(str(image_path))
                 
                 logger.info(f"生成第 {page_num} 页图片: {image_filename}")
                 
-                # 添加Logo
+                # 添加Logo（截止时间临近时跳过）
                 logo_path = self.assets_dir / "logo.png"
-                if logo_path.exists():
-                    self._add_logo_to_image(str(image_path), str(logo_path))
+                deadline = get_deadline()
+                if logo_path.exists() and deadline.remaining() < DEADLINE_PDF_ONLY_SECONDS:
+                    deadline.degrade("render", "skip_logo")
+                elif logo_path.exists():
+                    with tracer.span("render.logo", page=page_num):
+                        self._add_logo_to_image(str(image_path), str(logo_path))
             
             return image_paths
             
@@ -85,6 +118,62 @@ class ReportGenerator:
             logger.error(f"生成报告图片时发生错误: {e}")
             return []
     
+    def _acquire_screenshotter(self):
+        """从池中取出一个截图器；池未满时新建，否则等待归还"""
+        try:
+            return self._browser_pool.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._pool_lock:
+            create = len(self._browsers) < self.browser_pool_size
+            if create:
+                from html2image import Html2Image
+                
+                # 每个实例使用独立的临时目录，避免并发时同名的临时HTML文件互相覆盖
+                hti = Html2Image(
+                    output_path=str(self.output_dir),
+                    size=self.config["image_size"],
+                    browser="chrome",
+                    temp_path=tempfile.mkdtemp(prefix="html2image_")
+                )
+                self._browsers.append(hti)
+        return hti if create else self._browser_pool.get()
+    
+    def _screenshot(self, output_path: Path, html_content: str, image_filename: str,
+                    font: Optional[ReportFont] = None):
+        """将HTML截图保存到指定目录"""
+        hti = self._acquire_screenshotter()
+        try:
+            hti.output_path = str(output_path)
+            stylesheet = self.page_template.stylesheet_name
+            if stylesheet and not os.path.exists(os.path.join(hti.temp_path, stylesheet)):
+                # 外部样式表在每个截图器的临时目录中只写入一次，各页以相对路径引用
+                hti.load_str(content=self.page_template.stylesheet, as_filename=stylesheet)
+            if font and not os.path.exists(os.path.join(hti.temp_path, font.filename)):
+                # 字体文件同样复制到临时目录，由 @font-face 以相对路径引用；之前报告的字体不再需要，先删除
+                for previous in Path(hti.temp_path).glob(f"{FONT_FAMILY}.*"):
+                    previous.unlink(missing_ok=True)
+                shutil.copyfile(font.path, os.path.join(hti.temp_path, font.filename))
+            # 直接载入完整的HTML文档，不经 screenshot(html_str=...) 再包一层 <html>
+            html_filename = f"{Path(image_filename).stem}.html"
+            hti.load_str(content=html_content, as_filename=html_filename)
+            try:
+                hti.screenshot_loaded_file(file=html_filename, output_file=image_filename,
+                                           size=self.config["image_size"])
+            finally:
+                os.remove(os.path.join(hti.temp_path, html_filename))
+        finally:
+            self._browser_pool.put(hti)
+    
+    def close(self):
+        """释放截图器池及其临时目录"""
+        with self._pool_lock:
+            for hti in self._browsers:
+                shutil.rmtree(hti.temp_path, ignore_errors=True)
+            self._browsers = []
+            self._browser_pool = queue.LifoQueue()
+    
     def generate_pdf(self, image_paths: List[str], output_filename: str = "hydrogen_report.pdf") -> Optional[str]:
         """
         将图片合并为PDF
@@ -101,19 +190,34 @@ class ReportGenerator:
                 logger.warning("没有图片可以转换为PDF")
                 return None
             
+            from PIL import Image
+            
             pdf_path = self.output_dir / "reports" / output_filename
             ensure_dir(pdf_path.parent)
             
-            images = []
-            for img_path in image_paths:
-                img = Image.open(img_path).convert("RGB")
-                images.append(img)
-            
-            if images:
-                images[0].save(str(pdf_path), save_all=True, append_images=images[1:])
+            # 常规路径同时持有全部页面解码后的RGB位图
+            width, height = self.config["image_size"]
+            projected_mb = len(image_paths) * width * height * 3 / MB
+            streaming = get_memory_guard().low_memory("render", "streaming_pdf", projected_mb=projected_mb,
+                                                      pages=len(image_paths))
+            with get_tracer().span("render.pdf", pages=len(image_paths), streaming=streaming) as span:
+                if streaming:
+                    # 逐页追加写入，任一时刻只解码一页
+                    for i, img_path in enumerate(image_paths):
+                        with Image.open(img_path) as img:
+                            img.convert("RGB").save(str(pdf_path), append=i > 0)
+                else:
+                    images = []
+                    for img_path in image_paths:
+                        img = Image.open(img_path).convert("RGB")
+                        images.append(img)
+                    images[0].save(str(pdf_path), save_all=True, append_images=images[1:])
+                span.set_attribute("bytes", pdf_path.stat().st_size)
                 logger.info(f"PDF生成成功: {pdf_path}")
                 return str(pdf_path)
             
+        except MemoryCeilingExceeded:
+            raise
         except Exception as e:
             logger.error(f"生成PDF时发生错误: {e}")
             return None
@@ -155,36 +259,37 @@ class ReportGenerator:
             
         return pages
     
-    def _create_html_page(self, content: str, header: str, footer: str, 
-                         page_num: int, total_pages: int) -> str:
+    @staticmethod
+    def _split_section_pages(sections: List[Dict]) -> List[List[Dict]]:
+        """结构化报告分页：与Markdown报告一致，Part 5（重点数据）单独一页"""
+        pages = [[s for s in sections if s["part"] != 5], [s for s in sections if s["part"] == 5]]
+        return [page for page in pages if page]
+    
+    def _create_html_page(self, content: Union[str, List[Dict]], header: str, footer: str, 
+                         page_num: int, total_pages: int, font: Optional[ReportFont] = None) -> str:
         """
         创建HTML页面
         
         Args:
-            content: 页面内容
+            content: 页面内容（Markdown文本，或结构化报告的若干部分）
             header: 页眉文本
             footer: 页脚文本
             page_num: 当前页码
             total_pages: 总页数
+            font: 可选的报告字体，提供时注入 @font-face
             
         Returns:
             完整的HTML内容
         """
-        html_body = markdown2.markdown(content, extras=["tables"])
+        if isinstance(content, list):
+            html_body = render_sections_html(content)
+        else:
+            html_body = self.markdown.convert(content)
         
-        return f"""
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <style>{self.base_style}</style>
-        </head>
-        <body>
-            <div class="header">{header}</div>
-            <div class="footer">第 {page_num} 页 / 共 {total_pages} 页 · {footer}</div>
-            {html_body}
-        </body>
-        </html>
-        """
+        return self.page_template.render(
+            html_body, header, f"第 {page_num} 页 / 共 {total_pages} 页 · {footer}",
+            fonts=f"<style>{font.css}</style>" if font else ""
+        )
     
     def _add_logo_to_image(self, image_path: str, logo_path: str):
         """
@@ -195,6 +300,8 @@ class ReportGenerator:
             logo_path: Logo路径
         """
         try:
+            from PIL import Image
+            
             img = Image.open(image_path).convert("RGBA")
             logo = Image.open(logo_path).convert("RGBA")
             
@@ -214,12 +321,17 @@ class ReportGenerator:
         except Exception as e:
             logger.error(f"添加Logo失败: {e}")
     
-    def generate_complete_report(self, markdown_content: str) -> Tuple[List[str], Optional[str]]:
+    def generate_complete_report(self, markdown_content: str,
+                                 job_name: Optional[str] = None,
+                                 sections: Optional[List[Dict]] = None) -> Tuple[List[str], Optional[str]]:
         """
         生成完整报告（图片和PDF）
         
         Args:
             markdown_content: Markdown格式的报告内容
+            job_name: 可选的任务名；指定后图片写入 pages/<job_name>/，PDF命名为 <job_name>.pdf，
+                      以便多份报告同时生成时互不覆盖
+            sections: 可选的结构化报告各部分，提供时按模板渲染
             
         Returns:
             图片路径列表和PDF路径
@@ -227,12 +339,20 @@ class ReportGenerator:
         logger.info("开始生成完整报告")
         
         # 生成图片
-        image_paths = self.generate_report_images(markdown_content)
+        output_subdir = f"pages/{job_name}" if job_name else "pages"
+        image_paths = self.generate_report_images(markdown_content, output_subdir=output_subdir,
+                                                  sections=sections)
         
         # 生成PDF
         pdf_path = None
         if image_paths:
-            pdf_path = self.generate_pdf(image_paths)
+            pdf_filename = f"{job_name}.pdf" if job_name else "hydrogen_report.pdf"
+            pdf_path = self.generate_pdf(image_paths, output_filename=pdf_filename)
         
         logger.info("完整报告生成完成")
-        return image_paths, pdf_path
\ No newline at end of file
+        return image_paths, pdf_path
+
+
+def _page_text(content: Union[str, List[Dict]]) -> str:
+    """页面中会出现的文本，用于确定字体子集的字符"""
+    return content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
@@ -0,0 +1,240 @@
+"""
+结构化报告模块
+
+REPORT_FORMAT=sections 时，LLM 以 JSON 输出报告的五个部分。本模块负责：
+
+- 解析并逐部分校验 JSON（条目的标题、日期、来源、链接、要点，Part 5 的数据表），
+  不合格的部分单独重写，其余部分保留；
+- 按"提示 + 部分编号"缓存各部分，重跑或单独重写某部分时复用其余部分；
+- 将各部分渲染为 HTML（REPORT_SECTIONS_TEMPLATE / NEWS_ITEM_TEMPLATE / TABLE_TEMPLATE），
+  并转换为 Markdown，供跨期索引、运行归档等按 Markdown 处理报告的既有流程使用。
+"""
+import html
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from loguru import logger
+from config import SECTION_CACHE_DIR, SECTION_CACHE_TTL_HOURS, SECTION_MIN_ITEMS
+from templates.html_template import NEWS_ITEM_TEMPLATE, REPORT_SECTIONS_TEMPLATE, TABLE_TEMPLATE
+from templates.prompts import REPORT_PARTS
+from .templating import compile_template
+from .utils import ensure_dir
+
+
+PART_NUMBERS = [part for part, _, _ in REPORT_PARTS]
+
+DATE_PATTERN = re.compile(r"^\d{4}(?:[-/.年]\d{1,2}(?:[-/.月]\d{1,2}日?)?月?)?$")
+CODE_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+class SectionValidationError(ValueError):
+    """某部分的JSON不符合要求"""
+
+
+def parse_json_object(text: Optional[str]) -> Dict:
+    """
+    解析LLM返回的JSON对象（容忍代码块包裹）
+
+    Raises:
+        SectionValidationError: 内容不是JSON对象
+    """
+    try:
+        data = json.loads(CODE_FENCE_PATTERN.sub("", text or ""))
+    except ValueError as e:
+        raise SectionValidationError(f"不是有效的JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise SectionValidationError("顶层不是JSON对象")
+    return data
+
+
+def _text(value) -> str:
+    return value.strip() if isinstance(value, str) else ("" if value is None else str(value).strip())
+
+
+def _validate_item(item) -> Dict:
+    if not isinstance(item, dict):
+        raise SectionValidationError("条目不是对象")
+    title, content = _text(item.get("title")), _text(item.get("content"))
+    if not title or not content:
+        raise SectionValidationError("条目缺少标题或要点")
+    date = _text(item.get("date"))
+    if date and not DATE_PATTERN.match(date):
+        date = ""  # 无法识别的日期不展示，避免把模型的说明文字当作日期
+    url = _text(item.get("url"))
+    return {
+        "title": title,
+        "date": date,
+        "source": _text(item.get("source")),
+        "url": url if url.startswith(("http://", "https://")) else "",
+        "content": content,
+    }
+
+
+def _validate_table(table) -> Optional[Dict]:
+    if not isinstance(table, dict):
+        return None
+    headers = [_text(h) for h in table.get("headers") or []]
+    rows = [[_text(cell) for cell in row] for row in table.get("rows") or [] if isinstance(row, list)]
+    rows = [row for row in rows if len(row) == len(headers)]
+    if not headers or not rows:
+        return None
+    return {"headers": headers, "rows": rows}
+
+
+def validate_section(data, part: int) -> Dict:
+    """
+    校验并规范化某一部分
+
+    Args:
+        data: 解析后的JSON对象
+        part: 期望的部分编号
+
+    Returns:
+        {"part", "title", "items", "table"(可选)}
+
+    Raises:
+        SectionValidationError: 结构不符或条目不足
+    """
+    if not isinstance(data, dict):
+        raise SectionValidationError("不是JSON对象")
+    raw_items = data.get("items")
+    if not isinstance(raw_items, list):
+        raise SectionValidationError("缺少 items 列表")
+    items = []
+    for item in raw_items:
+        try:
+            items.append(_validate_item(item))
+        except SectionValidationError as e:
+            logger.debug(f"Part {part} 丢弃一条不合格的条目: {e}")
+    if len(items) < SECTION_MIN_ITEMS:
+        raise SectionValidationError(f"合格条目仅 {len(items)} 条，少于 {SECTION_MIN_ITEMS} 条")
+    section = {
+        "part": part,
+        "title": _text(data.get("title")) or REPORT_PARTS[part - 1][1],
+        "items": items,
+    }
+    table = _validate_table(data.get("table"))
+    if table:
+        section["table"] = table
+    return section
+
+
+def validate_report(data: Dict) -> Tuple[Dict[int, Dict], Dict[int, str]]:
+    """
+    逐部分校验整份报告
+
+    Returns:
+        (合格的部分 {编号: 部分}, 不合格的部分 {编号: 原因})
+    """
+    raw_sections = data.get("sections")
+    if isinstance(raw_sections, dict):
+        raw_sections = list(raw_sections.values())
+    by_part = {}
+    for index, raw in enumerate(raw_sections if isinstance(raw_sections, list) else []):
+        if not isinstance(raw, dict):
+            continue
+        try:
+            part = int(raw.get("part", index + 1))
+        except (TypeError, ValueError):
+            part = index + 1
+        by_part.setdefault(part, raw)
+
+    valid, invalid = {}, {}
+    for part in PART_NUMBERS:
+        if part not in by_part:
+            invalid[part] = "缺少该部分"
+            continue
+        try:
+            valid[part] = validate_section(by_part[part], part)
+        except SectionValidationError as e:
+            invalid[part] = str(e)
+    return valid, invalid
+
+
+def sections_to_markdown(sections: List[Dict]) -> str:
+    """将各部分转换为与自由格式报告一致的Markdown（"### Part N: 标题" 分节）"""
+    lines = []
+    for section in sections:
+        lines.append(f"### Part {section['part']}: {section['title']}\n")
+        for item in section["items"]:
+            meta = "，".join(value for value in (item["date"], item["source"]) if value)
+            link = f" ([来源]({item['url']}))" if item["url"] else ""
+            lines.append(f"- **{item['title']}**" + (f"（{meta}）" if meta else "") + f"：{item['content']}{link}")
+        table = section.get("table")
+        if table:
+            cells = lambda row: "| " + " | ".join(cell.replace("|", "\\|") for cell in row) + " |"
+            lines.append("")
+            lines.append(cells(table["headers"]))
+            lines.append("|" + " --- |" * len(table["headers"]))
+            lines.extend(cells(row) for row in table["rows"])
+        lines.append("")
+    return "\n".join(lines)
+
+
+def render_sections_html(sections: List[Dict]) -> str:
+    """将各部分渲染为HTML片段，所有来自模型的文本均经过转义"""
+    escape = html.escape
+    section_template = compile_template(REPORT_SECTIONS_TEMPLATE)
+    item_template = compile_template(NEWS_ITEM_TEMPLATE)
+    table_template = compile_template(TABLE_TEMPLATE)
+    blocks = []
+    for section in sections:
+        content = "".join(
+            item_template.render(
+                date=escape(item["date"] or "—"),
+                title=escape(item["title"]),
+                source=escape(item["source"] or "—"),
+                content=escape(item["content"]),
+            )
+            for item in section["items"]
+        )
+        table = section.get("table")
+        if table:
+            content += table_template.render(
+                table_headers="".join(f"<th>{escape(h)}</th>" for h in table["headers"]),
+                table_rows="".join(
+                    "<tr>" + "".join(f"<td>{escape(cell)}</td>" for cell in row) + "</tr>"
+                    for row in table["rows"]
+                ),
+            )
+        blocks.append(section_template.render(
+            section_title=escape(f"Part {section['part']}: {section['title']}"),
+            section_content=content,
+        ))
+    return "".join(blocks)
+
+
+class SectionCache:
+    """各部分的本地缓存：<目录>/<提示键>/part<N>.json"""
+
+    def __init__(self, cache_dir: Union[str, Path] = SECTION_CACHE_DIR,
+                 ttl_hours: float = SECTION_CACHE_TTL_HOURS):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_hours * 3600
+
+    def _path(self, key: str, part: int) -> Path:
+        return self.cache_dir / key / f"part{part}.json"
+
+    def get(self, key: str, part: int) -> Optional[Dict]:
+        """读取未过期的部分缓存"""
+        path = self._path(key, part)
+        if not path.exists():
+            return None
+        if time.time() - path.stat().st_mtime > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            return validate_section(json.loads(path.read_text(encoding="utf-8")), part)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取 Part {part} 缓存失败: {e}")
+            return None
+
+    def put(self, key: str, section: Dict):
+        try:
+            path = self._path(key, section["part"])
+            ensure_dir(path.parent)
+            path.write_text(json.dumps(section, ensure_ascii=False), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"保存 Part {section['part']} 缓存失败: {e}")
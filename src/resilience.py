@@ -0,0 +1,216 @@
+"""
+容错模块
+
+为 DeepSeek 和 SerpApi 调用提供：
+
+- 带随机抖动的指数退避重试（只重试超时、连接错误、429 和 5xx 等暂时性错误）；
+- 按端点/引擎划分的熔断器：连续失败达到阈值后在冷却期内直接失败，
+  冷却期结束后只放行一个试探请求（其余请求在其结束前继续被拒绝），成功即恢复、失败则重新冷却。
+
+熔断器在进程内全局共享，常驻服务和工作者进程的多次运行之间保持状态。
+"""
+import random
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, Type, TypeVar
+from loguru import logger
+from config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+)
+from .tracing import get_tracer
+
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+
+class CircuitBreaker:
+    """单个端点的熔断器（closed -> open -> half_open -> closed）"""
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False  # 半开状态下是否已有试探请求在进行
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """是否拒绝请求：处于冷却期内，或半开状态下试探请求尚未结束"""
+        with self._lock:
+            if self.state == "half_open":
+                return self.probing
+            return self.state == "open" and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self):
+        """请求前检查；熔断打开或试探请求进行中时抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"{self.name} 熔断中，{self.reset_timeout:.0f}s 冷却期内不再请求")
+            if self.probing:
+                raise CircuitOpenError(f"{self.name} 熔断半开，等待试探请求的结果")
+            if self.state == "open":
+                logger.info(f"熔断器 {self.name} 进入半开状态，放行一次试探请求")
+            self.state = "half_open"
+            self.probing = True
+
+    def record_success(self):
+        """请求得到应答（成功或非暂时性错误）：恢复"""
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"熔断器 {self.name} 已恢复")
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+
+    def release(self):
+        """请求未得出结果（被中断）：不改变状态，允许下一个请求试探"""
+        with self._lock:
+            self.probing = False
+
+    def trip(self):
+        """立即打开（例如所有密钥的配额都已用尽），冷却期后再试探"""
+        with self._lock:
+            if self.state != "open":
+                logger.warning(f"熔断器 {self.name} 打开")
+                get_tracer().incr("circuit_opened", endpoint=self.name)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.probing = False
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"熔断器 {self.name} 打开（连续失败 {self.failures} 次）")
+                    get_tracer().incr("circuit_opened", endpoint=self.name)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """获取（必要时创建）指定端点的熔断器"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None and getattr(exc, "response", None) is not None:
+        status = getattr(exc.response, "status_code", None)
+    return status
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """判断异常是否为值得重试的暂时性错误"""
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    # 只检查已加载的客户端库，避免为判断异常类型而导入重量级依赖
+    requests = sys.modules.get("requests")
+    if requests is not None and isinstance(exc, (requests.exceptions.ConnectionError,
+                                                 requests.exceptions.Timeout)):
+        return True
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(exc, openai.APIConnectionError):
+        return True
+    return isinstance(exc, (ConnectionError, TimeoutError))
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """读取响应中的 Retry-After（秒）"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base_delay: float = RETRY_BASE_DELAY,
+                  max_delay: float = RETRY_MAX_DELAY) -> float:
+    """第 attempt 次失败后的等待时间（full jitter 指数退避）"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def retry_call(fn: Callable[[], T], name: str, max_attempts: int,
+               breaker: Optional[CircuitBreaker] = None,
+               deadline: Optional[float] = None,
+               base_delay: float = RETRY_BASE_DELAY,
+               max_delay: float = RETRY_MAX_DELAY,
+               fatal: Tuple[Type[BaseException], ...] = ()) -> T:
+    """
+    调用 fn，暂时性错误按抖动指数退避重试
+
+    Args:
+        fn: 无参调用
+        name: 调用名称，用于日志和指标
+        max_attempts: 最大尝试次数
+        breaker: 可选的熔断器；打开时直接抛出 CircuitOpenError
+        deadline: 可选的截止时间（time.monotonic() 时间戳），退避等待不会越过该时间
+        base_delay: 首次重试的最大等待时间（秒）
+        max_delay: 单次等待时间上限（秒）
+        fatal: 不重试并立即打开熔断器的异常类型
+
+    Returns:
+        fn 的返回值
+    """
+    tracer = get_tracer()
+    attempt = 0
+    while True:
+        attempt += 1
+        if breaker is not None:
+            breaker.allow()
+        try:
+            result = fn()
+        except Exception as e:
+            retryable = is_retryable(e) and not isinstance(e, fatal)
+            if breaker is not None:
+                # 非暂时性错误（如400、401）说明端点有应答，不计为故障；半开时同样据此恢复
+                if isinstance(e, fatal):
+                    breaker.trip()
+                elif retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            if not retryable or attempt >= max_attempts:
+                raise
+            delay = _retry_after(e) or backoff_delay(attempt, base_delay, max_delay)
+            delay = min(delay, max_delay)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            tracer.incr("retries", call=name)
+            logger.warning(f"{name} 第 {attempt}/{max_attempts} 次调用失败（{e}），{delay:.1f}s 后重试")
+            time.sleep(delay)
+            continue
+        except BaseException:
+            if breaker is not None:
+                breaker.release()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -0,0 +1,175 @@
+"""
+搜索结果容器模块
+
+SearchResultBatch 以列式存储一批搜索结果：每个字段一列，引擎、来源、查询词等
+高度重复的字符串经过驻留（intern）只保存一份。去重、过滤、排序都只生成行号数组，
+再按行号一次性取出新的批次；遍历时得到的 SearchResult 是指向批次某一行的轻量视图，
+支持与原先字典相同的 get / [] 访问，因此无需复制即可交给格式化与索引代码使用。
+"""
+import sys
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+FIELDS = ("title", "link", "date", "source", "snippet", "engine", "query", "novelty", "excerpt", "facts")
+
+# 取值种类很少、在各行间大量重复的字段
+INTERNED_FIELDS = ("date", "source", "engine", "query", "novelty")
+
+# 只有部分结果才有的字段，缺省为None（正文摘录与数据句由 article_fetcher 补充）
+OPTIONAL_FIELDS = ("novelty", "excerpt", "facts")
+
+
+class SearchResult:
+    """批次中某一行的视图，兼容字典式访问"""
+
+    __slots__ = ("_batch", "_index")
+
+    def __init__(self, batch: "SearchResultBatch", index: int):
+        self._batch = batch
+        self._index = index
+
+    def __getitem__(self, key: str):
+        if key not in self._batch.columns:
+            raise KeyError(key)
+        return self._batch.columns[key][self._index]
+
+    def __setitem__(self, key: str, value):
+        if key not in self._batch.columns:
+            raise KeyError(key)
+        if key in INTERNED_FIELDS and isinstance(value, str):
+            value = sys.intern(value)
+        self._batch.columns[key][self._index] = value
+
+    def get(self, key: str, default=None):
+        column = self._batch.columns.get(key)
+        if column is None:
+            return default
+        value = column[self._index]
+        return default if value is None else value
+
+    def to_dict(self) -> Dict:
+        return {name: column[self._index] for name, column in self._batch.columns.items()
+                if column[self._index] is not None}
+
+    def __repr__(self) -> str:
+        return f"SearchResult({self.to_dict()!r})"
+
+
+class SearchResultBatch:
+    """列式存储的一批搜索结果"""
+
+    __slots__ = ("columns",)
+
+    def __init__(self, columns: Optional[Dict[str, List]] = None):
+        self.columns: Dict[str, List] = columns or {name: [] for name in FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.columns["link"])
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __iter__(self) -> Iterator[SearchResult]:
+        return (SearchResult(self, i) for i in range(len(self)))
+
+    def __getitem__(self, index: int) -> SearchResult:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return SearchResult(self, index)
+
+    def append(self, title: str, link: str, date: str = "", source: str = "", snippet: str = "",
+               engine: str = "", query: str = "", novelty: Optional[str] = None,
+               excerpt: Optional[str] = None, facts: Optional[List[str]] = None):
+        """追加一行"""
+        intern = sys.intern
+        columns = self.columns
+        columns["title"].append(title)
+        columns["link"].append(link)
+        columns["date"].append(intern(date) if date else date)
+        columns["source"].append(intern(source) if source else source)
+        columns["snippet"].append(snippet)
+        columns["engine"].append(intern(engine) if engine else engine)
+        columns["query"].append(intern(query) if query else query)
+        columns["novelty"].append(novelty)
+        columns["excerpt"].append(excerpt)
+        columns["facts"].append(facts)
+
+    def extend(self, other: "SearchResultBatch"):
+        """将另一批次的所有行追加到本批次末尾"""
+        for name, column in self.columns.items():
+            column.extend(other.columns[name])
+
+    def take(self, indices: Sequence[int]) -> "SearchResultBatch":
+        """按行号取出新的批次"""
+        return SearchResultBatch({
+            name: [column[i] for i in indices] for name, column in self.columns.items()
+        })
+
+    def dedup(self, key: str = "link") -> "SearchResultBatch":
+        """按字段去重，保留首次出现的行"""
+        first = {}
+        for i, value in enumerate(self.columns[key]):
+            if value and value not in first:
+                first[value] = i
+        if len(first) == len(self):
+            return self
+        return self.take(sorted(first.values()))
+
+    def filter(self, predicate: Callable[[SearchResult], bool]) -> "SearchResultBatch":
+        """保留满足条件的行"""
+        return self.take([i for i, row in enumerate(self) if predicate(row)])
+
+    def where(self, column: str, value) -> "SearchResultBatch":
+        """保留某列等于指定值的行"""
+        return self.take([i for i, v in enumerate(self.columns[column]) if v == value])
+
+    def rank(self, key: Callable[[SearchResult], object], reverse: bool = False) -> "SearchResultBatch":
+        """按排序键重新排列（稳定排序）"""
+        order = sorted(range(len(self)), key=lambda i: key(SearchResult(self, i)), reverse=reverse)
+        return self.take(order)
+
+    def head(self, n: int) -> "SearchResultBatch":
+        """前n行"""
+        if n >= len(self):
+            return self
+        return SearchResultBatch({name: column[:n] for name, column in self.columns.items()})
+
+    def to_columns(self) -> Dict:
+        """
+        序列化为可直接写入JSON的列式结构：重复字段采用字典编码（取值表 + 编码数组），
+        其余字段直接引用列表，不逐行构造字典
+        """
+        data = {"rows": len(self)}
+        for name, column in self.columns.items():
+            if name in INTERNED_FIELDS:
+                values: Dict = {}
+                codes = [values.setdefault(value, len(values)) for value in column]
+                data[name] = {"values": list(values), "codes": codes}
+            else:
+                data[name] = column
+        return data
+
+    @classmethod
+    def from_columns(cls, data: Dict) -> "SearchResultBatch":
+        """从 to_columns() 的结果还原"""
+        columns = {}
+        for name in FIELDS:
+            column = data.get(name)
+            if column is None:
+                columns[name] = [None] * data["rows"]
+            elif isinstance(column, dict):
+                values = [sys.intern(v) if isinstance(v, str) else v for v in column["values"]]
+                columns[name] = [values[code] for code in column["codes"]]
+            else:
+                columns[name] = list(column)
+        return cls(columns)
+
+    @classmethod
+    def from_dicts(cls, items: Iterable[Dict]) -> "SearchResultBatch":
+        """从字典列表构造（用于兼容旧格式的检查点）"""
+        batch = cls()
+        for item in items:
+            batch.append(**{name: item.get(name) or (None if name in OPTIONAL_FIELDS else "") for name in FIELDS})
+        return batch
@@ -2,17 +2,106 @@
 """
 搜索服务模块
 """
-import requests
+import contextvars
+import threading
 import time
-from typing import List, Dict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
 from loguru import logger
-from config import SERPAPI_API_KEY, SEARCH_RESULTS_NUM, SERPAPI_ENGINES, SEARCH_DELAY
+from config import (
+    SERPAPI_API_KEYS,
+    SERPAPI_BASE_URL,
+    SEARCH_RESULTS_NUM,
+    SERPAPI_ENGINES,
+    SEARCH_DELAY,
+    SEARCH_CACHE_ENABLED,
+    SEARCH_CACHE_TTL,
+    SEARCH_HTTP_POOL_SIZE,
+    ADAPTIVE_ENGINES_ENABLED,
+    SEARCH_RACING_ENABLED,
+    SEARCH_RACE_TARGET_RESULTS,
+    SEARCH_RACE_DEADLINE,
+    SEARCH_HEDGING_ENABLED,
+    SEARCH_HEDGE_CHECK_INTERVAL,
+    SEARCH_TIMEOUT,
+    SEARCH_MAX_ATTEMPTS,
+    DEADLINE_RESERVE_WRITE,
+    DEADLINE_RESERVE_DELIVERY,
+)
+from .deadline import get_deadline
+from .engine_stats import EngineStats
+from .resilience import get_breaker, retry_call
+from .search_results import SearchResultBatch
+from .serpapi_keys import QuotaExhaustedError, SerpApiKeyPool
+from .tracing import get_tracer
+
+
+class SearchCache:
+    """
+    进程内的搜索结果缓存，线程安全。
+
+    对同一键的并发请求只会真正发起一次（其余请求等待并复用结果），
+    用于批量生成多份报告时共享相同查询的搜索结果。
+    """
+
+    def __init__(self, ttl: float = SEARCH_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, List[Dict]]] = {}
+        self._inflight: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], List[Dict]]) -> Tuple[List[Dict], bool]:
+        """
+        读取缓存，未命中时调用 fetch 获取并写入缓存
+
+        Returns:
+            (数据, 是否命中缓存)
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and time.time() - entry[0] < self.ttl:
+                    self.hits += 1
+                    return entry[1], True
+                event = self._inflight.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self._inflight[key] = event
+                    break
+            # 其它线程正在获取同一键，等待其完成后重新检查缓存
+            event.wait()
+
+        try:
+            data = fetch()
+            with self._lock:
+                self._entries[key] = (time.time(), data)
+                self.misses += 1
+            return data, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
 
 class SearchService:
     """
-    高质量、稳定的多引擎串行搜索服务。
+    高质量、稳定的多引擎搜索服务（默认串行，可选并发竞速）。
     """
-    def __init__(self, api_key: str = SERPAPI_API_KEY, engines: List[str] = SERPAPI_ENGINES):
+    def __init__(self, api_key: Optional[str] = None, engines: List[str] = SERPAPI_ENGINES,
+                 cache: Optional[SearchCache] = None, pool_size: int = SEARCH_HTTP_POOL_SIZE,
+                 engine_stats: Optional[EngineStats] = None, racing: bool = SEARCH_RACING_ENABLED,
+                 api_keys: Optional[List[str]] = None):
+        """
+        Args:
+            api_key: 单个SerpApi密钥
+            api_keys: SerpApi密钥池；两者都未指定时使用 SERPAPI_API_KEYS
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        if api_keys is None:
+            api_keys = [api_key] if api_key else SERPAPI_API_KEYS
+        api_key = api_keys[0] if api_keys else None
         if not api_key:
             logger.warning("SerpApi API key 未配置。搜索功能将不可用。")
         if not engines:
@@ -20,68 +109,359 @@ class SearchService:
             
         self.api_key = api_key
         self.engines = [e.strip() for e in engines]
-        self.base_url = "https://serpapi.com/search.json"
+        self.base_url = SERPAPI_BASE_URL
+        self.cache = cache if cache is not None else (SearchCache() if SEARCH_CACHE_ENABLED else None)
+        # 按历史新增结果量规划引擎与请求数量
+        self.engine_stats = engine_stats if engine_stats is not None else (
+            EngineStats() if ADAPTIVE_ENGINES_ENABLED else None
+        )
+        # 竞速模式：引擎并发查询，达到目标结果数或截止时间即返回
+        self.racing = racing
+        self.race_target = SEARCH_RACE_TARGET_RESULTS
+        self.race_deadline = SEARCH_RACE_DEADLINE
+        self.hedging = SEARCH_HEDGING_ENABLED
+        self.pool_size = pool_size
+        self._race_executor = None
+        # 复用连接池，避免每次请求重新建立TLS连接；多线程共享时按并发度放大连接池
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # 密钥池按密钥分别控制请求间隔，取代全局的固定等待
+        self.key_pool = SerpApiKeyPool(api_keys, session=self.session) if api_keys else None
+
+    @property
+    def paced(self) -> bool:
+        """请求间隔是否已由密钥池控制"""
+        return self.key_pool is not None
 
-    def search(self, query: str, num_results: int = SEARCH_RESULTS_NUM) -> List[Dict]:
+    def search(self, query: str, num_results: int = SEARCH_RESULTS_NUM) -> SearchResultBatch:
         """
-        对单个查询词，串行查询多个搜索引擎，并汇总结果。
+        对单个查询词，查询多个搜索引擎，并汇总结果。
+        启用自适应引擎选择时，按历史新增量排序引擎，并跳过或缩减低收益引擎的请求；
+        启用竞速模式时，各引擎并发查询，达到目标结果数或截止时间即返回。
 
         Args:
             query (str): 单个搜索查询词。
             num_results (int): 每个搜索引擎期望返回的结果数量。
 
         Returns:
-            List[Dict]: 从所有搜索引擎汇总的、去重后的搜索结果列表。
+            SearchResultBatch: 从所有搜索引擎汇总的、去重后的搜索结果。
         """
+        all_results = SearchResultBatch()
         if not self.api_key or not self.engines:
             logger.error("搜索服务未正确配置，无法执行搜索。")
-            return []
+            return all_results
 
-        logger.info(f"开始在 {self.engines} 上对 '{query}' 进行串行搜索...")
-        
-        all_results = []
+        tracer = get_tracer()
         seen_links = set()
 
-        for engine in self.engines:
-            logger.info(f" -> 正在查询引擎: {engine}...")
-            params = {
-                "q": query,
-                "api_key": self.api_key,
-                "num": num_results,
-                "engine": engine,
-            }
-            try:
-                response = requests.get(self.base_url, params=params)
-                response.raise_for_status()
-                data = response.json().get("organic_results", [])
-                
-                count = 0
-                for item in data:
-                    link = item.get("link") or item.get("href")
-                    if link and link not in seen_links:
-                        all_results.append({
-                            "title": item.get("title", ""),
-                            "date": item.get("date", ""),
-                            "source": item.get("source") or item.get("displayed_link", ""),
-                            "snippet": item.get("snippet", ""),
-                            "engine": engine
-                        })
-                        seen_links.add(link)
-                        count += 1
-                logger.info(f"    从 {engine} 获得 {count} 条新结果。")
-
-            except requests.exceptions.RequestException as e:
-                logger.error(f"    查询 {engine} 失败: {e}")
-            except Exception as e:
-                logger.error(f"    处理 {engine} 的结果时出错: {e}")
-            
-            # 在每次API调用后都暂停，这是避免速率限制的关键
-            time.sleep(SEARCH_DELAY)
+        if self.engine_stats is not None:
+            plan = self.engine_stats.plan(query, self.engines, num_results)
+        else:
+            plan = [(engine, num_results) for engine in self.engines]
+
+        # 熔断中的引擎直接跳过，不占用本次查询的时间
+        open_engines = [engine for engine, _ in plan if get_breaker(f"serpapi:{engine}").is_open]
+        if open_engines:
+            logger.warning(f"    跳过熔断中的引擎: {', '.join(open_engines)}")
+            plan = [(engine, num) for engine, num in plan if engine not in open_engines]
+            if not plan:
+                return all_results
+
+        # 截止时间临近时只查询历史收益最高的引擎
+        deadline = get_deadline()
+        if len(plan) > 1 and deadline.tight(DEADLINE_RESERVE_WRITE + DEADLINE_RESERVE_DELIVERY):
+            deadline.degrade("search", "fewer_engines", kept=plan[0][0])
+            plan = plan[:1]
+
+        racing = self.racing and len(plan) > 1
+        logger.info(f"开始在 {[engine for engine, _ in plan]} 上对 '{query}' 进行{'竞速' if racing else '串行'}搜索...")
+
+        with tracer.span("search.query", query=query, engines=len(plan), racing=racing) as query_span:
+            query_span.set_attribute("skipped_engines", len(self.engines) - len(plan))
+            if racing:
+                self._search_racing(query, plan, all_results, seen_links, query_span)
+            else:
+                self._search_serial(query, plan, all_results, seen_links)
+            query_span.set_attribute("results", len(all_results))
 
         logger.success(f"对 '{query}' 的搜索完成，共获得 {len(all_results)} 条独立结果。")
         return all_results
 
-    def format_search_results(self, results: List[Dict]) -> str:
+    def _search_serial(self, query: str, plan: List[Tuple[str, int]],
+                       all_results: SearchResultBatch, seen_links: set):
+        """按规划顺序逐个查询引擎"""
+        import requests
+
+        tracer = get_tracer()
+        fetched = {}  # 引擎 -> (请求数量, 原始结果, 延迟)
+        for engine, num in plan:
+            logger.info(f" -> 正在查询引擎: {engine}（{num} 条）...")
+            from_cache = False
+            with tracer.span("search.engine", engine=engine, query=query, num=num) as span:
+                try:
+                    started = time.perf_counter()
+                    data, from_cache = self._fetch(engine, query, num, span)
+                    latency = None if from_cache else time.perf_counter() - started
+                    span.set_attribute("cached", from_cache)
+                    count = self._merge(engine, query, data, all_results, seen_links)
+                    span.set_attributes(results=len(data), new_results=count)
+                    fetched[engine] = (num, data, latency)
+
+                except requests.exceptions.RequestException as e:
+                    span.set_error(e)
+                    logger.error(f"    查询 {engine} 失败: {e}")
+                except Exception as e:
+                    span.set_error(e)
+                    logger.error(f"    处理 {engine} 的结果时出错: {e}")
+                finally:
+                    tracer.incr("search_requests", engine=engine, status=span.status)
+
+            # 没有密钥池时在每次API调用后暂停，避免速率限制（命中缓存时无需等待）
+            if not from_cache and not self.paced:
+                time.sleep(SEARCH_DELAY)
+        self._record(query, fetched)
+
+    def _search_racing(self, query: str, plan: List[Tuple[str, int]],
+                       all_results: SearchResultBatch, seen_links: set, query_span):
+        """
+        并发查询所有引擎，按完成顺序合并结果。
+
+        达到 SEARCH_RACE_TARGET_RESULTS 条独立结果或超过 SEARCH_RACE_DEADLINE 秒即返回，
+        未完成的引擎被放弃；某引擎耗时超过其历史p95延迟时，额外发出一个对冲请求，先返回者为准。
+        被放弃或慢于对冲请求的原始请求以已等待的时间记为删失延迟样本，使p95反映真实的长尾。
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        tracer = get_tracer()
+        started = time.monotonic()
+        deadline = started + self.race_deadline
+        p95 = {}
+        if self.hedging and self.engine_stats is not None:
+            p95 = {engine: self.engine_stats.p95_latency(engine, query) for engine, _ in plan}
+
+        pending = {}  # future -> (引擎, 请求数量, 发出时间, 是否对冲请求)
+        for engine, num in plan:
+            future = self._submit_race(engine, query, num, deadline - time.monotonic(), hedge=False)
+            pending[future] = (engine, num, time.monotonic(), False)
+        finished_engines, hedged_engines = set(), set()
+        fetched = {}  # 引擎 -> (请求数量, 原始结果, 延迟)
+        failures = {}  # 引擎 -> 失败的请求数
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(list(pending), timeout=min(remaining, SEARCH_HEDGE_CHECK_INTERVAL),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                engine, num, sent_at, hedge = pending.pop(future)
+                try:
+                    data, from_cache, latency = future.result()
+                except Exception as e:
+                    failures[engine] = failures.get(engine, 0) + 1
+                    logger.error(f"    查询 {engine}{'（对冲）' if hedge else ''} 失败: {e}")
+                    continue
+                if engine in finished_engines:
+                    # 对冲请求中较慢的一方：结果已不需要，延迟仍是有效样本
+                    if not hedge:
+                        self._record_latency(engine, query, num, latency)
+                    continue
+                finished_engines.add(engine)
+                self._merge(engine, query, data, all_results, seen_links)
+                fetched[engine] = (num, data, latency)
+
+            # 已有结果的引擎不再等待其对冲请求；输给对冲请求的原始请求按已等待时间记为删失样本
+            for future, (engine, num, sent_at, hedge) in list(pending.items()):
+                if engine in finished_engines:
+                    pending.pop(future)
+                    future.cancel()
+                    if not hedge:
+                        self._record_latency(engine, query, num, time.monotonic() - sent_at)
+
+            if self.race_target and len(all_results) >= self.race_target:
+                logger.info(f"    已获得 {len(all_results)} 条独立结果，达到目标，提前返回")
+                break
+
+            now = time.monotonic()
+            for future, (engine, num, sent_at, hedge) in list(pending.items()):
+                threshold = p95.get(engine)
+                if hedge or threshold is None or engine in hedged_engines or engine in finished_engines:
+                    continue
+                if now - sent_at > threshold:
+                    hedged_engines.add(engine)
+                    tracer.incr("search_hedged_requests", engine=engine)
+                    logger.info(f"    {engine} 已超过其p95延迟 {threshold:.2f}s，发出对冲请求")
+                    hedge_future = self._submit_race(engine, query, num, deadline - now, hedge=True)
+                    pending[hedge_future] = (engine, num, now, True)
+
+        # 放弃未完成的引擎：尚未开始的请求直接取消，进行中的请求会在截止时间的超时后结束
+        abandoned = sorted({engine for engine, _, _, _ in pending.values()} - finished_engines)
+        now = time.monotonic()
+        for future, (engine, num, sent_at, hedge) in pending.items():
+            future.cancel()
+            if not hedge and engine not in finished_engines:
+                # 真实延迟至少为已等待的时间
+                self._record_latency(engine, query, num, now - sent_at)
+        for engine in abandoned:
+            tracer.incr("search_abandoned_engines", engine=engine)
+        if abandoned:
+            logger.warning(f"    放弃未完成的引擎: {', '.join(abandoned)}（已等待 {time.monotonic() - started:.1f}s）")
+        query_span.set_attributes(abandoned_engines=len(abandoned), hedged_engines=len(hedged_engines),
+                                  failed_requests=sum(failures.values()))
+        self._record(query, fetched)
+
+        # 竞速模式下各引擎并发请求，没有密钥池时每个查询之后统一暂停一次以控制整体请求速率
+        if not self.paced:
+            time.sleep(SEARCH_DELAY)
+
+    def _submit_race(self, engine: str, query: str, num: int, timeout: float, hedge: bool):
+        """在竞速线程池中发出一个引擎请求，沿用当前的追踪上下文"""
+        if self._race_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._race_executor = ThreadPoolExecutor(max_workers=self.pool_size,
+                                                     thread_name_prefix="search-race")
+        context = contextvars.copy_context()
+        return self._race_executor.submit(context.run, self._race_fetch, engine, query, num,
+                                          max(timeout, 0.1), hedge)
+
+    def _race_fetch(self, engine: str, query: str, num: int, timeout: float,
+                    hedge: bool) -> Tuple[List[Dict], bool, Optional[float]]:
+        tracer = get_tracer()
+        with tracer.span("search.engine", engine=engine, query=query, num=num, hedge=hedge) as span:
+            try:
+                started = time.perf_counter()
+                # 对冲请求绕过缓存，否则会等待同一个进行中的请求
+                data, from_cache = self._fetch(engine, query, num, span, timeout=timeout,
+                                               use_cache=not hedge, deadline=time.monotonic() + timeout)
+                span.set_attributes(cached=from_cache, results=len(data))
+                return data, from_cache, None if from_cache else time.perf_counter() - started
+            except Exception as e:
+                span.set_error(e)
+                raise
+            finally:
+                tracer.incr("search_requests", engine=engine, status=span.status)
+
+    def _merge(self, engine: str, query: str, data: List[Dict],
+               all_results: SearchResultBatch, seen_links: set) -> int:
+        """将单个引擎的原始结果去重后并入汇总列表，返回新增条数"""
+        count = 0
+        for item in data:
+            link = item.get("link") or item.get("href")
+            if link and link not in seen_links:
+                all_results.append(
+                    title=item.get("title", ""),
+                    link=link,
+                    date=item.get("date", ""),
+                    source=item.get("source") or item.get("displayed_link", ""),
+                    snippet=item.get("snippet", ""),
+                    engine=engine,
+                    query=query,
+                )
+                seen_links.add(link)
+                count += 1
+        logger.info(f"    从 {engine} 获得 {count} 条新结果。")
+        return count
+
+    def _record(self, query: str, fetched: Dict[str, Tuple[int, List[Dict], Optional[float]]]):
+        """
+        查询的所有引擎完成后，按留一法记录各引擎的新增结果数
+
+        某引擎的新增数为其结果中不在本次查询其它引擎结果里的链接数，与引擎的请求和合并顺序无关，
+        否则排在前面的引擎总是"新增"更多，按新增量排序会把现有顺序固化下来。
+
+        Args:
+            query: 查询词
+            fetched: {引擎: (请求数量, 原始结果, 延迟)}，只含成功返回的引擎
+        """
+        links = {engine: {item.get("link") or item.get("href") for item in data} - {None, ""}
+                 for engine, (_, data, _) in fetched.items()}
+        for engine, (num, data, latency) in fetched.items():
+            others = set().union(*(engine_links for other, engine_links in links.items() if other != engine))
+            unique = len(links[engine] - others)
+            get_tracer().incr("search_new_results", unique, engine=engine)
+            if self.engine_stats is not None:
+                self.engine_stats.record(engine, query, num, len(data), unique, latency)
+
+    def _record_latency(self, engine: str, query: str, num: int, latency: Optional[float]):
+        """只记录延迟样本（结果未被采用或请求被放弃），不计入新增结果统计"""
+        if self.engine_stats is not None and latency is not None:
+            self.engine_stats.record(engine, query, num, None, None, latency)
+
+    def _fetch(self, engine: str, query: str, num_results: int, span,
+               timeout: Optional[float] = None, use_cache: bool = True,
+               deadline: Optional[float] = None) -> Tuple[List[Dict], bool]:
+        """
+        从单个引擎获取原始的 organic_results，启用缓存时优先读取缓存。
+        暂时性错误按退避重试，同一引擎持续失败时熔断。
+
+        Args:
+            timeout: 单次HTTP请求超时（秒），默认 SEARCH_TIMEOUT（不超过运行截止时间）
+            use_cache: 是否使用缓存
+            deadline: 可选的截止时间（time.monotonic()），重试等待不会越过该时间
+
+        Returns:
+            (原始结果列表, 是否命中缓存)
+        """
+        # 搜索须为撰写报告和发送预留时间：超时与重试都不越过该时间点
+        run_deadline = get_deadline()
+        reserve = DEADLINE_RESERVE_WRITE + DEADLINE_RESERVE_DELIVERY
+        timeout = timeout or run_deadline.timeout(SEARCH_TIMEOUT, reserve=reserve)
+        if run_deadline.bounded:
+            deadline = min(deadline or float("inf"), run_deadline.monotonic - reserve)
+
+        def request() -> List[Dict]:
+            # 单个密钥的429或401/403只让该密钥冷却或停用：还有其它可用密钥时立即换用，不退避、不计入熔断；
+            # 没有其它密钥时按普通错误处理（429按 Retry-After 退避重试）
+            rotations = len(self.key_pool) if self.key_pool is not None else 0
+            while True:
+                api_key = self.key_pool.acquire() if self.key_pool is not None else self.api_key
+                params = {
+                    "q": query,
+                    "api_key": api_key,
+                    "num": num_results,
+                    "engine": engine,
+                }
+                try:
+                    response = self.session.get(self.base_url, params=params, timeout=timeout)
+                except Exception:
+                    if self.key_pool is not None:
+                        self.key_pool.record(api_key, None)
+                    raise
+                if self.key_pool is not None:
+                    self.key_pool.record(api_key, response.status_code)
+                span.set_attribute("status_code", response.status_code)
+                if response.status_code in (401, 403, 429) and rotations > 0 \
+                        and self.key_pool.has_alternative(api_key):
+                    rotations -= 1
+                    get_tracer().incr("serpapi_key_rotations", engine=engine, status=response.status_code)
+                    continue
+                response.raise_for_status()
+                return response.json().get("organic_results", [])
+
+        def fetch() -> List[Dict]:
+            # 密钥全部不可用时打开熔断器，冷却期内不再发出注定失败的请求
+            return retry_call(request, name=f"serpapi:{engine}", max_attempts=SEARCH_MAX_ATTEMPTS,
+                              breaker=get_breaker(f"serpapi:{engine}"), deadline=deadline,
+                              fatal=(QuotaExhaustedError,))
+
+        if self.cache is None or not use_cache:
+            return fetch(), False
+        return self.cache.get_or_fetch((engine, query, num_results), fetch)
+
+    def close(self):
+        """关闭复用的HTTP会话"""
+        if self._race_executor is not None:
+            self._race_executor.shutdown(wait=False, cancel_futures=True)
+            self._race_executor = None
+        self.session.close()
+        if self.key_pool is not None:
+            self.key_pool.close()
+        if self.engine_stats is not None:
+            self.engine_stats.close()
+
+    def format_search_results(self, results: Iterable[Dict]) -> str:
         """
         将搜索结果列表格式化为单个字符串。
         """
@@ -92,7 +472,16 @@ class SearchService:
         for item in results:
             date_str = f"{item.get('date', '无日期')} | " if item.get('date') else ""
             engine_str = f"[{item.get('engine', '未知引擎')}] "
-            formatted_item = f"{engine_str}{date_str}{item['title']}\n来源: {item['source']}\n摘要: {item['snippet']}"
+            novelty_str = "[往期已报道] " if item.get("novelty") == "covered" else ""
+            formatted_item = f"{novelty_str}{engine_str}{date_str}{item['title']}\n来源: {item['source']}"
+            if item.get("link"):
+                # 报告条目引用该链接，交付后据此在跨期索引中对应到原始搜索结果
+                formatted_item += f"\n链接: {item['link']}"
+            formatted_item += f"\n摘要: {item['snippet']}"
+            if item.get("facts"):
+                formatted_item += "\n数据: " + "；".join(item["facts"])
+            if item.get("excerpt"):
+                formatted_item += f"\n正文摘录: {item['excerpt']}"
             formatted_items.append(formatted_item)
         
         return "\n\n---\n\n".join(formatted_items)
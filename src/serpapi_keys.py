@@ -0,0 +1,324 @@
+"""
+SerpApi 多密钥配额管理模块
+
+维护一组 SerpApi 密钥的用量与剩余配额：
+
+- 每个密钥的本月用量、最近一小时的请求时间、冷却与停用状态持久化到本地状态文件，跨运行保留
+  （文件中只保存密钥的哈希标识，不保存密钥本身）；用量按批保存，冷却、停用等状态变化立即保存；
+- 因401/403停用的密钥在 SERPAPI_KEY_DISABLED_RECHECK_SECONDS 后通过账户接口重新检查（跨月时直接恢复）；
+- 定期查询账户接口（SERPAPI_ACCOUNT_URL，测试时可指向本地桩服务）校准剩余配额和每小时上限；
+- 每次请求挑选余量最大的可用密钥，并保证单个密钥的请求间隔，
+  以多个密钥的总吞吐替代原先全局的固定等待。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Union
+from loguru import logger
+from config import (
+    SERPAPI_ACCOUNT_REFRESH_SECONDS,
+    SERPAPI_ACCOUNT_URL,
+    SERPAPI_KEY_COOLDOWN,
+    SERPAPI_KEY_DISABLED_RECHECK_SECONDS,
+    SERPAPI_KEY_MIN_INTERVAL,
+    SERPAPI_KEY_SAVE_EVERY,
+    SERPAPI_KEY_STATE_PATH,
+)
+from .utils import ensure_dir
+
+
+class QuotaExhaustedError(Exception):
+    """所有密钥都已用尽配额或被停用"""
+
+
+def key_id(api_key: str) -> str:
+    """密钥的哈希标识，用于日志与状态文件"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:10]
+
+
+class KeyState:
+    """单个密钥的用量状态"""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.id = key_id(api_key)
+        self.month = datetime.now().strftime("%Y-%m")
+        self.used_this_month = 0
+        self.searches_left: Optional[int] = None  # 账户接口返回的剩余次数
+        self.used_since_check = 0  # 自上次查询账户接口以来的请求数
+        self.rate_limit_per_hour: Optional[int] = None
+        self.account_checked_at = 0.0
+        self.cooldown_until = 0.0
+        self.disabled = False
+        self.disabled_at = 0.0
+        self.last_request_at = 0.0
+        self.recent: Deque[float] = deque()  # 最近一小时的请求时间
+
+    @property
+    def remaining(self) -> Optional[int]:
+        """估算的剩余配额，未知时为None"""
+        if self.searches_left is None:
+            return None
+        return self.searches_left - self.used_since_check
+
+    def hourly_headroom(self, now: float) -> Optional[int]:
+        while self.recent and now - self.recent[0] > 3600:
+            self.recent.popleft()
+        if self.rate_limit_per_hour is None:
+            return None
+        return self.rate_limit_per_hour - len(self.recent)
+
+    def available(self, now: float) -> bool:
+        if self.disabled or now < self.cooldown_until:
+            return False
+        if self.remaining is not None and self.remaining <= 0:
+            return False
+        headroom = self.hourly_headroom(now)
+        return headroom is None or headroom > 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "month": self.month,
+            "used_this_month": self.used_this_month,
+            "searches_left": self.searches_left,
+            "used_since_check": self.used_since_check,
+            "rate_limit_per_hour": self.rate_limit_per_hour,
+            "account_checked_at": self.account_checked_at,
+            "cooldown_until": self.cooldown_until,
+            "disabled": self.disabled,
+            "disabled_at": self.disabled_at,
+            "recent": list(self.recent),
+        }
+
+    def load(self, data: Dict):
+        current_month = self.month
+        self.month = data.get("month", current_month)
+        self.used_this_month = data.get("used_this_month", 0)
+        self.searches_left = data.get("searches_left")
+        self.used_since_check = data.get("used_since_check", 0)
+        self.rate_limit_per_hour = data.get("rate_limit_per_hour")
+        self.account_checked_at = data.get("account_checked_at", 0.0)
+        self.cooldown_until = data.get("cooldown_until", 0.0)
+        self.disabled = data.get("disabled", False)
+        self.disabled_at = data.get("disabled_at", 0.0)
+        self.recent = deque(t for t in data.get("recent", []) if time.time() - t <= 3600)
+        if self.month != current_month:
+            # 跨月后配额重置，需重新查询账户接口
+            self.month = current_month
+            self.used_this_month = 0
+            self.searches_left = None
+            self.used_since_check = 0
+            self.account_checked_at = 0.0
+            self.disabled = False
+
+
+class SerpApiKeyPool:
+    """SerpApi密钥池"""
+
+    def __init__(self, api_keys: List[str], state_path: Union[str, Path] = SERPAPI_KEY_STATE_PATH,
+                 account_url: Optional[str] = SERPAPI_ACCOUNT_URL,
+                 min_interval: float = SERPAPI_KEY_MIN_INTERVAL, session=None):
+        """
+        Args:
+            api_keys: 密钥列表（重复项会被忽略）
+            state_path: 用量状态文件
+            account_url: 账户接口地址，为空时不查询，只按本地计数调度
+            min_interval: 同一密钥两次请求的最小间隔（秒）
+            session: 可选的 requests.Session，用于查询账户接口
+        """
+        self.keys = [KeyState(key) for key in dict.fromkeys(k.strip() for k in api_keys if k and k.strip())]
+        self.state_path = Path(state_path)
+        self.account_url = account_url
+        self.min_interval = min_interval
+        self.session = session
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._unsaved = 0  # 自上次保存以来未写入文件的成功请求数
+        self._load_state()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def acquire(self) -> str:
+        """
+        取得下一次请求使用的密钥；所有可用密钥都在最小间隔内时等待
+
+        Returns:
+            密钥
+
+        Raises:
+            QuotaExhaustedError: 没有任何可用密钥
+        """
+        self._refresh_accounts()
+        while True:
+            with self._lock:
+                now = time.time()
+                candidates = [k for k in self.keys if k.available(now)]
+                if not candidates:
+                    raise QuotaExhaustedError(self._exhausted_reason(now))
+                ready = [k for k in candidates if now - k.last_request_at >= self.min_interval]
+                if ready:
+                    key = max(ready, key=lambda k: self._score(k, now))
+                    key.last_request_at = now
+                    key.recent.append(now)
+                    return key.api_key
+                wait = min(self.min_interval - (now - k.last_request_at) for k in candidates)
+            time.sleep(max(wait, 0.01))
+
+    def has_alternative(self, api_key: str) -> bool:
+        """除 api_key 外是否还有可用的密钥（不考虑请求间隔）"""
+        with self._lock:
+            now = time.time()
+            return any(k.api_key != api_key and k.available(now) for k in self.keys)
+
+    @staticmethod
+    def _score(key: KeyState, now: float) -> float:
+        # 优先使用余量大的密钥：剩余配额与本小时剩余请求数中较紧的一项
+        remaining = key.remaining if key.remaining is not None else float("inf")
+        headroom = key.hourly_headroom(now)
+        return min(remaining, headroom if headroom is not None else float("inf"))
+
+    def record(self, api_key: str, status_code: Optional[int]):
+        """
+        记录一次请求的结果
+
+        Args:
+            api_key: 使用的密钥
+            status_code: HTTP状态码，网络错误时为None
+        """
+        with self._lock:
+            key = next((k for k in self.keys if k.api_key == api_key), None)
+            if key is None:
+                return
+            save = True
+            if status_code is not None and status_code < 400:
+                key.used_this_month += 1
+                key.used_since_check += 1
+                self._unsaved += 1
+                save = self._unsaved >= SERPAPI_KEY_SAVE_EVERY
+            elif status_code == 429 and len(self.keys) == 1:
+                # 只有一个密钥时冷却只会让所有搜索失败：交由调用方按 Retry-After 退避重试
+                logger.warning(f"SerpApi密钥 {key.id} 触发限流")
+            elif status_code == 429:
+                key.cooldown_until = time.time() + SERPAPI_KEY_COOLDOWN
+                key.account_checked_at = 0.0  # 冷却结束后重新校准配额
+                logger.warning(f"SerpApi密钥 {key.id} 触发限流，冷却 {SERPAPI_KEY_COOLDOWN}s")
+            elif status_code in (401, 403):
+                key.disabled = True
+                key.disabled_at = time.time()
+                logger.error(f"SerpApi密钥 {key.id} 无效或已停用（HTTP {status_code}），"
+                             f"{SERPAPI_KEY_DISABLED_RECHECK_SECONDS / 3600:g} 小时内不再使用")
+        if save:
+            self._save_state()
+
+    def _refresh_accounts(self):
+        """按间隔查询各密钥的账户接口，校准剩余配额与每小时上限；停用已久的密钥重新检查"""
+        now = time.time()
+        for key in self.keys:
+            if key.disabled:
+                if now - key.disabled_at < SERPAPI_KEY_DISABLED_RECHECK_SECONDS:
+                    continue
+                if not self.account_url or self.session is None:
+                    # 无法查询账户接口：恢复使用，由下一次请求的结果判断
+                    with self._lock:
+                        key.disabled = False
+                    logger.info(f"SerpApi密钥 {key.id} 停用已超过检查间隔，重新试用")
+                    self._save_state()
+                    continue
+            elif not self.account_url or self.session is None \
+                    or now - key.account_checked_at < SERPAPI_ACCOUNT_REFRESH_SECONDS:
+                continue
+            key.account_checked_at = now
+            try:
+                response = self.session.get(self.account_url, params={"api_key": key.api_key}, timeout=10)
+                if response.status_code in (401, 403):
+                    self.record(key.api_key, response.status_code)
+                    continue
+                response.raise_for_status()
+                account = response.json()
+            except Exception as e:
+                logger.warning(f"查询SerpApi密钥 {key.id} 的账户信息失败: {e}")
+                continue
+            with self._lock:
+                if key.disabled:
+                    key.disabled = False
+                    logger.info(f"SerpApi密钥 {key.id} 账户接口恢复正常，重新启用")
+                left = account.get("total_searches_left", account.get("plan_searches_left"))
+                key.searches_left = int(left) if left is not None else None
+                key.used_since_check = 0
+                if account.get("account_rate_limit_per_hour") is not None:
+                    key.rate_limit_per_hour = int(account["account_rate_limit_per_hour"])
+                if account.get("this_month_usage") is not None:
+                    key.used_this_month = int(account["this_month_usage"])
+            self._save_state()
+            logger.info(f"SerpApi密钥 {key.id}: 剩余 {key.searches_left} 次，"
+                        f"每小时上限 {key.rate_limit_per_hour}")
+
+    def _exhausted_reason(self, now: float) -> str:
+        reasons = []
+        for key in self.keys:
+            if key.disabled:
+                reasons.append(f"{key.id}: 已停用")
+            elif now < key.cooldown_until:
+                reasons.append(f"{key.id}: 冷却中（剩余 {key.cooldown_until - now:.0f}s）")
+            elif key.remaining is not None and key.remaining <= 0:
+                reasons.append(f"{key.id}: 本月配额已用尽")
+            else:
+                reasons.append(f"{key.id}: 已达每小时上限")
+        return "没有可用的SerpApi密钥（" + "；".join(reasons or ["未配置密钥"]) + "）"
+
+    def status(self) -> List[Dict]:
+        """各密钥的用量摘要"""
+        self._refresh_accounts()
+        now = time.time()
+        with self._lock:
+            return [{
+                "key": key.id,
+                "available": key.available(now),
+                "used_this_month": key.used_this_month,
+                "remaining": key.remaining,
+                "last_hour": len(key.recent),
+                "rate_limit_per_hour": key.rate_limit_per_hour,
+                "disabled": key.disabled,
+                "cooldown_seconds": max(0, round(key.cooldown_until - now)),
+            } for key in self.keys]
+
+    def _load_state(self):
+        if not self.state_path.exists():
+            return
+        try:
+            data = json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取SerpApi密钥状态失败: {e}")
+            return
+        for key in self.keys:
+            if key.id in data:
+                key.load(data[key.id])
+
+    def _save_state(self):
+        # 调用方不持有 self._lock：读写文件期间不阻塞其它线程取用密钥；保留文件中其它密钥（例如其它进程配置的密钥）的记录
+        with self._lock:
+            snapshot = {key.id: key.to_dict() for key in self.keys}
+            self._unsaved = 0
+        with self._save_lock:
+            try:
+                data = {}
+                if self.state_path.exists():
+                    data = json.loads(self.state_path.read_text(encoding="utf-8"))
+                data.update(snapshot)
+                ensure_dir(self.state_path.parent)
+                tmp_path = self.state_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+                os.replace(tmp_path, self.state_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"保存SerpApi密钥状态失败: {e}")
+
+    def close(self):
+        """保存尚未写入文件的用量"""
+        if self._unsaved:
+            self._save_state()
@@ -0,0 +1,285 @@
+"""
+分阶段采样分析模块
+
+`python main.py --profile` 时，后台线程按固定间隔通过 sys._current_frames() 采样各线程的调用栈，
+按流水线阶段（生成内容、渲染、发送邮件）分别累计，运行结束后在该次运行的目录下写出：
+
+- profile/<阶段>.wall.folded：阶段所在线程的墙钟时间（含等待网络、磁盘与锁的时间）；
+- profile/<阶段>.cpu.folded：各线程实际占用的CPU时间（含截图池、竞速搜索等辅助线程），
+  按采样间隔内线程CPU时钟的增量加权，需要 time.pthread_getcpuclockid（Linux/macOS）；
+- profile/<阶段>.pstats：`--cprofile` 时阶段所在线程的 cProfile 统计；
+- profile/summary.json：各阶段的墙钟时间、CPU时间与自身耗时最多的函数。
+
+.folded 为折叠调用栈格式（每行 "根;...;叶 权重"，权重单位为微秒），可直接导入
+speedscope（https://www.speedscope.app）或用 flamegraph.pl 生成火焰图。
+"""
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+from loguru import logger
+from config import PROFILE_SAMPLE_INTERVAL, PROFILE_TOP_FUNCTIONS, PROJECT_ROOT
+from .utils import ensure_dir
+
+
+class _StageStats:
+    """一个阶段的累计数据"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall: Dict[str, float] = defaultdict(float)  # 折叠调用栈 -> 墙钟微秒
+        self.cpu: Dict[str, float] = defaultdict(float)  # 折叠调用栈 -> CPU微秒
+        self.samples = 0
+        self.wall_seconds = 0.0
+        self.thread_cpu_seconds = 0.0
+        self.process_cpu_seconds = 0.0
+        self.pstats: Optional[pstats.Stats] = None
+
+
+class StageProfiler:
+    """按阶段归集的采样分析器；enabled=False 时 stage() 不做任何事"""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL, cprofile: bool = False,
+                 enabled: bool = True):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            cprofile: 是否同时以 cProfile 统计阶段所在线程
+            enabled: 是否启用
+        """
+        self.interval = interval
+        self.cprofile = cprofile
+        self.enabled = enabled
+        self.stages: Dict[str, _StageStats] = {}
+        self._active: Dict[int, str] = {}  # 线程ident -> 阶段名
+        self._lock = threading.Lock()
+        self._labels: Dict[object, str] = {}
+        # 按 (ident, native_id) 缓存线程的CPU时钟：ident 在线程结束后会被新线程复用
+        self._cpu_clocks: Dict[Tuple[int, Optional[int]], Optional[int]] = {}
+        self._last_cpu: Dict[Tuple[int, Optional[int]], float] = {}
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """在当前线程上统计一个阶段"""
+        if not self.enabled:
+            yield
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            stats = self.stages.setdefault(name, _StageStats(name))
+            self._active[ident] = name
+        self._ensure_sampler()
+        profile = cProfile.Profile() if self.cprofile else None
+        wall, thread_cpu, process_cpu = time.perf_counter(), time.thread_time(), time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            stats.wall_seconds += time.perf_counter() - wall
+            stats.thread_cpu_seconds += time.thread_time() - thread_cpu
+            stats.process_cpu_seconds += time.process_time() - process_cpu
+            with self._lock:
+                self._active.pop(ident, None)
+                if profile is not None:
+                    if stats.pstats is None:
+                        stats.pstats = pstats.Stats(profile)
+                    else:
+                        stats.pstats.add(profile)
+
+    def _ensure_sampler(self):
+        with self._lock:
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._run, name="stage-profiler", daemon=True)
+                self._sampler.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        seeded = False
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed_us = (now - last) * 1e6
+            last = now
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+            # 辅助线程（截图池、竞速搜索等）没有自己的阶段：只有一个阶段在运行时归入该阶段
+            fallback = next(iter(active.values())) if len(set(active.values())) == 1 else None
+            threads = {thread.ident: thread for thread in threading.enumerate()}
+            self._prune_clocks({(ident, thread.native_id) for ident, thread in threads.items()})
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stage = active.get(ident)
+                owned = stage is not None
+                stage = stage or fallback
+                thread = threads.get(ident)
+                # 只读取仍在 threading.enumerate() 中的线程的CPU时钟，已结束线程的ident不能再使用
+                cpu_us = self._cpu_delta_us((ident, thread.native_id), fresh=seeded) if thread else 0.0
+                if stage is None or (not owned and not cpu_us):
+                    continue
+                stack = self._fold(frame, thread.name if thread else str(ident))
+                stats = self.stages[stage]
+                if owned:
+                    stats.wall[stack] += elapsed_us
+                    stats.samples += 1
+                if cpu_us:
+                    stats.cpu[stack] += min(cpu_us, elapsed_us)
+            seeded = True
+
+    def _prune_clocks(self, live: Set[Tuple[int, Optional[int]]]):
+        """丢弃已结束线程的CPU时钟缓存"""
+        for key in [key for key in self._cpu_clocks if key not in live]:
+            self._cpu_clocks.pop(key, None)
+            self._last_cpu.pop(key, None)
+
+    def _cpu_delta_us(self, key: Tuple[int, Optional[int]], fresh: bool) -> float:
+        """
+        线程自上次采样以来消耗的CPU时间（微秒）；平台不支持时返回0
+
+        Args:
+            key: (ident, native_id)
+            fresh: 首次见到的线程是否在上次采样之后才启动（其CPU时间全部计入本次）
+        """
+        if key not in self._cpu_clocks:
+            try:
+                self._cpu_clocks[key] = time.pthread_getcpuclockid(key[0])
+            except (AttributeError, OSError):
+                self._cpu_clocks[key] = None
+        clock = self._cpu_clocks[key]
+        if clock is None:
+            return 0.0
+        try:
+            now = time.clock_gettime(clock)
+        except OSError:  # 线程在 enumerate() 之后刚刚结束
+            self._cpu_clocks[key] = None
+            return 0.0
+        previous = self._last_cpu.get(key, 0.0 if fresh else now)
+        self._last_cpu[key] = now
+        return (now - previous) * 1e6
+
+    def _fold(self, frame, thread_name: str) -> str:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(f"thread:{thread_name}")
+        return ";".join(reversed(labels))
+
+    def stop(self):
+        """停止采样线程"""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        self._stop.clear()
+
+    def summary(self) -> Dict[str, Dict]:
+        """各阶段的墙钟时间、CPU时间与自身耗时最多的函数"""
+        result = {}
+        for name, stats in self.stages.items():
+            result[name] = {
+                "wall_seconds": round(stats.wall_seconds, 3),
+                "thread_cpu_seconds": round(stats.thread_cpu_seconds, 3),
+                "process_cpu_seconds": round(stats.process_cpu_seconds, 3),
+                # 阶段线程的CPU时间占墙钟时间的比例，明显小于1说明主要在等待I/O
+                "cpu_ratio": round(stats.thread_cpu_seconds / stats.wall_seconds, 3) if stats.wall_seconds else None,
+                "samples": stats.samples,
+                "top_self_wall": _top_leaves(stats.wall),
+                "top_self_cpu": _top_leaves(stats.cpu),
+            }
+        return result
+
+    def export(self, output_dir: Union[str, Path]) -> List[str]:
+        """
+        写出各阶段的折叠调用栈、pstats 与汇总，之后清空已累计的数据
+
+        Args:
+            output_dir: 输出目录（通常为 output/runs/<运行ID>/profile）
+
+        Returns:
+            写出的文件路径列表
+        """
+        self.stop()
+        output_dir = ensure_dir(Path(output_dir))
+        paths = []
+        for name, stats in self.stages.items():
+            for kind, stacks in (("wall", stats.wall), ("cpu", stats.cpu)):
+                if not stacks:
+                    continue
+                path = output_dir / f"{name}.{kind}.folded"
+                path.write_text("".join(f"{stack} {round(weight)}\n" for stack, weight in stacks.items()
+                                        if round(weight) > 0), encoding="utf-8")
+                paths.append(str(path))
+            if stats.pstats is not None:
+                path = output_dir / f"{name}.pstats"
+                stats.pstats.dump_stats(str(path))
+                paths.append(str(path))
+        path = output_dir / "summary.json"
+        path.write_text(json.dumps(self.summary(), ensure_ascii=False, indent=2), encoding="utf-8")
+        paths.append(str(path))
+        self.stages = {}
+        return paths
+
+    def log_summary(self):
+        for name, row in self.summary().items():
+            logger.info(f"分析 {name}: 墙钟 {row['wall_seconds']:.2f}s，线程CPU {row['thread_cpu_seconds']:.2f}s"
+                        f"（{row['cpu_ratio'] or 0:.0%}），进程CPU {row['process_cpu_seconds']:.2f}s，"
+                        f"采样 {row['samples']} 次")
+            for leaf in row["top_self_cpu"][:5]:
+                logger.info(f"    CPU {leaf['seconds']:>7.3f}s  {leaf['function']}")
+
+
+def _short_path(filename: str) -> str:
+    """项目内文件显示相对路径，第三方库显示 site-packages 之后的部分"""
+    try:
+        return str(Path(filename).relative_to(PROJECT_ROOT))
+    except ValueError:
+        pass
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+def _top_leaves(stacks: Dict[str, float], limit: int = PROFILE_TOP_FUNCTIONS) -> List[Dict]:
+    """按叶子函数（自身耗时）汇总"""
+    leaves: Dict[str, float] = defaultdict(float)
+    for stack, weight in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += weight
+    top = sorted(leaves.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+    return [{"function": function, "seconds": round(weight / 1e6, 3)} for function, weight in top]
+
+
+_disabled = StageProfiler(enabled=False)
+_current_profiler: ContextVar[Optional[StageProfiler]] = ContextVar("current_profiler", default=None)
+
+
+def get_profiler() -> StageProfiler:
+    """获取当前上下文的分析器；未启用时返回一个不做任何事的分析器"""
+    return _current_profiler.get() or _disabled
+
+
+def start_profiler(profiler: Optional[StageProfiler] = None) -> StageProfiler:
+    """为当前上下文（线程）启用分阶段分析"""
+    profiler = profiler or StageProfiler()
+    _current_profiler.set(profiler)
+    return profiler
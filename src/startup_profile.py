@@ -0,0 +1,77 @@
+"""
+启动耗时分析模块
+
+通过包装 builtins.__import__ 统计每个模块首次导入的耗时（含子模块的累计耗时与自身耗时），
+用于 `python main.py --startup-profile`。本模块只依赖标准库，以便在其它导入之前安装。
+"""
+import builtins
+import importlib.util
+import sys
+import time
+from typing import Dict, List, Tuple
+
+
+class ImportProfiler:
+    """统计模块导入耗时"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.records: Dict[str, Tuple[float, float]] = {}  # 模块名 -> (累计耗时, 自身耗时)
+        self._stack: List[List[float]] = []
+        self._original_import = None
+
+    def install(self) -> "ImportProfiler":
+        """开始统计"""
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+        return self
+
+    def uninstall(self):
+        """停止统计"""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # 只统计首次导入；已在 sys.modules 中的模块直接返回，不计入
+        if level:
+            try:
+                name_key = importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__"))
+            except (ImportError, ValueError):
+                name_key = name
+        else:
+            name_key = name
+        if name_key in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._stack.append([0.0])
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()[0]
+            if self._stack:
+                self._stack[-1][0] += elapsed
+            if name_key not in self.records and name_key in sys.modules:
+                self.records[name_key] = (elapsed, max(elapsed - children, 0.0))
+
+    def report(self, top: int = 25) -> str:
+        """
+        生成耗时报告
+
+        Args:
+            top: 输出累计耗时最多的前N个模块
+
+        Returns:
+            报告文本
+        """
+        total = time.perf_counter() - self.started
+        rows = sorted(self.records.items(), key=lambda kv: kv[1][0], reverse=True)[:top]
+        lines = [
+            f"启动耗时分析: 自安装起共 {total * 1000:.1f} ms，统计到 {len(self.records)} 个顶层导入",
+            f"{'累计(ms)':>10} {'自身(ms)':>10}  模块",
+        ]
+        for name, (cumulative, own) in rows:
+            lines.append(f"{cumulative * 1000:>10.1f} {own * 1000:>10.1f}  {name}")
+        return "\n".join(lines)
@@ -0,0 +1,124 @@
+"""
+HTML 模板编译模块
+
+模板只解析一次：按 {槽位} 切分为字面片段和槽位名，渲染时只做列表拼接，
+不再为每一页对整份文档（含样式表）执行 str.format 或 f-string。
+PageTemplate 在此基础上预先填入标题与样式表等各页相同的部分，
+得到只剩页眉、页脚和正文三个槽位的页面骨架。
+"""
+import hashlib
+import html
+import re
+import string
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from config import RENDER_EXTERNAL_CSS, RENDER_MINIFY_CSS
+from templates.html_template import BASE_CSS_STYLES, BASE_HTML_TEMPLATE
+
+
+class CompiledTemplate:
+    """预先解析的模板；语法与 str.format 相同（{name} 为槽位，{{ }} 为字面花括号），不支持格式说明符"""
+
+    __slots__ = ("_head", "_pairs")
+
+    def __init__(self, literals: List[str], slots: List[str]):
+        # literals 比 slots 多一个；渲染结果为 literals[0] + 依次交替的 (槽位值, 字面片段)
+        self._head = literals[0]
+        self._pairs: List[Tuple[str, str]] = list(zip(slots, literals[1:]))
+
+    @classmethod
+    def compile(cls, source: str) -> "CompiledTemplate":
+        literals, slots = [""], []
+        for literal, field, spec, conversion in string.Formatter().parse(source):
+            literals[-1] += literal
+            if field is None:
+                continue
+            if spec or conversion or not field.isidentifier():
+                raise ValueError(f"模板槽位只支持简单名称: {{{field}}}")
+            slots.append(field)
+            literals.append("")
+        return cls(literals, slots)
+
+    @property
+    def slots(self) -> List[str]:
+        return [name for name, _ in self._pairs]
+
+    def render(self, **values: str) -> str:
+        """填入全部槽位；缺少的槽位抛出 KeyError"""
+        parts = [self._head]
+        append = parts.append
+        for name, literal in self._pairs:
+            append(values[name])
+            append(literal)
+        return "".join(parts)
+
+    def partial(self, **values: str) -> "CompiledTemplate":
+        """预先填入部分槽位，返回只含其余槽位的新模板"""
+        literals, slots = [self._head], []
+        for name, literal in self._pairs:
+            if name in values:
+                literals[-1] += values[name] + literal
+            else:
+                slots.append(name)
+                literals.append(literal)
+        return CompiledTemplate(literals, slots)
+
+
+@lru_cache(maxsize=None)
+def compile_template(source: str) -> CompiledTemplate:
+    """编译模板（按源文本缓存）"""
+    return CompiledTemplate.compile(source)
+
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_WHITESPACE = re.compile(r"\s+")
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+_CSS_COLON = re.compile(r":\s+")
+
+
+@lru_cache(maxsize=None)
+def minify_css(css: str) -> str:
+    """去掉注释和多余空白（选择器中冒号前的空白保留，以免改变含义）"""
+    css = _CSS_COMMENT.sub("", css)
+    css = _CSS_WHITESPACE.sub(" ", css)
+    css = _CSS_PUNCTUATION.sub(r"\1", css)
+    css = _CSS_COLON.sub(":", css)
+    return css.replace(";}", "}").strip()
+
+
+class PageTemplate:
+    """报告页面骨架：样式表只处理一次，每页只替换页眉、页脚和正文"""
+
+    def __init__(self, title: str = "", css: str = BASE_CSS_STYLES,
+                 minify: bool = RENDER_MINIFY_CSS, external_css: bool = RENDER_EXTERNAL_CSS,
+                 template: str = BASE_HTML_TEMPLATE):
+        """
+        Args:
+            title: 页面标题
+            css: 样式表
+            minify: 是否压缩样式表
+            external_css: 是否以外部样式表引用（由渲染器写入 stylesheet_name），而不是内联到每一页
+            template: 页面模板，需包含 title、stylesheet、fonts、header、footer、content 槽位
+        """
+        self.stylesheet = minify_css(css) if minify else css
+        digest = hashlib.sha1(self.stylesheet.encode("utf-8")).hexdigest()[:10]
+        # 外部样式表的文件名带内容摘要，样式变化后不会误用旧文件
+        self.stylesheet_name: Optional[str] = f"report.{digest}.css" if external_css else None
+        if self.stylesheet_name:
+            stylesheet = f'<link rel="stylesheet" href="{self.stylesheet_name}">'
+        else:
+            stylesheet = f"<style>{self.stylesheet}</style>"
+        self._skeleton = compile_template(template).partial(title=html.escape(title), stylesheet=stylesheet)
+
+    def render(self, content: str, header: str, footer: str, fonts: str = "") -> str:
+        """
+        渲染一页
+
+        Args:
+            content: 正文HTML
+            header: 页眉文本（转义后填入）
+            footer: 页脚文本（转义后填入）
+            fonts: 本份报告的字体声明（<style>@font-face...</style>），随报告而变，不预先填入
+        """
+        return self._skeleton.render(content=content, header=html.escape(header), footer=html.escape(footer),
+                                     fonts=fonts)
@@ -0,0 +1,277 @@
+"""
+运行追踪模块
+
+记录一次报告运行中各阶段的耗时与属性（span），并导出为 JSON span 文件
+和 Prometheus 文本格式的指标文件，便于定位一次运行的时间花在了哪里。
+"""
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Tuple, Union
+from loguru import logger
+from config import TRACE_DEFAULT_MAX_SPANS
+from .utils import ensure_dir
+
+
+METRIC_PREFIX = "hydrogen_report"
+
+
+class Span:
+    """单个阶段的追踪记录"""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "attributes",
+        "start_time", "duration", "status", "error", "_start",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self.duration: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self._start = time.perf_counter()
+
+    def set_attribute(self, key: str, value):
+        """设置单个属性"""
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        """批量设置属性，值为None的属性会被忽略"""
+        for key, value in attributes.items():
+            if value is not None:
+                self.attributes[key] = value
+
+    def set_error(self, error: Union[str, BaseException]):
+        """将span标记为失败（用于被业务代码捕获、不会向外抛出的异常）"""
+        self.status = "error"
+        self.error = str(error)
+
+    def end(self):
+        """结束span并记录耗时"""
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": datetime.fromtimestamp(self.start_time).isoformat(timespec="milliseconds"),
+            "duration_seconds": round(self.duration, 6) if self.duration is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """
+    一次运行的追踪器，收集span、计数器和仪表值。
+
+    线程安全：多个线程可以同时向同一个追踪器写入span。
+    """
+
+    def __init__(self, run_id: Optional[str] = None, max_spans: Optional[int] = None):
+        """
+        Args:
+            run_id: 运行ID，默认按时间生成
+            max_spans: 最多保留的span数，超出时丢弃最早的；None表示不限
+        """
+        self.run_id = run_id or f"{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}"
+        self.started_at = time.time()
+        self.spans: Union[List[Span], Deque[Span]] = [] if max_spans is None else deque(maxlen=max_spans)
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.gauges: Dict[Tuple[str, Tuple], float] = {}
+        self._lock = threading.Lock()
+        self._current_span: ContextVar[Optional[Span]] = ContextVar(
+            f"current_span_{self.run_id}", default=None
+        )
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """
+        记录一个阶段的执行
+
+        Args:
+            name: span名称，使用点号分层，例如 "search.engine"
+            **attributes: 附加属性
+
+        Yields:
+            Span对象，可在阶段内追加属性
+        """
+        parent = self._current_span.get()
+        span = Span(name, self.run_id, parent.span_id if parent else None, attributes)
+        token = self._current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            span.end()
+            self._current_span.reset(token)
+            with self._lock:
+                self.spans.append(span)
+
+    def incr(self, name: str, value: float = 1, **labels):
+        """累加计数器"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """设置仪表值"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = value
+
+    def counter_totals(self) -> Dict[str, float]:
+        """各计数器在所有标签上的合计"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for (name, _), value in self.counters.items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        按span名称汇总耗时
+
+        Returns:
+            {span名称: {"count", "total", "max", "errors"}}
+        """
+        summary: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            item = summary.setdefault(span.name, {"count": 0, "total": 0.0, "max": 0.0, "errors": 0})
+            item["count"] += 1
+            item["total"] += span.duration or 0.0
+            item["max"] = max(item["max"], span.duration or 0.0)
+            if span.status == "error":
+                item["errors"] += 1
+        return summary
+
+    def to_prometheus(self) -> str:
+        """生成Prometheus文本格式的指标"""
+        lines = [
+            f"# HELP {METRIC_PREFIX}_run_info 本次运行的标识",
+            f"# TYPE {METRIC_PREFIX}_run_info gauge",
+            f'{METRIC_PREFIX}_run_info{{run_id="{_escape_label(self.run_id)}"}} 1',
+            f"# HELP {METRIC_PREFIX}_stage_duration_seconds 各阶段耗时",
+            f"# TYPE {METRIC_PREFIX}_stage_duration_seconds summary",
+        ]
+        summary = self.stage_summary()
+        for name, item in sorted(summary.items()):
+            label = f'{{stage="{_escape_label(name)}"}}'
+            lines.append(f"{METRIC_PREFIX}_stage_duration_seconds_sum{label} {item['total']:.6f}")
+            lines.append(f"{METRIC_PREFIX}_stage_duration_seconds_count{label} {item['count']}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_stage_duration_seconds_max gauge")
+        for name, item in sorted(summary.items()):
+            lines.append(
+                f'{METRIC_PREFIX}_stage_duration_seconds_max{{stage="{_escape_label(name)}"}} {item["max"]:.6f}'
+            )
+        lines.append(f"# TYPE {METRIC_PREFIX}_stage_errors_total counter")
+        for name, item in sorted(summary.items()):
+            lines.append(
+                f'{METRIC_PREFIX}_stage_errors_total{{stage="{_escape_label(name)}"}} {item["errors"]}'
+            )
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+        lines.extend(_format_series(counters, "counter", suffix="_total"))
+        lines.extend(_format_series(gauges, "gauge"))
+        return "\n".join(lines) + "\n"
+
+    def export(self, output_dir: Union[str, Path]) -> Dict[str, str]:
+        """
+        导出span和指标文件
+
+        Args:
+            output_dir: 导出目录
+
+        Returns:
+            {"spans": span文件路径, "metrics": 指标文件路径}
+        """
+        output_dir = ensure_dir(output_dir)
+        spans_path = output_dir / "spans.json"
+        metrics_path = output_dir / "metrics.prom"
+
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        spans.sort(key=lambda s: s["start_time"])
+        payload = {
+            "run_id": self.run_id,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "wall_seconds": round(time.time() - self.started_at, 3),
+            "spans": spans,
+        }
+        spans_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        metrics_path.write_text(self.to_prometheus(), encoding="utf-8")
+
+        logger.info(f"运行追踪已导出: {spans_path}, {metrics_path}")
+        return {"spans": str(spans_path), "metrics": str(metrics_path)}
+
+    def log_summary(self):
+        """在日志中输出各阶段耗时汇总"""
+        summary = self.stage_summary()
+        if not summary:
+            return
+        logger.info("各阶段耗时汇总:")
+        for name, item in sorted(summary.items(), key=lambda kv: kv[1]["total"], reverse=True):
+            logger.info(
+                f"  {name:<24} 次数 {item['count']:>3} | 合计 {item['total']:8.2f}s | 最长 {item['max']:7.2f}s"
+            )
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_series(series: List[Tuple[Tuple[str, Tuple], float]], metric_type: str, suffix: str = "") -> List[str]:
+    lines = []
+    declared = set()
+    for (name, labels), value in series:
+        metric = f"{METRIC_PREFIX}_{name}{suffix}"
+        if metric not in declared:
+            lines.append(f"# TYPE {metric} {metric_type}")
+            declared.add(metric)
+        label_str = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+        lines.append(f"{metric}{{{label_str}}} {value}" if label_str else f"{metric} {value}")
+    return lines
+
+
+# 不属于任何运行的调用（常驻进程中的辅助路径）写入默认追踪器，只保留最近的span，避免无限增长
+_default_tracer = Tracer(run_id="default", max_spans=TRACE_DEFAULT_MAX_SPANS)
+_current_tracer: ContextVar[Optional[Tracer]] = ContextVar("current_tracer", default=None)
+
+
+def get_tracer() -> Tracer:
+    """获取当前上下文的追踪器；未开始运行时返回一个全局默认追踪器"""
+    return _current_tracer.get() or _default_tracer
+
+
+def start_run(run_id: Optional[str] = None) -> Tracer:
+    """为当前上下文（线程）开始一次新的运行追踪"""
+    tracer = Tracer(run_id)
+    _current_tracer.set(tracer)
+    return tracer
+
+
+def set_tracer(tracer: Optional[Tracer]):
+    """将指定追踪器设为当前上下文的追踪器（用于在工作线程中复用）"""
+    _current_tracer.set(tracer)
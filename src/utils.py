@@ -1,6 +1,7 @@
 """
 工具函数模块
 """
+import importlib.util
 import os
 from pathlib import Path
 from typing import Union
@@ -33,7 +34,8 @@ def validate_api_keys() -> bool:
     missing_keys = []
     
     for key in required_keys:
-        if not os.getenv(key):
+        # SerpApi密钥也可以通过 SERPAPI_API_KEYS 以密钥池的形式提供
+        if not os.getenv(key) and not (key == "SERPAPI_API_KEY" and os.getenv("SERPAPI_API_KEYS")):
             missing_keys.append(key)
     
     if missing_keys:
@@ -49,28 +51,43 @@ def validate_api_keys() -> bool:
 def setup_logging(level: str = "INFO"):
     """
     设置日志配置
-    
+
+    日志经队列由后台线程写出；截断、限流与分模块级别见 log_control 模块。
+
     Args:
-        level: 日志级别
+        level: 默认日志级别，LOG_LEVELS 可按模块覆盖
     """
-    from config import LOG_FORMAT
-    
+    import sys
+    from config import LOG_ENQUEUE, LOG_FORMAT, LOG_JSON
+    from .log_control import LogControl
+
+    control = LogControl(level)
+    # 输出按各模块级别中最低的一级接收，具体过滤由 LogControl 完成
+    sink_level = min([control.default_level, *control.levels.values()])
+
     logger.remove()  # 移除默认处理器
+    logger.configure(patcher=control.patch)
     logger.add(
-        sink=lambda msg: print(msg, end=""),
+        sink=sys.stdout,
         format=LOG_FORMAT,
-        level=level,
-        colorize=True
+        level=sink_level,
+        filter=control.filter,
+        colorize=None if not LOG_JSON else False,
+        serialize=LOG_JSON,
+        enqueue=LOG_ENQUEUE,
     )
-    
+
     # 添加文件日志
     log_file = Path("logs") / "hydrogen_report.log"
     ensure_dir(log_file.parent)
-    
+
     logger.add(
         sink=str(log_file),
         format=LOG_FORMAT,
-        level=level,
+        level=sink_level,
+        filter=control.filter,
+        serialize=LOG_JSON,
+        enqueue=LOG_ENQUEUE,
         rotation="1 day",
         retention="7 days"
     )
@@ -150,17 +167,22 @@ def check_dependencies():
     Returns:
         是否所有依赖都已安装
     """
-    required_packages = [
-        "openai", "requests", "markdown2", "html2image", 
-        "Pillow", "python-dotenv", "tqdm", "loguru"
-    ]
+    # 包名 -> 导入名；只查找模块规格而不真正导入，避免拖慢启动
+    required_packages = {
+        "openai": "openai",
+        "requests": "requests",
+        "markdown2": "markdown2",
+        "html2image": "html2image",
+        "Pillow": "PIL",
+        "python-dotenv": "dotenv",
+        "tqdm": "tqdm",
+        "loguru": "loguru",
+    }
     
     missing_packages = []
     
-    for package in required_packages:
-        try:
-            __import__(package.replace("-", "_"))
-        except ImportError:
+    for package, module_name in required_packages.items():
+        if importlib.util.find_spec(module_name) is None:
             missing_packages.append(package)
     
     if missing_packages:
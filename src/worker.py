@@ -0,0 +1,192 @@
+"""
+多进程工作者模块
+
+N 个工作进程从 SQLite 任务队列（见 job_queue.py）领取报告任务，
+各自执行搜索、LLM、渲染和邮件各阶段；运行期间由心跳线程续约，
+每个进程在多个任务之间复用自己的流水线（HTTP会话、LLM客户端、截图器）。
+"""
+import os
+import signal
+import socket
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from loguru import logger
+from config import JOB_HEARTBEAT_INTERVAL, JOB_QUEUE_PATH, WORKER_POLL_INTERVAL
+from .job_queue import JobQueue, QueuedJob
+
+
+def job_payload(variant_data: Dict, start: Optional[date] = None, end: Optional[date] = None) -> Dict:
+    """
+    构造任务参数
+
+    Args:
+        variant_data: 变体定义，格式同批量模式的变体文件 {"name", "region", "topic", "recipients"}
+        start: 起始日期，默认为运行当天往前两周
+        end: 结束日期，默认为运行当天
+    """
+    payload = dict(variant_data)
+    if start:
+        payload["start_date"] = start.isoformat()
+    if end:
+        payload["end_date"] = end.isoformat()
+    return payload
+
+
+class ReportWorker:
+    """单个工作进程的任务循环"""
+
+    def __init__(self, queue: Optional[JobQueue] = None, worker_id: Optional[str] = None,
+                 pipeline=None, poll_interval: float = WORKER_POLL_INTERVAL,
+                 heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL):
+        self.queue = queue or JobQueue()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.pipeline = pipeline
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.processed = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        """请求退出；正在运行的任务会先完成"""
+        self._stop.set()
+
+    def install_signal_handlers(self):
+        def _handle_stop(signum, frame):
+            logger.warning(f"[{self.worker_id}] 收到信号 {signum}，将在当前任务结束后退出")
+            self.stop()
+
+        signal.signal(signal.SIGTERM, _handle_stop)
+        signal.signal(signal.SIGINT, _handle_stop)
+
+    def run(self, max_jobs: Optional[int] = None, exit_when_empty: bool = False):
+        """
+        循环领取并执行任务
+
+        Args:
+            max_jobs: 最多执行的任务数，None表示不限
+            exit_when_empty: 队列为空时是否退出（否则按轮询间隔等待新任务）
+        """
+        logger.info(f"工作者 {self.worker_id} 已启动，队列: {self.queue.db_path}")
+        try:
+            while not self._stop.is_set():
+                if max_jobs is not None and self.processed >= max_jobs:
+                    break
+                job = self.queue.claim(self.worker_id)
+                if job is None:
+                    if exit_when_empty:
+                        break
+                    self._stop.wait(self.poll_interval)
+                    continue
+                self._process(job)
+                self.processed += 1
+        finally:
+            if self.pipeline is not None:
+                self.pipeline.close()
+            logger.info(f"工作者 {self.worker_id} 已退出，共处理 {self.processed} 个任务")
+
+    def _process(self, job: QueuedJob):
+        from .batch import ReportVariant
+        from templates.prompts import get_hydrogen_report_messages
+
+        logger.info(f"[{self.worker_id}] 开始任务 {job.id}（第 {job.attempts}/{job.max_attempts} 次尝试）")
+        lease_lost = threading.Event()
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done, lease_lost),
+                                     name=f"heartbeat-{job.id}", daemon=True)
+        heartbeat.start()
+        try:
+            variant = ReportVariant.from_dict(job.payload)
+            start = date.fromisoformat(job.payload["start_date"]) if job.payload.get("start_date") else None
+            end = date.fromisoformat(job.payload["end_date"]) if job.payload.get("end_date") else None
+            messages = get_hydrogen_report_messages(start, end, topic=variant.topic, region=variant.region)
+            result = self._get_pipeline().run(
+                messages,
+                recipients=variant.recipients,
+                show_progress=False,
+                job_name=f"queue_{job.id}_{variant.name}",
+                send_email=bool(variant.recipients),
+                label=variant.label,
+            )
+            error = None if result.success else (result.error or "生成失败")
+        except Exception as e:
+            logger.error(f"[{self.worker_id}] 任务 {job.id} 执行出错: {e}", exc_info=True)
+            result, error = None, str(e)
+        finally:
+            done.set()
+            heartbeat.join()
+
+        if lease_lost.is_set():
+            logger.warning(f"[{self.worker_id}] 任务 {job.id} 的租约已被接管，丢弃本次结果")
+            return
+        if error is None:
+            self.queue.complete(job.id, self.worker_id, result.to_dict())
+            logger.success(f"[{self.worker_id}] 任务 {job.id} 完成")
+        else:
+            status = self.queue.fail(job.id, self.worker_id, error)
+            logger.error(f"[{self.worker_id}] 任务 {job.id} 失败: {error}（"
+                         f"{'已重新排队' if status == 'queued' else '不再重试'}）")
+
+    def _heartbeat(self, job: QueuedJob, done: threading.Event, lease_lost: threading.Event):
+        while not done.wait(self.heartbeat_interval):
+            try:
+                if not self.queue.heartbeat(job.id, self.worker_id):
+                    lease_lost.set()
+                    return
+            except Exception as e:
+                # 暂时无法访问队列（如共享文件系统抖动）时继续运行，等待下一次续约
+                logger.warning(f"[{self.worker_id}] 任务 {job.id} 续约失败: {e}")
+
+    def _get_pipeline(self):
+        if self.pipeline is None:
+            from .pipeline import ReportPipeline
+            self.pipeline = ReportPipeline()
+        return self.pipeline
+
+
+def worker_main(index: int, queue_path: str, log_level: str, exit_when_empty: bool = False):
+    """工作进程入口"""
+    from .utils import setup_logging
+
+    setup_logging(log_level)
+    worker = ReportWorker(JobQueue(queue_path), worker_id=f"{socket.gethostname()}:{os.getpid()}:w{index}")
+    worker.install_signal_handlers()
+    worker.run(exit_when_empty=exit_when_empty)
+
+
+def run_workers(processes: int, queue_path: Union[str, Path] = JOB_QUEUE_PATH,
+                log_level: str = "INFO", exit_when_empty: bool = False) -> List[int]:
+    """
+    启动多个工作进程并等待其退出
+
+    Args:
+        processes: 进程数
+        queue_path: 任务队列数据库路径
+        log_level: 子进程日志级别
+        exit_when_empty: 队列清空后是否退出
+
+    Returns:
+        各进程的退出码
+    """
+    import multiprocessing
+
+    # 使用spawn启动，避免fork时继承父进程中的线程与连接
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=worker_main, args=(i, str(queue_path), log_level, exit_when_empty),
+                        name=f"report-worker-{i}")
+        for i in range(max(1, processes))
+    ]
+    for process in workers:
+        process.start()
+    logger.info(f"已启动 {len(workers)} 个工作进程，队列: {queue_path}")
+
+    for process in workers:
+        while process.is_alive():
+            try:
+                process.join()
+            except KeyboardInterrupt:
+                # 子进程同样收到SIGINT，会在当前任务结束后自行退出
+                logger.warning("收到中断，等待工作进程完成当前任务...")
+    return [process.exitcode for process in workers]
@@ -9,9 +9,8 @@ BASE_HTML_TEMPLATE = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{title}</title>
-    <style>
-        {styles}
-    </style>
+    {stylesheet}
+    {fonts}
 </head>
 <body>
     <div class="header">{header}</div>
@@ -101,6 +100,7 @@ td {
     text-align: center;
     border: 1px solid #ddd;
     background-color: #fafafa;
+    word-break: break-all;
 }
 
 tr:nth-child(even) td {
@@ -204,6 +204,14 @@ blockquote {
     margin-left: 8px;
 }
 
+.news-item {
+    margin-bottom: 16px;
+}
+
+.news-item p {
+    margin: 6px 0 0 0;
+}
+
 .section-divider {
     height: 2px;
     background: linear-gradient(to right, #003366, #e6f3ff, #003366);
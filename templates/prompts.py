@@ -1,26 +1,23 @@
 """
 提示词模板模块
 """
-from datetime import datetime, timedelta
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from config import SECTION_MAX_QUERIES, SECTION_MIN_ITEMS
 
-def get_hydrogen_report_prompt() -> str:
-    """
-    生成包含动态日期范围的氢能产业报告Prompt。
-    """
-    today = datetime.now()
-    two_weeks_ago = today - timedelta(weeks=2)
-    
-    start_date = two_weeks_ago.strftime("%Y年%m月%d日")
-    end_date = today.strftime("%Y年%m月%d日")
-
-    return f"""
+# 报告的固定指令部分。
+# 该文本在每次运行中保持逐字节一致，并作为对话的第一条消息发送，
+# 使其能够命中 DeepSeek 的上下文硬盘缓存；所有随运行变化的内容（日期等）
+# 都放在其后的用户消息中。修改此处会使已有缓存失效。
+HYDROGEN_REPORT_INSTRUCTIONS = """
 【第一步指令】
 你的第一个任务是，根据下方【报告要求】中提到的所有主题（政策、行业动态、技术、数据等），生成一个高度浓缩的、不超过10个的综合性查询词列表。这些查询词应该具有代表性，能够覆盖报告的核心领域。请调用 `execute_searches` 工具来执行搜索。
 
 【报告要求】
 
 【数据时间范围】
-请搜索 **{start_date} 至 {end_date}** 之间的信息。
+以用户消息中给出的时间范围为准。
 
 【地域范围】
 中国与国际（如德国、日本、美国、澳大利亚、韩国等）。
@@ -45,4 +42,147 @@ def get_hydrogen_report_prompt() -> str:
 【最终报告输出要求】
 - 在你接收到搜索结果后，请根据【报告要求】的结构，生成最终的行业简报。
 - 内容必须真实、权威，拒绝虚构和旧闻。
+- 每个条目以加粗标题开头，并在末尾以 ([来源](链接)) 注明所依据搜索结果的"链接"，链接必须逐字取自搜索结果，不要编造。
+- 搜索结果中标注为 [往期已报道] 的条目已在往期简报中出现过，除非有实质性新进展，否则不要重复收录。
+"""
+
+
+def _format_date_range(start: Optional[date] = None, end: Optional[date] = None) -> str:
+    end = end or datetime.now()
+    start = start or end - timedelta(weeks=2)
+
+    start_date = start.strftime("%Y年%m月%d日")
+    end_date = end.strftime("%Y年%m月%d日")
+
+    return f"""
+【数据时间范围】
+请搜索 **{start_date} 至 {end_date}** 之间的信息。
+"""
+
+
+_DATE_RANGE = re.compile(r"请搜索 \*\*(\d{4})年(\d{2})月(\d{2})日 至 (\d{4})年(\d{2})月(\d{2})日\*\*")
+_FOCUS_HEADINGS = ("【本期地域范围】", "【本期关注重点】")
+
+
+def parse_report_scope(content: str) -> Optional[Tuple[date, date, bool]]:
+    """
+    从 _format_date_range / _format_focus 生成的用户消息中解析本期范围
+
+    Returns:
+        (起始日期, 结束日期, 是否指定了地域或关注重点)；消息中没有日期范围时返回None
+    """
+    match = _DATE_RANGE.search(content or "")
+    if match is None:
+        return None
+    y1, m1, d1, y2, m2, d2 = map(int, match.groups())
+    return date(y1, m1, d1), date(y2, m2, d2), any(heading in content for heading in _FOCUS_HEADINGS)
+
+
+def _format_focus(topic: Optional[str], region: Optional[str] = None) -> str:
+    parts = []
+    if region:
+        parts.append(f"""
+【本期地域范围】
+本期仅关注：{region}。查询词与报告内容均应限定在该地域，忽略上文的默认地域范围。
+""")
+    if topic:
+        parts.append(f"""
+【本期关注重点】
+在覆盖全部五个部分的前提下，搜索与整理请重点围绕：{topic}。
+""")
+    return "".join(parts)
+
+
+# 批量模式的默认报告变体：按地域和细分主题各生成一份
+DEFAULT_REPORT_VARIANTS = [
+    {"name": "china", "region": "中国"},
+    {"name": "eu", "region": "欧盟及欧洲各国"},
+    {"name": "japan_korea", "region": "日本、韩国"},
+    {"name": "us", "region": "美国"},
+    {"name": "electrolyzers", "topic": "电解槽（碱性、PEM、SOEC）的产能、订单、价格与技术进展"},
+    {"name": "fcv", "topic": "燃料电池汽车的销量、加氢站建设与补贴政策"},
+]
+
+
+def get_hydrogen_report_messages(start: Optional[date] = None, end: Optional[date] = None,
+                                 topic: Optional[str] = None,
+                                 region: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    生成氢能产业报告的初始对话消息。
+
+    固定指令作为system消息放在最前，动态日期范围（及可选的关注重点）作为user消息放在其后，
+    以保证多次运行之间的请求前缀完全一致。
+
+    Args:
+        start: 数据时间范围起始日期，默认为结束日期前两周
+        end: 数据时间范围结束日期，默认为今天
+        topic: 可选的关注重点，例如 "电解槽"
+        region: 可选的地域范围，指定后替代默认的"中国与国际"
+    """
+    return [
+        {"role": "system", "content": HYDROGEN_REPORT_INSTRUCTIONS},
+        {"role": "user", "content": _format_date_range(start, end) + _format_focus(topic, region)},
+    ]
+
+
+def get_hydrogen_report_prompt() -> str:
+    """
+    生成包含动态日期范围的氢能产业报告Prompt。
+    """
+    return HYDROGEN_REPORT_INSTRUCTIONS + _format_date_range()
+
+
+# 报告的五个部分：(编号, 标题, 要求)，与 HYDROGEN_REPORT_INSTRUCTIONS 中的【信息结构】一致
+REPORT_PARTS = [
+    (1, "核心政策与事件", "汇总中外氢能领域最重要的政策发布、法规变化、及重大行业事件。"),
+    (2, "关键行业动态", "整理最具代表性的企业动态、新项目、投融资等。"),
+    (3, "市场热点", "汇总行业内的热点新闻或重要企业动态。"),
+    (4, "技术前沿", "收录最新的关键技术突破或重要学术成果。"),
+    (5, "重点数据", "展示中外氢能行业关键数据，如新增产能、装机量、汽车销量等。"),
+]
+
+_ITEM_SCHEMA = (
+    '{"title": "条目标题", "date": "YYYY-MM-DD", "source": "发布机构或媒体", '
+    '"url": "搜索结果的链接", "content": "一到三句话的要点"}'
+)
+
+# 结构化输出（REPORT_FORMAT=sections）时，在搜索结果之后追加的格式要求
+STRUCTURED_REPORT_INSTRUCTIONS = f"""
+【输出格式】
+请将最终简报以一个 JSON 对象输出，不要输出 JSON 以外的任何内容。结构如下：
+{{"sections": [{{"part": 1, "title": "核心政策与事件", "items": [{_ITEM_SCHEMA}, ...]}}, ...]}}
+- sections 按 part 1 至 5 的顺序包含全部五个部分，每个部分至少 {SECTION_MIN_ITEMS} 条 items。
+- date 使用搜索结果中的发布日期，无法确定时填空字符串；source 取自搜索结果的"来源"，url 逐字取自该条搜索结果的"链接"，没有链接时填空字符串，不要编造。
+- Part 5 可额外提供 "table": {{"headers": ["指标", ...], "rows": [["...", ...], ...]}} 汇总关键数据，每行的列数与 headers 相同。
+"""
+
+
+def get_section_regenerate_prompt(part: int, existing_titles: List[str]) -> str:
+    """
+    生成单独重写某一部分时的提示：先针对该部分补充搜索，再按 get_section_output_prompt 输出。
+
+    Args:
+        part: 部分编号（1-5）
+        existing_titles: 其它部分已收录的条目标题，避免重复
+    """
+    _, title, requirement = REPORT_PARTS[part - 1]
+    existing = "\n".join(f"- {t}" for t in existing_titles) or "（无）"
+    return f"""
+【单独重写 Part {part}: {title}】
+上一版简报中该部分内容不足，需要单独补充搜索并重写。该部分的要求：{requirement}
+请调用 `execute_searches` 工具，只针对该部分生成不超过 {SECTION_MAX_QUERIES} 个更具体的查询词。
+其它部分已收录以下条目，不要重复：
+{existing}
+"""
+
+
+def get_section_output_prompt(part: int) -> str:
+    """单独重写某一部分时的 JSON 输出要求"""
+    _, title, _ = REPORT_PARTS[part - 1]
+    table = '\n- 可额外提供 "table": {"headers": [...], "rows": [[...], ...]} 汇总关键数据。' if part == 5 else ""
+    return f"""
+【输出格式】
+请只输出 Part {part} 的内容，以一个 JSON 对象表示，不要输出 JSON 以外的任何内容：
+{{"part": {part}, "title": "{title}", "items": [{_ITEM_SCHEMA}, ...]}}
+- items 至少 {SECTION_MIN_ITEMS} 条；date、source 取自搜索结果，url 逐字取自该条搜索结果的"链接"，无法确定时填空字符串，不要编造。{table}
 """
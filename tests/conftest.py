@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 与 benchmarks/ 中的脚本相同，以仓库根目录为导入根，使 config 与 src 可被导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
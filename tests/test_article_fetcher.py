@@ -0,0 +1,118 @@
+"""
+正文抓取测试：用本地 http.server 提供页面、robots.txt 与 ETag/304 条件请求。
+"""
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.article_fetcher import ArticleCache, ArticleFetcher
+
+ARTICLE_HTML = """<html><head><meta charset="utf-8"><title>库车绿氢项目</title></head><body>
+<nav>首页 | 新闻 | 关于我们</nav>
+<article>
+<p>中国石化新疆库车绿氢示范项目累计产氢突破5000吨，电解水制氢装置负荷率稳定在80%以上。</p>
+<p>项目配套光伏装机300MW，年可减少二氧化碳排放48.5万吨，是国内规模最大的光伏绿氢生产项目之一。</p>
+<p>下一步将推进绿氢在炼化环节的规模化替代，并探索长距离输氢管道的建设方案与运营模式。</p>
+</article>
+<footer>版权所有</footer>
+</body></html>""".encode("utf-8")
+ETAG = '"v1"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    hits: Counter = Counter()
+
+    def do_GET(self):
+        self.hits[self.path] += 1
+        if self.path == "/robots.txt":
+            self._send(200, b"User-agent: *\nDisallow: /private\n", "text/plain")
+        elif self.path in ("/article", "/private"):
+            if self.headers.get("If-None-Match") == ETAG:
+                self.send_response(304)
+                self.send_header("ETag", ETAG)
+                self.end_headers()
+                return
+            self._send(200, ARTICLE_HTML, "text/html; charset=utf-8", etag=ETAG)
+        elif self.path == "/data.pdf":
+            self._send(200, b"%PDF-1.4", "application/pdf")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def _send(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _Handler.hits = Counter()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", _Handler.hits
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_proxy(monkeypatch):
+    # 本地服务器不经过代理
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy", "all_proxy"):
+        monkeypatch.delenv(name, raising=False)
+
+
+def _fetcher(tmp_path, ttl_hours=1.0):
+    return ArticleFetcher(cache=ArticleCache(tmp_path / "articles.sqlite3", ttl_hours=ttl_hours))
+
+
+def test_fetch_respects_robots_and_extracts_facts(server, tmp_path):
+    base, hits = server
+    fetcher = _fetcher(tmp_path)
+    articles, stats = fetcher.fetch_all([f"{base}/article", f"{base}/private", f"{base}/data.pdf",
+                                         f"{base}/missing"], budget=10)
+    fetcher.close()
+
+    assert set(articles) == {f"{base}/article"}
+    article = articles[f"{base}/article"]
+    assert "首页" not in article["text"] and "版权所有" not in article["text"]
+    assert any("5000吨" in fact for fact in article["facts"])
+    assert stats == {"fetched": 1, "disallowed": 1, "skipped": 1, "failed": 1}
+    assert hits["/robots.txt"] == 1
+    assert hits["/private"] == 0
+
+
+def test_cache_fresh_and_revalidated(server, tmp_path):
+    base, hits = server
+    url = f"{base}/article"
+
+    fetcher = _fetcher(tmp_path)
+    first, _ = fetcher.fetch_all([url], budget=10)
+    cached, stats = fetcher.fetch_all([url], budget=10)
+    fetcher.close()
+    assert stats == {"cached": 1}
+    assert cached[url]["text"] == first[url]["text"]
+    assert hits["/article"] == 1
+
+    # 缓存过期后携带 ETag 条件请求，304 时复用缓存内容并延长有效期
+    expired = _fetcher(tmp_path, ttl_hours=0)
+    revalidated, stats = expired.fetch_all([url], budget=10)
+    expired.close()
+    assert stats == {"revalidated": 1}
+    assert revalidated[url]["text"] == first[url]["text"]
+    assert hits["/article"] == 2
+
+    fetcher = _fetcher(tmp_path)
+    _, stats = fetcher.fetch_all([url], budget=10)
+    fetcher.close()
+    assert stats == {"cached": 1}
+    assert hits["/article"] == 2
@@ -0,0 +1,53 @@
+"""
+各 Markdown 后端的输出等价性测试：以 markdown2 为参考，逐页比较规范化后的 HTML。
+未安装的后端跳过。
+"""
+from pathlib import Path
+
+import pytest
+
+from src.markdown_backends import BACKENDS, get_converter, normalize_html
+from src.report_generator import ReportGenerator
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures"
+
+# 表格密集的样例：多张表格、对齐标记、单元格内的行内格式与内嵌 HTML
+TABLE_SAMPLE = """### **重点数据**
+
+| 项目 | 地区 | 规模 | 状态 |
+| :--- | :---: | ---: | --- |
+| **库车绿氢** | 新疆 | 2万吨/年 | 投产 |
+| *大安风光制氢* | 吉林 | 18万吨绿氨 | `投产` |
+| NEOM | 沙特 | 2.2 GW | 在建<br>2026年 |
+
+| 指标 | 2024 | 2025 |
+| --- | --- | --- |
+| 电解槽出货（GW） | 1.2 | 1.8 |
+| 加氢站（座） | 428 | 510 |
+
+- 表格之间的列表项
+- 含 [链接](https://example.com/a?b=1&c=2) 的列表项
+
+| 单列 |
+| --- |
+| 仅一行 |
+"""
+
+
+def _pages():
+    splitter = ReportGenerator(markdown_backend="markdown2")
+    texts = [(path.name, path.read_text(encoding="utf-8")) for path in sorted(FIXTURES_DIR.glob("*.md"))]
+    texts.append(("table_sample", TABLE_SAMPLE))
+    pages = []
+    for name, text in texts:
+        for i, page in enumerate(splitter._split_markdown_pages(text), 1):
+            pages.append(pytest.param(page, id=f"{name}#{i}"))
+    return pages
+
+
+@pytest.mark.parametrize("page", _pages())
+@pytest.mark.parametrize("backend", [name for name in BACKENDS if name != "markdown2"])
+def test_backend_matches_markdown2(backend, page):
+    pytest.importorskip(BACKENDS[backend].module)
+    expected = normalize_html(get_converter("markdown2").convert(page))
+    assert normalize_html(get_converter(backend).convert(page)) == expected